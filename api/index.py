@@ -2,5 +2,7 @@ from run import app
 
 # Vercel Serverless Function entry point
 # This exposes the 'app' object to Vercel
+# Cold starts do no schema work: run `flask db-upgrade` against
+# DATABASE_URL before deploying.
 if __name__ == '__main__':
     app.run()
@@ -1,6 +1,7 @@
 from flask import Flask, render_template
 from config import config
-from .core.extensions import init_extensions, db
+from .core.extensions import init_extensions
+from .core.commands import register_commands
 
 def create_app(config_name='default'):
     app = Flask(__name__, 
@@ -12,23 +13,10 @@ def create_app(config_name='default'):
     init_extensions(app)
     register_blueprints(app)
     register_error_handlers(app)
+    register_commands(app)
     
-    # Auto-Create DB & Admin if not exists (Critical for Vercel/First Run)
-    with app.app_context():
-        try:
-            db.create_all()
-            
-            # Check and Create Admin User
-            from app.models.user import User
-            if not User.query.first():
-                print("⚠️ No users found. Creating default admin...")
-                admin = User(username='admin', email='admin@sekolah.id', role='admin')
-                admin.set_password('admin123')
-                db.session.add(admin)
-                db.session.commit()
-                print("✅ Default admin created: user='admin', pass='admin123'")
-        except Exception as e:
-            print(f"❌ Database initialization error: {e}")
+    # Schema changes and the default admin are applied at deploy time
+    # (`flask db-upgrade`, see app/core/migrations.py), not on every start.
 
     # Inject Settings function to all templates
     @app.context_processor
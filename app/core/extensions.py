@@ -8,6 +8,8 @@ csrf = CSRFProtect()
 
 def init_extensions(app):
     db.init_app(app)
+    from app.core.sqlite import init_sqlite
+    init_sqlite(app, db)
     login_manager.init_app(app)
     csrf.init_app(app)
     
@@ -0,0 +1,188 @@
+"""
+Versioned schema migrations.
+
+Run once per deploy (`flask db-upgrade`), never on app start or per request.
+Applied versions are recorded in the schema_version table. Each step must be
+idempotent: databases created before this runner existed (by create_all)
+already have some of the objects a step creates.
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+from app.core.extensions import db
+
+
+def _create_tables(conn, *names):
+    for name in names:
+        db.metadata.tables[name].create(conn, checkfirst=True)
+
+def _add_column(conn, table, column, ddl):
+    if column not in {c['name'] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _create_indexes(conn, table, *names):
+    for index in db.metadata.tables[table].indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def _initial_tables(conn):
+    _create_tables(conn, 'users', 'students', 'subjects', 'grades', 'report_records', 'settings', 'audit_logs')
+
+def _semester_summaries(conn):
+    _create_tables(conn, 'student_semester_summaries')
+
+def _grade_policies(conn):
+    _add_column(conn, 'grades', 'nr_text', 'VARCHAR(100)')
+    _add_column(conn, 'grades', 'description', 'VARCHAR(255)')
+    _create_tables(conn, 'grade_policies')
+
+def _query_indexes(conn):
+    _create_indexes(conn, 'grades', 'ix_grades_subject_semester_year', 'ix_grades_year')
+    _create_indexes(conn, 'report_records', 'ix_report_records_semester_year')
+    _create_indexes(conn, 'student_semester_summaries', 'ix_summaries_semester_year')
+
+def _default_admin(conn):
+    from werkzeug.security import generate_password_hash
+    if conn.execute(text("SELECT 1 FROM users LIMIT 1")).first():
+        return
+    conn.execute(
+        text("INSERT INTO users (username, email, password_hash, role) VALUES (:u, :e, :p, 'admin')"),
+        {'u': 'admin', 'e': 'admin@sekolah.id', 'p': generate_password_hash('admin123')}
+    )
+    print("✅ Default admin created: user='admin', pass='admin123'")
+
+def _classrooms(conn):
+    _create_tables(conn, 'classrooms', 'class_memberships')
+    # Backfill from the free-text class of each report record; the latest
+    # semester wins when a student moved class within a year
+    rows = conn.execute(text(
+        "SELECT student_id, year, TRIM(class_name) FROM report_records "
+        "WHERE class_name IS NOT NULL AND TRIM(class_name) != '' ORDER BY semester"
+    )).fetchall()
+    class_of = {(student_id, year): name for student_id, year, name in rows}
+    classrooms = {(name, year): cid for cid, name, year in conn.execute(text("SELECT id, name, year FROM classrooms"))}
+    for name, year in sorted({(name, year) for (_, year), name in class_of.items()} - set(classrooms)):
+        classrooms[(name, year)] = conn.execute(
+            text("INSERT INTO classrooms (name, year) VALUES (:n, :y)"), {'n': name, 'y': year}
+        ).lastrowid
+    assigned = set(conn.execute(text("SELECT student_id, year FROM class_memberships")).fetchall())
+    memberships = [{'c': classrooms[(name, year)], 's': student_id, 'y': year}
+                   for (student_id, year), name in class_of.items() if (student_id, year) not in assigned]
+    if memberships:
+        conn.execute(
+            text("INSERT INTO class_memberships (classroom_id, student_id, year) VALUES (:c, :s, :y)"),
+            memberships
+        )
+
+def _student_list_index(conn):
+    _create_indexes(conn, 'students', 'ix_students_active_name_id')
+
+def _student_search(conn):
+    # FTS5 trigram index over students (name, nis, nism), kept in sync by
+    # triggers so every write path (form, import, delete, reset) is covered.
+    # Without FTS5 trigram support (SQLite < 3.34) search falls back to LIKE.
+    from app.services.student_service import StudentService
+    if not StudentService.fts_supported(conn):
+        print("⚠️  SQLite tanpa FTS5 trigram: pencarian santri memakai LIKE")
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5("
+        "name, nis, nism, content='students', content_rowid='id', tokenize='trigram')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN "
+        "INSERT INTO students_fts (rowid, name, nis, nism) VALUES (new.id, new.name, new.nis, new.nism); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN "
+        "INSERT INTO students_fts (students_fts, rowid, name, nis, nism) "
+        "VALUES ('delete', old.id, old.name, old.nis, old.nism); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE OF name, nis, nism ON students BEGIN "
+        "INSERT INTO students_fts (students_fts, rowid, name, nis, nism) "
+        "VALUES ('delete', old.id, old.name, old.nis, old.nism); "
+        "INSERT INTO students_fts (rowid, name, nis, nism) VALUES (new.id, new.name, new.nis, new.nism); END"
+    ))
+    conn.execute(text("INSERT INTO students_fts (students_fts) VALUES ('rebuild')"))
+
+def _stats_version(conn):
+    # Counter row behind the dashboard stats cache, bumped by every grade/extras save
+    conn.execute(text(
+        "INSERT INTO settings (key, value) SELECT '_stats_version', '0' "
+        "WHERE NOT EXISTS (SELECT 1 FROM settings WHERE key = '_stats_version')"
+    ))
+
+def _report_json(conn):
+    # extra_json / personality_json are now JSON columns decoded on load;
+    # empty or broken text would fail there instead of reading as []
+    invalid = " OR json_valid({0}) = 0" if conn.dialect.name == 'sqlite' else ""
+    for column in ('extra_json', 'personality_json'):
+        conn.execute(text(
+            f"UPDATE report_records SET {column} = '[]' "
+            f"WHERE {column} IS NULL OR TRIM({column}) = ''" + invalid.format(column)
+        ))
+
+def _policy_json(conn):
+    # thresholds_json is now a JSON column decoded on load; broken text would
+    # fail there. Reset it (the policy then uses the default thresholds) and
+    # report which policies were affected.
+    invalid = " OR json_valid(thresholds_json) = 0" if conn.dialect.name == 'sqlite' else ""
+    where = "thresholds_json IS NULL OR TRIM(thresholds_json) = ''" + invalid
+    broken = conn.execute(text(f"SELECT id FROM grade_policies WHERE {where}")).scalars().all()
+    if broken:
+        conn.execute(text(f"UPDATE grade_policies SET thresholds_json = '[]' WHERE {where}"))
+        print(f"⚠️  Ambang predikat tidak valid di kebijakan nilai {broken}: memakai ambang default")
+
+
+# (version, name, step) - append only, never renumber
+MIGRATIONS = [
+    (1, 'initial tables', _initial_tables),
+    (2, 'student semester summaries', _semester_summaries),
+    (3, 'grade policies', _grade_policies),
+    (4, 'query indexes', _query_indexes),
+    (5, 'default admin', _default_admin),
+    (6, 'classrooms', _classrooms),
+    (7, 'student list index', _student_list_index),
+    (8, 'student search', _student_search),
+    (9, 'dashboard stats version', _stats_version),
+    (10, 'report json columns', _report_json),
+    (11, 'grade policy json column', _policy_json),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn=None):
+    """Highest applied version (0 for a database without schema_version)"""
+    if conn is None:
+        with db.engine.connect() as conn:
+            return current_version(conn)
+    if not inspect(conn).has_table('schema_version'):
+        return 0
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+def migrate():
+    """Applies pending migrations, one transaction each. Returns [(version, name)] applied."""
+    import app.models # Registers every table on db.metadata
+    applied = []
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(100), applied_at VARCHAR(32))"
+        ))
+    for version, name, step in MIGRATIONS:
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'sqlite':
+                # pysqlite opens transactions only before DML; without this a
+                # failed step would leave its DDL behind
+                conn.exec_driver_sql("BEGIN")
+            if version <= current_version(conn):
+                continue
+            step(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {'v': version, 'n': name, 't': datetime.now().isoformat()}
+            )
+        applied.append((version, name))
+    return applied
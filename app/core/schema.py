@@ -0,0 +1,55 @@
+from sqlalchemy import text, select, func, tuple_, literal
+from app.core.extensions import db
+
+def query_plan_checks():
+    """(name, statement, index it must use) for the hot query shapes"""
+    from app.models import Grade, ReportRecord, StudentSemesterSummary, Student, ClassMembership
+    from app.services.grade_service import GradeService
+    from app.services.extras_service import ExtrasService
+    year = '2024/2025'
+    # One grid page of students, as the grid and the save look them up: one
+    # seek per student on the unique key (SQLite names it sqlite_autoindex_*)
+    page_ids = list(range(1, 51))
+    return [
+        ('grades.edit (grid & simpan nilai)', GradeService.existing_query(1, 1, year, page_ids).statement,
+         'sqlite_autoindex_grades_1'),
+        ('prune_year', select(func.count()).select_from(Grade).where(Grade.year == year),
+         'ix_grades_year'),
+        ('settings.index (daftar tahun)', select(Grade.year).distinct(),
+         'ix_grades_year'),
+        ('backup estimates', select(Grade.year, func.count()).group_by(Grade.year),
+         'ix_grades_year'),
+        ('grades.extras (grid & simpan)', ExtrasService.records_query(1, year, page_ids).statement,
+         'sqlite_autoindex_report_records_1'),
+        ('dashboard stats (nilai per mapel)',
+         select(Grade.subject_id, func.avg(Grade.nr)).where(Grade.semester == 1, Grade.year == year).group_by(Grade.subject_id),
+         'ix_grades_year'),
+        ('dashboard stats (kehadiran)',
+         select(func.sum(ReportRecord.attendance_sakit)).where(ReportRecord.semester == 1, ReportRecord.year == year),
+         'ix_report_records_semester_year'),
+        ('summary rerank', select(StudentSemesterSummary.id, StudentSemesterSummary.total).filter_by(semester=1, year=year),
+         'ix_summaries_semester_year'),
+        ('class filter (nilai/raport/cetak)',
+         select(Student.id).join(ClassMembership, ClassMembership.student_id == Student.id).filter(ClassMembership.classroom_id == 1),
+         'ix_class_memberships_classroom'),
+        ('students.index (keyset)',
+         select(Student).where(Student.active == True, tuple_(Student.name, Student.id) > tuple_(literal('A'), literal(1)))
+         .order_by(Student.name, Student.id).limit(21),
+         'ix_students_active_name_id'),
+    ]
+
+def check_query_plans():
+    """
+    Runs EXPLAIN QUERY PLAN for each hot query (SQLite only).
+    Returns [{'name', 'index', 'plan', 'ok'}].
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    results = []
+    with db.engine.connect() as conn:
+        for name, stmt, index in query_plan_checks():
+            sql = stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True})
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+            plan = ' | '.join(r[-1] for r in rows)
+            results.append({'name': name, 'index': index, 'plan': plan, 'ok': index in plan})
+    return results
@@ -0,0 +1,155 @@
+"""
+SQLite engine profile: pragmas applied to every new connection, batched
+deletes and space reclaim for the maintenance jobs (prune/reset), plus a
+small write-concurrency benchmark (`flask bench-sqlite`).
+"""
+import os
+import time
+import sqlite3
+import tempfile
+import multiprocessing
+from sqlalchemy import event, text
+
+
+def apply_pragmas(dbapi_conn, pragmas):
+    cursor = dbapi_conn.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def init_sqlite(app, db):
+    """Registers the SQLITE_PRAGMAS of the app config on its SQLite engine"""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, connection_record):
+        apply_pragmas(dbapi_conn, pragmas)
+
+
+# --- MAINTENANCE ---
+
+# Rowid span per DELETE transaction, and the pause after it in which other
+# workers (waiting on busy_timeout) get the write lock
+DELETE_BATCH = 5000
+DELETE_PAUSE = 0.02
+# Free pages returned to the filesystem per incremental_vacuum step
+VACUUM_STEP_PAGES = 2000
+
+def chunked_delete(session, table, where='1=1', params=None, batch_size=DELETE_BATCH,
+                   pause=DELETE_PAUSE, progress=None):
+    """
+    Deletes the rows of `table` matching `where` by rowid range, one short
+    transaction per batch_size rowids, so the write lock is never held for
+    long. Ranges without matches are skipped. progress(deleted) is called
+    after every batch. Returns the number of rows deleted.
+    """
+    params = dict(params or {})
+    next_rowid = text(f'SELECT MIN(rowid) FROM "{table}" WHERE rowid >= :_start AND ({where})')
+    delete = text(f'DELETE FROM "{table}" WHERE rowid >= :_start AND rowid < :_end AND ({where})')
+    deleted = 0
+    start = session.execute(next_rowid, dict(params, _start=-2 ** 63)).scalar()
+    while start is not None:
+        end = start + batch_size
+        deleted += session.execute(delete, dict(params, _start=start, _end=end)).rowcount
+        session.commit()
+        if progress:
+            progress(deleted)
+        if pause:
+            time.sleep(pause)
+        start = session.execute(next_rowid, dict(params, _start=end)).scalar()
+    session.commit()
+    return deleted
+
+def reclaim_space(db_path, progress=None, step_pages=VACUUM_STEP_PAGES):
+    """
+    Returns the free pages left by large deletes to the filesystem.
+    With auto_vacuum=INCREMENTAL this runs incremental_vacuum in steps of
+    step_pages (short write locks, progress(done_pages, total_pages) after each).
+    A file still in auto_vacuum=NONE is switched over once with a full VACUUM.
+    Uses its own connection, never one of the pool: pooled connections keep
+    their mmap/page cache across the truncation. Returns the number of pages freed.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            if progress:
+                progress(free, free)
+            return free
+        done = 0
+        while done < free:
+            # executescript steps the pragma to completion; a plain execute()
+            # frees only one page per call
+            conn.executescript(f"PRAGMA incremental_vacuum({int(step_pages)})")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free - done:
+                break
+            done = free - remaining
+            if progress:
+                progress(done, free)
+        return done
+    finally:
+        conn.close()
+
+
+# --- BENCHMARK ---
+
+def _bench_worker(path, pragmas, writes, barrier, results):
+    conn = sqlite3.connect(path, timeout=5) # pysqlite default, as used by the app before
+    if pragmas:
+        apply_pragmas(conn, pragmas)
+    errors = 0
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(writes):
+        try:
+            # Shape of a grade save: read the existing rows, then write in one transaction
+            conn.execute("SELECT COUNT(*), AVG(value) FROM bench WHERE worker = ?", (os.getpid(),)).fetchone()
+            conn.execute("INSERT INTO bench (worker, value) VALUES (?, ?)", (os.getpid(), i))
+            conn.commit()
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+    results.put((time.perf_counter() - started, errors))
+    conn.close()
+
+def benchmark(pragmas, workers=4, writes=200):
+    """
+    Runs `workers` processes doing `writes` read+write transactions each
+    against a fresh database. Returns {'seconds', 'writes_per_sec', 'errors'}.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite')
+        conn = sqlite3.connect(path)
+        if pragmas:
+            apply_pragmas(conn, pragmas)
+        conn.execute("CREATE TABLE bench (id INTEGER PRIMARY KEY, worker INTEGER, value INTEGER)")
+        conn.execute("CREATE INDEX ix_bench_worker ON bench (worker)")
+        conn.commit()
+        conn.close()
+
+        barrier = ctx.Barrier(workers)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_bench_worker, args=(path, pragmas, writes, barrier, results))
+                 for _ in range(workers)]
+        for p in procs:
+            p.start()
+        outcomes = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+
+    seconds = max(o[0] for o in outcomes)
+    errors = sum(o[1] for o in outcomes)
+    done = workers * writes - errors
+    return {'seconds': round(seconds, 3), 'writes_per_sec': round(done / seconds, 1), 'errors': errors}
@@ -1,5 +1,6 @@
 from .user import User
 from .student import Student
-from .academic import Subject, Grade, ReportRecord
+from .academic import Subject, Grade, GradePolicy, ReportRecord, StudentSemesterSummary
+from .classroom import Classroom, ClassMembership
 from .setting import Setting
 from .audit import AuditLog
@@ -1,5 +1,6 @@
 from app.core.extensions import db
 from datetime import datetime
+from sqlalchemy.ext.mutable import MutableList
 
 class Subject(db.Model):
     __tablename__ = 'subjects'
@@ -32,9 +33,46 @@ class Grade(db.Model):
     
     # Predikat (A, B, C, D) - Opsi tambahan
     grade_letter = db.Column(db.String(2)) 
+
+    # Dihitung oleh GradePolicyService, raport tinggal menampilkan
+    nr_text = db.Column(db.String(100)) # Terbilang, e.g. "Delapan Puluh Tujuh"
+    description = db.Column(db.String(255)) # Deskripsi kemajuan belajar
     
     __table_args__ = (
         db.UniqueConstraint('student_id', 'subject_id', 'semester', 'year', name='unique_student_grade'),
+        # Input nilai per mapel, prune/backup per tahun
+        db.Index('ix_grades_subject_semester_year', 'subject_id', 'semester', 'year'),
+        db.Index('ix_grades_year', 'year'),
+    )
+
+class GradePolicy(db.Model):
+    """
+    Aturan perhitungan nilai:
+    - Bobot NH/NK/NU untuk NR (rata-rata berbobot dari nilai yang terisi)
+    - Ambang predikat, dicek dari atas ke bawah
+    subject_id / year kosong = berlaku untuk semua mapel / semua tahun.
+    """
+    __tablename__ = 'grade_policies'
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subjects.id'), nullable=True)
+    year = db.Column(db.String(9), nullable=True)
+
+    weight_nh = db.Column(db.Float, default=1.0)
+    weight_nk = db.Column(db.Float, default=1.0)
+    weight_nu = db.Column(db.Float, default=1.0)
+
+    # Kolom JSON, di-decode sekali saat baris dimuat (seperti extras di ReportRecord).
+    # Selalu ganti seluruh list.
+    # Format: [{"min": 90, "letter": "A", "desc": "..."}, {"min": "kkm", ...}, ...]
+    thresholds = db.Column('thresholds_json', db.JSON, default=list)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    subject = db.relationship('Subject')
+
+    __table_args__ = (
+        db.UniqueConstraint('subject_id', 'year', name='unique_grade_policy'),
     )
 
 class ReportRecord(db.Model):
@@ -61,32 +99,52 @@ class ReportRecord(db.Model):
     # Catatan
     notes = db.Column(db.Text) # Catatan Wali Kelas
     
-    # Ekstrakurikuler / Kepribadian (Disimpan sebagai JSON Text)
+    # Ekstrakurikuler / Kepribadian: kolom JSON (teks yang sama seperti dulu),
+    # di-decode sekali saat baris dimuat, bukan di setiap akses.
+    # Ubah isi list langsung (append/hapus) atau ganti seluruh list.
     # Format: [{"name": "Kegiatan", "grade": "A", "desc": "Keterangan"}, ...]
-    extra_json = db.Column(db.Text, default='[]')
+    extras = db.Column('extra_json', MutableList.as_mutable(db.JSON), default=list)
     
     # Format: [{"aspect": "Kedisiplinan", "grade": "Baik", "desc": "Selalu displin"}, ...]
-    personality_json = db.Column(db.Text, default='[]')
+    personality = db.Column('personality_json', MutableList.as_mutable(db.JSON), default=list)
     
     personality_rank = db.Column(db.String(50)) # Deprecated/Simple version
     
-    # Helper properties
-    @property
-    def extras(self):
-        import json
-        if self.extra_json:
-            try: return json.loads(self.extra_json)
-            except: pass
-        return []
-
-    @property
-    def personality(self):
-        import json
-        if self.personality_json:
-            try: return json.loads(self.personality_json)
-            except: pass
-        return []
-    
     __table_args__ = (
         db.UniqueConstraint('student_id', 'semester', 'year', name='unique_student_report'),
+        # Data kehadiran/catatan per semester
+        db.Index('ix_report_records_semester_year', 'semester', 'year'),
     )
+
+class StudentSemesterSummary(db.Model):
+    """
+    Ringkasan nilai per santri per semester (materialized).
+    Diperbarui setiap kali nilai disimpan, sehingga raport & dashboard
+    cukup membaca satu baris:
+    - Jumlah & rata-rata NR
+    - Jumlah mapel di bawah KKM
+    - Peringkat kelas
+    """
+    __tablename__ = 'student_semester_summaries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+
+    semester = db.Column(db.Integer, nullable=False)
+    year = db.Column(db.String(9), nullable=False)
+    class_name = db.Column(db.String(20)) # Kelompok peringkat (dari ReportRecord)
+
+    total = db.Column(db.Float, default=0.0)
+    average = db.Column(db.Float, nullable=True)
+    subject_count = db.Column(db.Integer, default=0) # Mapel yang sudah ada NR
+    below_kkm = db.Column(db.Integer, default=0)
+    class_rank = db.Column(db.Integer, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'semester', 'year', name='unique_student_summary'),
+        # Peringkat & dashboard per semester
+        db.Index('ix_summaries_semester_year', 'semester', 'year'),
+    )
+
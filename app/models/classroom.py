@@ -0,0 +1,34 @@
+from app.core.extensions import db
+
+class Classroom(db.Model):
+    """Kelas / rombel dalam satu tahun ajaran (e.g., "AWALIYAH 1" 2024/2025)"""
+    __tablename__ = 'classrooms'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(20), nullable=False)
+    year = db.Column(db.String(9), nullable=False) # "2024/2025"
+    homeroom_teacher = db.Column(db.String(100)) # Wali Kelas
+
+    memberships = db.relationship('ClassMembership', backref='classroom', lazy='dynamic', cascade="all, delete-orphan")
+
+    __table_args__ = (
+        db.UniqueConstraint('name', 'year', name='unique_classroom_year'),
+    )
+
+    def __repr__(self):
+        return f'<Classroom {self.name} {self.year}>'
+
+class ClassMembership(db.Model):
+    """Anggota kelas: satu santri satu kelas per tahun ajaran"""
+    __tablename__ = 'class_memberships'
+
+    id = db.Column(db.Integer, primary_key=True)
+    classroom_id = db.Column(db.Integer, db.ForeignKey('classrooms.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    year = db.Column(db.String(9), nullable=False) # Sama dengan classroom.year
+
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'year', name='unique_student_class_year'),
+        # Semua query per kelas (input nilai, raport, cetak massal)
+        db.Index('ix_class_memberships_classroom', 'classroom_id', 'student_id'),
+    )
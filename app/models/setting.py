@@ -1,21 +1,68 @@
+from flask import g
+from sqlalchemy import cast, Integer
 from app.core.extensions import db
 
+# Process-level cache of the whole settings table.
+# 'version' mirrors the VERSION_KEY row, so a change saved by any worker
+# is picked up on the next request without re-reading every key.
+_cache = {'version': None, 'values': None}
+
 class Setting(db.Model):
     __tablename__ = 'settings'
-    
+
+    VERSION_KEY = '_version'
+
     key = db.Column(db.String(50), primary_key=True)
     value = db.Column(db.Text)
-    
+
+    @staticmethod
+    def _current_version():
+        """Reads the version counter at most once per request/app context"""
+        if 'settings_version' not in g:
+            row = db.session.get(Setting, Setting.VERSION_KEY)
+            g.settings_version = row.value if row else '0'
+        return g.settings_version
+
+    @staticmethod
+    def get_all():
+        """Returns {key: value} for all settings, served from the process cache"""
+        version = Setting._current_version()
+        if _cache['values'] is None or _cache['version'] != version:
+            _cache['values'] = {s.key: s.value for s in Setting.query.all()}
+            _cache['version'] = version
+        return _cache['values']
+
     @staticmethod
     def get_value(key, default=None):
-        s = Setting.query.get(key)
-        return s.value if s else default
-    
+        return Setting.get_all().get(key, default)
+
     @staticmethod
     def set_value(key, value):
-        s = Setting.query.get(key)
-        if not s:
-            s = Setting(key=key)
-            db.session.add(s)
-        s.value = value
+        Setting.set_values({key: value})
+
+    @staticmethod
+    def set_values(values):
+        """Writes several settings in one transaction and bumps the version counter"""
+        existing = {s.key: s for s in Setting.query.filter(Setting.key.in_(list(values))).all()}
+        for key, value in values.items():
+            s = existing.get(key)
+            if not s:
+                s = Setting(key=key)
+                db.session.add(s)
+            s.value = value
+
+        # Atomic increment so concurrent workers never lose a bump
+        bumped = Setting.query.filter_by(key=Setting.VERSION_KEY).update(
+            {Setting.value: cast(cast(Setting.value, Integer) + 1, db.Text)},
+            synchronize_session=False
+        )
+        if not bumped:
+            db.session.add(Setting(key=Setting.VERSION_KEY, value='1'))
         db.session.commit()
+        Setting.invalidate_cache()
+
+    @staticmethod
+    def invalidate_cache():
+        _cache['values'] = None
+        _cache['version'] = None
+        g.pop('settings_version', None)
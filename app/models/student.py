@@ -15,6 +15,13 @@ class Student(db.Model):
     # Relationships
     grades = db.relationship('Grade', backref='student', lazy='dynamic', cascade="all, delete-orphan")
     report_records = db.relationship('ReportRecord', backref='student', lazy='dynamic', cascade="all, delete-orphan")
+    summaries = db.relationship('StudentSemesterSummary', backref='student', lazy='dynamic', cascade="all, delete-orphan")
+    memberships = db.relationship('ClassMembership', backref='student', lazy='dynamic', cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Daftar santri & raport: keyset pagination (active DESC, name, id)
+        db.Index('ix_students_active_name_id', 'active', 'name', 'id'),
+    )
 
     def __repr__(self):
         return f'<Student {self.name}>'
@@ -1,4 +1,4 @@
-from flask import render_template
+from flask import render_template, request, jsonify
 from flask_login import login_required
 from . import dashboard_bp
 
@@ -6,16 +6,47 @@ from . import dashboard_bp
 @dashboard_bp.route('/dashboard')
 @login_required
 def index():
-    from app.models import Student, Subject, Grade
     from app.core.extensions import db
+    from app.models.setting import Setting
+    from app.services.classroom_service import ClassroomService
+    current_year = Setting.get_value('academic_year', '2024/2025')
     
-    student_count = Student.query.count()
-    subject_count = Subject.query.count()
-    # Unique classes logic (Approximation based on grade level or manually set groups?)
-    # For now, placeholder or derived
-    class_count = 1 # Single class for now
+    # Optional class filter (class of the current academic year)
+    classes = ClassroomService.list_classes(current_year)
+    class_id = request.args.get('class_id', type=int)
+    selected_class = next((c for c in classes if c.id == class_id), None)
     
+    # Ranking comes precomputed from the summary table
+    from app.models import StudentSemesterSummary
+    from app.services.summary_service import SummaryService
+    from app.services.dashboard_service import DashboardService
+    latest_semester = db.session.query(db.func.max(StudentSemesterSummary.semester)).filter(
+        StudentSemesterSummary.year == current_year
+    ).scalar()
+    top_students = SummaryService.top_students(
+        latest_semester, current_year, class_name=selected_class.name if selected_class else None
+    ) if latest_semester else []
+
+    # Aggregates come from the stats cache
+    semester = request.args.get('semester', latest_semester or 1, type=int)
+    stats = DashboardService.get_stats(semester, current_year, selected_class.id if selected_class else None)
+
     return render_template('pages/dashboard/index.html', 
-                           student_count=student_count,
-                           subject_count=subject_count,
-                           class_count=class_count)
+                           stats=stats,
+                           student_count=stats['student_count'],
+                           subject_count=stats['subject_count'],
+                           class_count=len(classes),
+                           classes=classes,
+                           selected_class=selected_class,
+                           top_students=top_students,
+                           top_semester=latest_semester)
+
+@dashboard_bp.route('/dashboard/stats')
+@login_required
+def stats():
+    """Dashboard aggregates as JSON (?semester=, ?class_id=), from the stats cache"""
+    from app.models.setting import Setting
+    from app.services.dashboard_service import DashboardService
+    current_year = Setting.get_value('academic_year', '2024/2025')
+    semester = request.args.get('semester', 1, type=int)
+    return jsonify(DashboardService.get_stats(semester, current_year, request.args.get('class_id', type=int)))
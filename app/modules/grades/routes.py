@@ -1,8 +1,40 @@
 from flask import render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from . import grades_bp
-from app.models import Subject, Student, Grade
+from app.models import Subject, Student
 from app.core.extensions import db
+from app.services.grade_service import GradeService
+from app.services.summary_service import SummaryService
+from app.services.grade_policy_service import GradePolicyService
+from app.services.classroom_service import ClassroomService
+from app.services.dashboard_service import DashboardService
+
+# Students per page on the grade and extras grids
+GRID_PER_PAGE = 50
+
+def _grid_page(class_id, page, student_id=None):
+    """One page of students for a grid, optionally limited to one class or one student (search)"""
+    query = ClassroomService.scope(Student.query, class_id)
+    if student_id:
+        query = query.filter(Student.id == student_id)
+    return query.order_by(Student.name, Student.id).paginate(page=page, per_page=GRID_PER_PAGE, error_out=False)
+
+def _posted_rows(fields):
+    """
+    Rows present in the POST as {student_id: {field: raw value}}.
+    The grid only sends rows that were edited, so this is the unit of work.
+    Ids of students that no longer exist are dropped.
+    """
+    rows = {}
+    for key, value in request.form.items():
+        parts = key.split('_', 2) # s_<id>_<field>
+        if len(parts) != 3 or parts[0] != 's' or not parts[1].isdigit() or parts[2] not in fields:
+            continue
+        rows.setdefault(int(parts[1]), {})[parts[2]] = value
+    if rows:
+        known = {r.id for r in db.session.query(Student.id).filter(Student.id.in_(list(rows)))}
+        rows = {sid: values for sid, values in rows.items() if sid in known}
+    return rows
 
 @grades_bp.route('/')
 @login_required
@@ -20,132 +52,83 @@ def index():
 def edit():
     subject_id = request.args.get('subject_id', type=int)
     semester = request.args.get('semester', 1, type=int)
+    class_id = request.args.get('class_id', type=int)
+    page = request.args.get('page', 1, type=int)
     
     if not subject_id:
         return redirect(url_for('grades.index'))
     
     subject = Subject.query.get_or_404(subject_id)
-    students = Student.query.order_by(Student.name).all()
+    from app.models.setting import Setting
+    current_year = Setting.get_value('academic_year', '2024/2025')
     
     if request.method == 'POST':
-        # Handle Batch Update
+        # Handle Batch Update (edited rows only)
         try:
-            from app.models.setting import Setting
-            current_year = Setting.get_value('academic_year', '2024/2025')
+            # Validation / Cleaning
+            def clean_val(v):
+                if not v or v.strip() == '': return None
+                return float(v)
+            
+            rows = {}
+            for student_id, values in _posted_rows(('nh', 'nk', 'nu')).items():
+                rows[student_id] = {f: clean_val(values.get(f)) for f in ('nh', 'nk', 'nu')}
             
-            count_updated = 0
-            for student in students:
-                prefix = f"s_{student.id}_"
-                
-                # Get inputs
-                nh = request.form.get(f"{prefix}nh")
-                nk = request.form.get(f"{prefix}nk")
-                nu = request.form.get(f"{prefix}nu")
-                
-                # Validation / Cleaning
-                def clean_val(v):
-                    if not v or v.strip() == '': return None
-                    return float(v)
-                
-                nh_val = clean_val(nh)
-                nk_val = clean_val(nk)
-                nu_val = clean_val(nu)
-                
-                # Calculate NR (Example Logic: Average if incomplete, or custom)
-                # Excel Logic seems to be: If incomplete, avg. If complete, weighted.
-                # Let's simple Avg for now
-                vals = [v for v in [nh_val, nk_val, nu_val] if v is not None]
-                nr_val = sum(vals) / len(vals) if vals else None
-                
-                # Save
-                g = Grade.query.filter_by(
-                    student_id=student.id,
-                    subject_id=subject.id,
-                    semester=semester,
-                    year=current_year
-                ).first()
-                
-                if not g:
-                    g = Grade(student_id=student.id, subject_id=subject.id, semester=semester, year=current_year)
-                    db.session.add(g)
-                
-                g.nh = nh_val
-                g.nk = nk_val
-                g.nu = nu_val
-                g.nr = nr_val
-                
-                count_updated += 1
+            # NR, predikat & terbilang from the grade policy (one vectorized pass)
+            GradePolicyService.apply(subject, current_year, rows)
             
+            # Save (one SELECT + one bulk upsert)
+            result = GradeService.upsert_grades(subject.id, semester, current_year, rows)
+            # Keep totals/averages/ranks in sync for the students that changed
+            SummaryService.refresh(semester, current_year, result['changed'])
+            DashboardService.invalidate()
             db.session.commit()
-            flash(f'Nilai berhasil disimpan ({count_updated} siswa).')
-            return redirect(url_for('grades.edit', subject_id=subject_id, semester=semester))
+            flash(f"Nilai berhasil disimpan ({result['inserted']} baru, {result['updated']} diubah, {result['unchanged']} tetap).")
+            return redirect(url_for('grades.edit', **request.args))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Gagal menyimpan: {str(e)}')
     
-    # Pre-fetch existing grades for display
+    students = _grid_page(class_id, page, request.args.get('student_id', type=int))
+    
+    # Pre-fetch existing grades of this page for display
     # Dict mapping student_id -> GradeObj
-    from app.models.setting import Setting
-    current_year = Setting.get_value('academic_year', '2024/2025')
-    existing_grades = {}
-    grades_q = Grade.query.filter_by(subject_id=subject.id, semester=semester, year=current_year).all()
-    for g in grades_q:
-        existing_grades[g.student_id] = g
+    existing_grades = GradeService.load_existing(subject.id, semester, current_year, [s.id for s in students.items])
     
-    return render_template('pages/grades/edit.html', subject=subject, students=students, existing_grades=existing_grades, semester=semester)
+    return render_template('pages/grades/edit.html', subject=subject, students=students, existing_grades=existing_grades,
+                           semester=semester, current_year=current_year, class_id=class_id,
+                           class_options=ClassroomService.list_classes(current_year))
 
 @grades_bp.route('/extras', methods=['GET', 'POST'])
 @login_required
 def extras():
-    # List all students to pick one to edit extras
-    
-    students = Student.query.order_by(Student.name).all()
+    # Attendance & notes grid, one page of students at a time
+    from app.models.setting import Setting
+    from app.services.extras_service import ExtrasService
+    semester = request.args.get('semester', 1, type=int)
+    class_id = request.args.get('class_id', type=int)
+    page = request.args.get('page', 1, type=int)
+    current_year = Setting.get_value('academic_year', '2024/2025')
     
     if request.method == 'POST':
         try:
-            # Batch update simplified: Just Attendance & Notes for now
-            count = 0
-            for s in students:
-                prefix = f"s_{s.id}_"
-                sakit = request.form.get(f"{prefix}sakit")
-                izin = request.form.get(f"{prefix}izin")
-                alpa = request.form.get(f"{prefix}alpa")
-                notes = request.form.get(f"{prefix}notes")
-                
-                # Retrieve or Create Record
-                
-                from app.models import ReportRecord
-                rr = ReportRecord.query.filter_by(
-                    student_id=s.id, semester=1, year='2024/2025'
-                ).first()
-                
-                if not rr:
-                    rr = ReportRecord(student_id=s.id, semester=1, year='2024/2025')
-                    # Defaults for JSON
-                    rr.extra_json = '[{"name": "Muhadloroh", "grade": "B", "desc": "Baik"}, {"name": "Sholat Berjamaah", "grade": "A", "desc": "Sangat Baik"}]'
-                    rr.personality_json = '[{"aspect": "Kedisiplinan", "grade": "Baik", "desc": "Tertib"}, {"aspect": "Kebersihan", "grade": "Baik", "desc": "Rapi"}]'
-                    db.session.add(rr)
-                
-                if sakit: rr.attendance_sakit = int(sakit)
-                if izin: rr.attendance_izin = int(izin)
-                if alpa: rr.attendance_alpa = int(alpa)
-                if notes: rr.notes = notes
-                
-                count += 1
-            
+            # Edited rows only; a handful of statements whatever the page size
+            result = ExtrasService.save_extras(semester, current_year, _posted_rows(tuple(ExtrasService.FIELDS)))
+            if result['changed']:
+                DashboardService.invalidate()
             db.session.commit()
-            flash('Data kehadiran & catatan berhasil disimpan.')
-            return redirect(url_for('grades.extras'))
+            flash(f"Data kehadiran & catatan berhasil disimpan ({result['inserted']} baru, {result['updated']} diubah, {result['unchanged']} tetap).")
+            return redirect(url_for('grades.extras', **request.args))
             
         except Exception as e:
             db.session.rollback()
             flash(f'Error: {e}')
             
-    # Fetch existing data to populate form
-    from app.models import ReportRecord
-    from app.models.setting import Setting
-    current_year = Setting.get_value('academic_year', '2024/2025')
-    records = {r.student_id: r for r in ReportRecord.query.filter_by(semester=1, year=current_year).all()}
+    # Fetch existing data of this page to populate form
+    students = _grid_page(class_id, page, request.args.get('student_id', type=int))
+    records = ExtrasService.load_records(semester, current_year, [s.id for s in students.items])
     
-    return render_template('pages/grades/extras.html', students=students, records=records)
+    return render_template('pages/grades/extras.html', students=students, records=records,
+                           semester=semester, current_year=current_year,
+                           class_id=class_id, class_options=ClassroomService.list_classes(current_year))
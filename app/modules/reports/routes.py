@@ -1,45 +1,97 @@
-from flask import render_template, make_response, request
-from flask_login import login_required
+from flask import render_template, make_response, request, redirect, url_for, flash, send_file, abort
+from flask_login import login_required, current_user
 from . import reports_bp
-from app.models import Student, Subject, Grade, ReportRecord
+from app.models import Student
+from app.services.report_service import ReportService
+from app.services.report_pdf_service import ReportPdfService
+from app.services.job_service import JobService
+from app.services.classroom_service import ClassroomService
+from app.services.student_service import StudentService
+from app.services.archive_service import ArchiveService
 
 @reports_bp.route('/')
 @login_required
 def index():
-    # List student to print with Pagination
-    page = request.args.get('page', 1, type=int)
-    students = Student.query.order_by(Student.name).paginate(page=page, per_page=12, error_out=False)
-    return render_template('pages/reports/index.html', students=students)
+    # List student to print with Pagination, optionally per class
+    from app.models.setting import Setting
+    class_id = request.args.get('class_id', type=int)
+    year = request.args.get('year')
+    if ArchiveService.is_archived(year):
+        return _archive_index(year, class_id)
+    current_year = Setting.get_value('academic_year', '2024/2025')
+    query = ClassroomService.scope(Student.query, class_id)
+    students = StudentService.page(query, 12, after=request.args.get('after', type=int),
+                                   before=request.args.get('before', type=int),
+                                   start=request.args.get('n', 1, type=int), count_key=('reports', class_id))
+    return render_template('pages/reports/index.html', students=students, class_id=class_id,
+                           class_options=ClassroomService.list_classes(current_year),
+                           archived_years=ArchiveService.list_years())
+
+def _archive_index(year, class_id):
+    """Classes of an archived year and, for the selected class, its students"""
+    from app.models import Classroom, ClassMembership
+    from app.core.extensions import db
+    with ArchiveService.session(year) as session:
+        counts = dict(session.query(ClassMembership.classroom_id, db.func.count(ClassMembership.id))
+                      .group_by(ClassMembership.classroom_id).all())
+        classes = session.query(Classroom).order_by(Classroom.name).all()
+        for c in classes:
+            c.member_count = counts.get(c.id, 0)
+        students = []
+        if class_id:
+            students = ClassroomService.scope(session.query(Student), class_id).order_by(Student.name).all()
+        return render_template('pages/reports/archive.html', year=year, class_id=class_id, class_options=classes,
+                               students=students, archived_years=ArchiveService.list_years())
 
 # IMPORTANT: Route name should match url_for('reports.print_report')
 @reports_bp.route('/<int:student_id>/print')
 @login_required
 def print_report(student_id):
     semester = request.args.get('semester', 1, type=int)
+    year = request.args.get('year')
+    if ArchiveService.is_archived(year):
+        # Rendered while the archive is attached
+        with ArchiveService.session(year) as session:
+            student = session.get(Student, student_id) or abort(404)
+            context = ReportService.get_report_context(student, semester, year, session=session)
+            return render_template('pages/reports/print_template.html', **context)
+
     student = Student.query.get_or_404(student_id)
     
-    # Get all subjects
-    subjects = Subject.query.order_by(Subject.order, Subject.id).all()
-    
-    # Get Grades
-    from app.models.setting import Setting
-    current_year = Setting.get_value('academic_year', '2024/2025')
-    
-    grades_q = Grade.query.filter_by(student_id=student_id, semester=semester, year=current_year).all()
-    grades = {g.subject_id: g for g in grades_q}
-        
-    # Extra Records (Attendance, Notes, JSONs)
-    rr = ReportRecord.query.filter_by(student_id=student_id, semester=semester, year=current_year).first()
-    
-    # Default empty structure if not found
-    record = rr if rr else ReportRecord(
-        attendance_sakit=0, attendance_izin=0, attendance_alpa=0, 
-        notes="-", extra_json='[]', personality_json='[]'
-    )
-    
-    return render_template('pages/reports/print_template.html', 
-                           student=student,
-                           subjects=subjects,
-                           grades=grades,
-                           semester=semester,
-                           record=record)
+    context = ReportService.get_report_context(student, semester, year)
+    return render_template('pages/reports/print_template.html', **context)
+
+# --- BATCH PDF ---
+
+@reports_bp.route('/batch', methods=['POST'])
+@login_required
+def batch_print():
+    semester = request.form.get('semester', 1, type=int)
+    classroom_id = request.form.get('classroom_id', type=int)
+    output = request.form.get('output', 'zip')
+    year = request.form.get('year') or None
+    try:
+        user_id = current_user.id if current_user.is_authenticated else None
+        job_id = ReportPdfService.start_batch(semester, classroom_id=classroom_id, output=output, user_id=user_id,
+                                              year=year)
+        return redirect(url_for('reports.batch_status', job_id=job_id))
+    except Exception as e:
+        flash(f'Gagal memulai cetak massal: {str(e)}', 'error')
+        return redirect(url_for('reports.index', year=year))
+
+@reports_bp.route('/batch/<job_id>')
+@login_required
+def batch_status(job_id):
+    job = JobService.get_job(job_id)
+    if not job or job['kind'] != 'report_pdf':
+        abort(404)
+    return render_template('pages/reports/batch.html', job=job)
+
+@reports_bp.route('/batch/<job_id>/download')
+@login_required
+def batch_download(job_id):
+    job = JobService.get_job(job_id)
+    if not job or job['kind'] != 'report_pdf' or job['status'] != 'done':
+        abort(404)
+    output_file = job['result']['output_file']
+    return send_file(ReportPdfService.get_output_path(output_file), as_attachment=True, download_name=output_file)
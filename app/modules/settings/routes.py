@@ -1,25 +1,15 @@
-from flask import render_template, request, flash, redirect, url_for, send_file, current_app
+import os
+from flask import render_template, request, flash, redirect, url_for, send_file, jsonify
 from flask_login import login_required, current_user
 from . import settings_bp
-from app.models import Setting, Grade, ReportRecord, Subject
+from app.models import Setting, Grade, GradePolicy, ReportRecord, Subject, Classroom
 from app.core.extensions import db
-from sqlalchemy import text
 from app.services.backup_service import BackupService
-from app.services.import_service import ImportService
-import os
+from app.services.job_service import JobService
 
 @settings_bp.route('/', methods=['GET', 'POST'])
 @login_required
 def index():
-    # Ensure table exists (Lazy migration)
-    try:
-        Setting.query.first()
-    except:
-        try:
-            with db.session.begin():
-                db.session.execute(text("CREATE TABLE IF NOT EXISTS settings (key VARCHAR(50) PRIMARY KEY, value TEXT)"))
-        except: pass
-
     # Prepare common data
     backups = BackupService.get_backups()
     years = []
@@ -57,9 +47,9 @@ def index():
                          flash('Pilih tahun ajaran untuk backup.', 'error')
                          return redirect(url_for('settings.index'))
 
-                BackupService.create_backup(description=desc, year_filter=year_filter)
-                flash('Backup berhasil dibuat dan disimpan di server.', 'success')
-                return redirect(url_for('settings.index'))
+                job_id = JobService.enqueue('backup', user_id=_user_id(), description=desc, year_filter=year_filter)
+                flash('Backup sedang dibuat di latar belakang.', 'success')
+                return redirect(url_for('settings.index', job=job_id))
             except Exception as e:
                 flash(f'Gagal membuat backup: {str(e)}', 'error')
         
@@ -69,14 +59,10 @@ def index():
                 flash('Konfirmasi reset tidak valid. Ketik "RESET DATA" dengan tepat.', 'error')
             else:
                 try:
-                    # Auto Backup
-                    BackupService.create_backup(description="AutoBackup_BeforeReset")
-                    user_id = current_user.id if current_user.is_authenticated else None
-                    success, msg = BackupService.reset_academic_data(user_id=user_id)
-                    if success:
-                        flash(msg, 'success')
-                    else:
-                        flash(msg, 'warning')
+                    # Auto backup runs inside the job, before the reset
+                    job_id = JobService.enqueue('reset', user_id=_user_id())
+                    flash('Reset data berjalan di latar belakang.', 'success')
+                    return redirect(url_for('settings.index', job=job_id))
                 except Exception as e:
                     flash(f'Gagal reset data: {str(e)}', 'error')
             return redirect(url_for('settings.index'))
@@ -84,10 +70,9 @@ def index():
         elif action == 'download_backup':
             try:
                 filename = request.form.get('filename')
-                backup_dir = os.path.join(current_app.root_path, '..', 'storage', 'backups')
-                path = os.path.join(backup_dir, filename)
-                if os.path.exists(path):
-                    return send_file(path, as_attachment=True, download_name=filename)
+                source, download_name = BackupService.open_backup(filename)
+                if source:
+                    return send_file(source, as_attachment=True, download_name=download_name)
                 flash('File tidak ditemukan', 'error')
             except Exception as e:
                 flash(f'Error: {str(e)}', 'error')
@@ -95,10 +80,9 @@ def index():
         elif action == 'restore_local':
             filename = request.form.get('filename')
             try:
-                user_id = current_user.id if current_user.is_authenticated else None
-                BackupService.restore_from_local(filename, user_id=user_id)
-                flash('Database berhasil dipulihkan dari backup server. Silakan refresh.', 'success')
-                return redirect(url_for('settings.index'))
+                job_id = JobService.enqueue('restore_local', user_id=_user_id(), filename=filename)
+                flash('Restore database berjalan di latar belakang.', 'success')
+                return redirect(url_for('settings.index', job=job_id))
             except Exception as e:
                 flash(f'Gagal restore: {str(e)}', 'error')
 
@@ -121,11 +105,16 @@ def index():
                 if file.filename == '':
                     flash('Tidak ada file yang dipilih', 'error')
                 else:
+                    path = None
                     try:
-                        BackupService.restore_backup(file)
-                        flash('Database berhasil dipulihkan. Silakan refresh halaman.', 'success')
-                        return redirect(url_for('settings.index'))
+                        path = JobService.save_upload(file)
+                        job_id = JobService.enqueue('restore_upload', user_id=_user_id(), path=path, filename=file.filename)
+                        flash('Restore database berjalan di latar belakang.', 'success')
+                        return redirect(url_for('settings.index', job=job_id))
                     except Exception as e:
+                        # Refused (e.g. another exclusive job running): drop the saved upload
+                        if path and os.path.exists(path):
+                            os.remove(path)
                         flash(f'Gagal restore: {str(e)}', 'error')
 
         elif action == 'prune':
@@ -138,19 +127,32 @@ def index():
                 flash('Konfirmasi penghapusan tidak valid. Harap ketik "YES".', 'error')
             else:
                 try:
-                    # Auto backup before prune
-                    BackupService.create_backup(description=f"AutoBackup_BeforePrune_{year.replace('/', '-')}")
-                    
-                    user_id = current_user.id if current_user.is_authenticated else None
-                    success, msg = BackupService.prune_year(year, user_id=user_id)
-                    if success:
-                        flash(msg, 'success')
-                    else:
-                        flash(msg, 'warning')
-                    return redirect(url_for('settings.index'))
+                    # Auto backup runs inside the job, before the prune
+                    job_id = JobService.enqueue('prune', user_id=_user_id(), year=year)
+                    flash(f'Penghapusan data {year} berjalan di latar belakang.', 'success')
+                    return redirect(url_for('settings.index', job=job_id))
                 except Exception as e:
                     flash(f'Gagal menghapus data: {str(e)}', 'error')
 
+        elif action == 'archive_year':
+            year = request.form.get('archive_year')
+            if not year:
+                flash('Pilih tahun ajaran terlebih dahulu.', 'error')
+            else:
+                try:
+                    job_id = JobService.enqueue('archive', user_id=_user_id(), year=year)
+                    flash(f'Pengarsipan data {year} berjalan di latar belakang.', 'success')
+                    return redirect(url_for('settings.index', job=job_id))
+                except Exception as e:
+                    flash(f'Gagal mengarsipkan data: {str(e)}', 'error')
+
+        elif action == 'download_archive':
+            from app.services.archive_service import ArchiveService
+            year = request.form.get('year')
+            if ArchiveService.is_archived(year):
+                return send_file(ArchiveService.get_path(year), as_attachment=True)
+            flash('File arsip tidak ditemukan.', 'error')
+
         elif action == 'import_students':
             if 'import_file' not in request.files:
                 flash('Tidak ada file yang dipilih', 'error')
@@ -159,12 +161,10 @@ def index():
                 if file.filename == '':
                     flash('Tidak ada file yang dipilih', 'error')
                 else:
-                    success, msg = ImportService.import_students(file)
-                    if success:
-                        flash(msg, 'success')
-                    else:
-                        flash(msg, 'error')
-                    return redirect(url_for('settings.index'))
+                    path = JobService.save_upload(file)
+                    job_id = JobService.enqueue('import_students', user_id=_user_id(), path=path, filename=file.filename)
+                    flash('Import data siswa berjalan di latar belakang.', 'success')
+                    return redirect(url_for('settings.index', job=job_id))
 
         else:
             # Normal Settings Save
@@ -176,15 +176,42 @@ def index():
                 'class_name_default' # Kelas Default
             ]
             
-            for k in keys:
-                val = request.form.get(k, '')
-                Setting.set_value(k, val)
+            Setting.set_values({k: request.form.get(k, '') for k in keys})
                 
             flash('Pengaturan berhasil disimpan.', 'success')
             return redirect(url_for('settings.index'))
     
+    from app.services.archive_service import ArchiveService
+    archives = ArchiveService.list_archives()
+    current_year = Setting.get_value('academic_year', '2024/2025')
+    archivable_years = [y for y in years if y != current_year]
+
+    # Background job started by a previous POST
+    job = None
+    job_id = request.args.get('job')
+    if job_id:
+        job = JobService.get_job(job_id)
+
     # If not POST or if fall through (analyze_prune), render template
-    return render_template('pages/settings/index.html', Setting=Setting, backups=backups, years=years, impact_data=impact_data, estimates=estimates)
+    return render_template('pages/settings/index.html', Setting=Setting, backups=backups, years=years, impact_data=impact_data, estimates=estimates, job=job,
+                           archives=archives, archivable_years=archivable_years)
+
+def _user_id():
+    return current_user.id if current_user.is_authenticated else None
+
+
+@settings_bp.route('/backup/status')
+@login_required
+def backup_status():
+    return jsonify(BackupService.get_backup_status())
+
+@settings_bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = JobService.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job tidak ditemukan'}), 404
+    return jsonify(job)
 
 
 # --- SUBJECT MANAGEMENT ROUTES ---
@@ -230,8 +257,19 @@ def edit_subject(id):
     try:
         subject.code = request.form.get('code')
         subject.name = request.form.get('name')
+        kkm_changed = subject.kkm != float(request.form.get('kkm'))
         subject.kkm = float(request.form.get('kkm'))
         subject.order = int(request.form.get('order'))
+
+        if kkm_changed:
+            # Predikat thresholds and "below KKM" counts depend on the KKM
+            from app.services.grade_policy_service import GradePolicyService
+            from app.services.summary_service import SummaryService
+            GradePolicyService.recompute(subject_id=subject.id)
+            # Every (semester, year) with grades of this subject, not just the active year
+            pairs = db.session.query(Grade.semester, Grade.year).filter(Grade.subject_id == subject.id).distinct().all()
+            for semester, year in pairs:
+                SummaryService.refresh(semester, year)
         
         db.session.commit()
         flash('Mata pelajaran berhasil diperbarui.', 'success')
@@ -305,3 +343,164 @@ def seed_default_subjects():
         flash(f'Gagal menambahkan mata pelajaran default: {str(e)}', 'error')
         
     return redirect(url_for('settings.subjects_index'))
+
+# --- GRADE POLICIES ---
+
+@settings_bp.route('/grade-policies', methods=['GET'])
+@login_required
+def grade_policies():
+    from app.services.grade_policy_service import GradePolicyService
+    policies = GradePolicy.query.order_by(GradePolicy.subject_id, GradePolicy.year).all()
+    subjects = Subject.query.order_by(Subject.order, Subject.id).all()
+    return render_template('pages/settings/grade_policies.html',
+                           policies=policies, subjects=subjects,
+                           default_thresholds=GradePolicyService.DEFAULT_THRESHOLDS)
+
+@settings_bp.route('/grade-policies/save', methods=['POST'])
+@login_required
+def save_grade_policy():
+    from app.services.grade_policy_service import GradePolicyService
+    try:
+        subject_id = request.form.get('subject_id', type=int) or None
+        year = request.form.get('year', '').strip() or None
+        weights = tuple(float(request.form.get(f"weight_{f}") or 0) for f in ('nh', 'nk', 'nu'))
+        if sum(weights) <= 0:
+            raise Exception("Minimal satu bobot harus lebih dari 0.")
+
+        thresholds = []
+        for i in range(len(request.form.getlist('t_letter'))):
+            letter = request.form.getlist('t_letter')[i].strip()
+            minimum = request.form.getlist('t_min')[i].strip().lower()
+            if not letter or not minimum:
+                continue
+            thresholds.append({
+                'min': 'kkm' if minimum == 'kkm' else float(minimum),
+                'letter': letter,
+                'desc': request.form.getlist('t_desc')[i].strip()
+            })
+        if not thresholds:
+            raise Exception("Isi minimal satu ambang predikat.")
+
+        updated = GradePolicyService.save_policy(subject_id, year, weights, thresholds)
+        db.session.commit()
+        flash(f'Aturan nilai disimpan. {updated} nilai dihitung ulang.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Gagal menyimpan aturan nilai: {str(e)}', 'error')
+    return redirect(url_for('settings.grade_policies'))
+
+@settings_bp.route('/grade-policies/delete/<int:id>', methods=['POST'])
+@login_required
+def delete_grade_policy(id):
+    from app.services.grade_policy_service import GradePolicyService
+    policy = GradePolicy.query.get_or_404(id)
+    try:
+        updated = GradePolicyService.delete_policy(policy)
+        db.session.commit()
+        flash(f'Aturan nilai dihapus. {updated} nilai dihitung ulang.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Gagal menghapus aturan nilai: {str(e)}', 'error')
+    return redirect(url_for('settings.grade_policies'))
+
+@settings_bp.route('/grade-policies/recompute', methods=['POST'])
+@login_required
+def recompute_grades():
+    """Recomputes every stored grade (e.g. grades entered before policies existed)"""
+    from app.services.grade_policy_service import GradePolicyService
+    try:
+        updated = GradePolicyService.recompute()
+        db.session.commit()
+        flash(f'{updated} nilai dihitung ulang.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Gagal menghitung ulang nilai: {str(e)}', 'error')
+    return redirect(url_for('settings.grade_policies'))
+
+
+# --- CLASSES (ROMBEL) ---
+
+@settings_bp.route('/classes', methods=['GET'])
+@login_required
+def classes_index():
+    from app.services.classroom_service import ClassroomService
+    current_year = Setting.get_value('academic_year', '2024/2025')
+    classes = ClassroomService.list_classes(current_year)
+    unassigned_count = ClassroomService.unassigned(current_year).count()
+    return render_template('pages/settings/classes.html', classes=classes,
+                           unassigned_count=unassigned_count, current_year=current_year)
+
+@settings_bp.route('/classes/add', methods=['POST'])
+@login_required
+def add_class():
+    from app.services.classroom_service import ClassroomService
+    current_year = Setting.get_value('academic_year', '2024/2025')
+    try:
+        ClassroomService.create(request.form.get('name'), current_year, request.form.get('homeroom_teacher'))
+        db.session.commit()
+        flash('Kelas berhasil ditambahkan.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Gagal menambah kelas: {str(e)}', 'error')
+    return redirect(url_for('settings.classes_index'))
+
+@settings_bp.route('/classes/edit/<int:id>', methods=['POST'])
+@login_required
+def edit_class(id):
+    from app.services.classroom_service import ClassroomService
+    classroom = Classroom.query.get_or_404(id)
+    try:
+        ClassroomService.update(classroom, request.form.get('name'), request.form.get('homeroom_teacher'))
+        db.session.commit()
+        flash('Kelas berhasil diperbarui.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Gagal update kelas: {str(e)}', 'error')
+    return redirect(url_for('settings.classes_index'))
+
+@settings_bp.route('/classes/delete/<int:id>', methods=['POST'])
+@login_required
+def delete_class(id):
+    from app.services.classroom_service import ClassroomService
+    classroom = Classroom.query.get_or_404(id)
+    try:
+        ClassroomService.delete(classroom)
+        db.session.commit()
+        flash('Kelas berhasil dihapus. Santri di kelas tersebut kini belum memiliki kelas.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Gagal menghapus kelas: {str(e)}', 'error')
+    return redirect(url_for('settings.classes_index'))
+
+@settings_bp.route('/classes/<int:id>/members', methods=['GET', 'POST'])
+@login_required
+def class_members(id):
+    from app.models import Student
+    from app.services.classroom_service import ClassroomService
+    classroom = Classroom.query.get_or_404(id)
+    page = request.args.get('page', 1, type=int)
+
+    if request.method == 'POST':
+        student_ids = request.form.getlist('student_ids', type=int)
+        action = request.form.get('action')
+        try:
+            if not student_ids:
+                raise Exception("Pilih minimal satu santri.")
+            if action == 'add':
+                moved = ClassroomService.assign(student_ids, classroom.id, classroom.year)
+                flash(f'{moved} santri dimasukkan ke kelas {classroom.name}.', 'success')
+            elif action == 'remove':
+                moved = ClassroomService.assign(student_ids, None, classroom.year)
+                flash(f'{moved} santri dikeluarkan dari kelas {classroom.name}.', 'success')
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Gagal menyimpan anggota kelas: {str(e)}', 'error')
+        return redirect(url_for('settings.class_members', id=id, page=page))
+
+    members = ClassroomService.scope(Student.query, classroom.id).order_by(Student.name).all()
+    candidates = ClassroomService.unassigned(classroom.year).order_by(Student.name).paginate(
+        page=page, per_page=50, error_out=False
+    )
+    return render_template('pages/settings/class_members.html', classroom=classroom,
+                           members=members, candidates=candidates)
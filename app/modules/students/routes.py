@@ -1,23 +1,59 @@
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, jsonify
 from . import students_bp
 from app.models import Student
+from app.services.student_service import StudentService
+from app.services.dashboard_service import DashboardService
 from flask_login import login_required
 
 @students_bp.route('/')
 @login_required
 def index():
-    page = request.args.get('page', 1, type=int)
-    # Default: Show active students first, then by name
-    # Pagination: 20 per page
-    pagination = Student.query.order_by(Student.active.desc(), Student.name).paginate(page=page, per_page=20, error_out=False)
-    
-    # Debug: Check if items exist
-    if pagination.total > 0 and not pagination.items and page > 1:
-        # If page is empty but total > 0, redirect to page 1
-        return redirect(url_for('students.index', page=1))
-        
+    # Active students first, then by name; 20 per page (keyset: ?after=/?before=<id>)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    pagination = StudentService.page(Student.query, 20, after=after, before=before,
+                                     start=request.args.get('n', 1, type=int), count_key='students')
+
+    # Cursor past the end (e.g. its students were deleted): back to the first page
+    if not pagination.items and (after or before) and pagination.total:
+        return redirect(url_for('students.index'))
+
     return render_template('pages/students/index.html', students=pagination)
 
+@students_bp.route('/search')
+@login_required
+def search():
+    """Type-ahead search on name / NIS (JSON), optionally within one class"""
+    from app.services.classroom_service import ClassroomService
+    limit = min(request.args.get('limit', StudentService.SEARCH_LIMIT, type=int), 50)
+    students = StudentService.search(request.args.get('q', ''), limit=limit,
+                                     classroom_id=request.args.get('class_id', type=int))
+    class_names = ClassroomService.class_names([s.id for s in students], _current_year()) if students else {}
+    return jsonify({'results': [
+        {'id': s.id, 'name': s.name, 'nis': s.nis, 'active': bool(s.active), 'class_name': class_names.get(s.id)}
+        for s in students
+    ]})
+
+def _current_year():
+    from app.models.setting import Setting
+    return Setting.get_value('academic_year', '2024/2025')
+
+def _render_form(student=None, **kwargs):
+    """Student form with the class select of the current academic year"""
+    from app.services.classroom_service import ClassroomService
+    current_year = _current_year()
+    membership = student.memberships.filter_by(year=current_year).first() if student else None
+    return render_template('pages/students/form.html', student=student,
+                           class_options=ClassroomService.list_classes(current_year),
+                           classroom_id=membership.classroom_id if membership else None,
+                           current_year=current_year, **kwargs)
+
+def _save_class(student):
+    """Applies the class select of the form for the current academic year"""
+    from app.services.classroom_service import ClassroomService
+    classroom_id = request.form.get('classroom_id', type=int)
+    ClassroomService.assign([student.id], classroom_id, _current_year())
+
 @students_bp.route('/<int:id>')
 @login_required
 def detail(id):
@@ -35,19 +71,23 @@ def add():
         
         # Simple Validation
         if not name or not nis:
-            return render_template('pages/students/form.html', error="Nama dan NIS wajib diisi.")
+            return _render_form(error="Nama dan NIS wajib diisi.")
             
         # Check duplicate
         if Student.query.filter_by(nis=nis).first():
-             return render_template('pages/students/form.html', error="NIS sudah terdaftar.")
+             return _render_form(error="NIS sudah terdaftar.")
              
         new_student = Student(name=name, nis=nis, nism=nis, gender=gender, active=True)
         db.session.add(new_student)
+        db.session.flush()
+        _save_class(new_student)
+        DashboardService.invalidate()
         db.session.commit()
+        StudentService.invalidate_counts()
         
         return redirect(url_for('students.index'))
         
-    return render_template('pages/students/form.html')
+    return _render_form()
 
 @students_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -62,17 +102,18 @@ def edit(id):
         
         # Simple Validation
         if not name or not nis:
-            return render_template('pages/students/form.html', student=student, error="Nama dan NIS wajib diisi.")
+            return _render_form(student, error="Nama dan NIS wajib diisi.")
             
         # Check duplicate if NIS changed
         if nis != student.nis:
             if Student.query.filter_by(nis=nis).first():
-                 return render_template('pages/students/form.html', student=student, error="NIS sudah terdaftar.")
+                 return _render_form(student, error="NIS sudah terdaftar.")
         
         student.name = name
         student.nis = nis
         student.nism = nis # Assume NISM follows NIS for now
         student.gender = gender
+        _save_class(student)
         
         db.session.commit()
         flash('Data siswa berhasil diperbarui.', 'success')
@@ -80,13 +121,21 @@ def edit(id):
         # Pertahankan context: tetap di halaman edit
         return redirect(url_for('students.edit', id=id))
         
-    return render_template('pages/students/form.html', student=student)
+    return _render_form(student)
 
 @students_bp.route('/delete/<int:id>', methods=['POST'])
 @login_required
 def delete(id):
     from app.core.extensions import db
+    from app.services.summary_service import SummaryService
     student = Student.query.get_or_404(id)
+    # Ranks of the remaining classmates shift
+    affected = {(s.semester, s.year, s.class_name) for s in student.summaries}
     db.session.delete(student)
+    db.session.flush()
+    for semester, year, class_name in affected:
+        SummaryService.rerank(semester, year, {class_name})
+    DashboardService.invalidate()
     db.session.commit()
+    StudentService.invalidate_counts()
     return redirect(url_for('students.index'))
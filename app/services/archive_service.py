@@ -0,0 +1,213 @@
+import os
+import stat
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.orm import Session
+from werkzeug.utils import secure_filename
+from app.core.extensions import db
+
+class ArchiveService:
+    """
+    Closed academic years moved out of the live database: one read-only
+    SQLite file per year under storage/archive, holding that year's rows of
+    the year-scoped tables plus the students and subjects they refer to
+    (a snapshot, so reports stay printable after a reset or subject change).
+    The live file keeps only the years still in use, so its indexes stay
+    small. For printing, an archive is ATTACHed to one pooled connection and
+    the ORM models are pointed at it via schema_translate_map.
+    """
+    SCHEMA = 'archive'
+    # Copied in full
+    MASTER_TABLES = ('subjects', 'schema_version')
+    # Table -> rows of the archived year
+    YEAR_FILTERS = {
+        'grades': 'year = :year',
+        'report_records': 'year = :year',
+        'student_semester_summaries': 'year = :year',
+        'classrooms': 'year = :year',
+        'class_memberships': 'year = :year',
+        'students': (
+            'id IN (SELECT student_id FROM src.grades WHERE year = :year'
+            ' UNION SELECT student_id FROM src.report_records WHERE year = :year'
+            ' UNION SELECT student_id FROM src.class_memberships WHERE year = :year)'
+        ),
+    }
+    # Shown in the archive list
+    COUNTED_TABLES = ('students', 'grades', 'report_records')
+    # Archives superseded by live rows, kept out of the list
+    STALE_DIR = 'stale'
+
+    @staticmethod
+    def get_archive_dir():
+        return os.path.join(current_app.root_path, '..', 'storage', 'archive')
+
+    @staticmethod
+    def get_path(year):
+        filename = secure_filename(f"archive_{str(year).replace('/', '-')}.sqlite")
+        return os.path.join(ArchiveService.get_archive_dir(), filename)
+
+    @staticmethod
+    def is_archived(year):
+        return bool(year) and os.path.exists(ArchiveService.get_path(year))
+
+    @staticmethod
+    def list_archives():
+        """Archives newest year first: [{'year', 'filename', 'size', 'created_at', 'counts'}]"""
+        archive_dir = ArchiveService.get_archive_dir()
+        if not os.path.exists(archive_dir):
+            return []
+        archives = []
+        for f in os.listdir(archive_dir):
+            if not (f.startswith('archive_') and f.endswith('.sqlite')):
+                continue
+            path = os.path.join(archive_dir, f)
+            try:
+                info = ArchiveService.read_info(path)
+            except sqlite3.Error:
+                current_app.logger.warning(f"Arsip tidak terbaca: {f}")
+                continue
+            archives.append({
+                'year': info['year'],
+                'filename': f,
+                'size': os.path.getsize(path),
+                'created_at': datetime.fromisoformat(info['created_at']),
+                'counts': {t: int(info.get(f'count_{t}', 0)) for t in ArchiveService.COUNTED_TABLES},
+            })
+        return sorted(archives, key=lambda a: a['year'], reverse=True)
+
+    @staticmethod
+    def list_years():
+        return [a['year'] for a in ArchiveService.list_archives()]
+
+    @staticmethod
+    def release_stale():
+        """
+        Moves archives whose year has rows in the live database again (a
+        backup from before the archive was restored) to storage/archive/stale.
+        Reports then read the live rows and the year can be archived again;
+        the old file is kept, not deleted. Returns the years moved.
+        """
+        stale = []
+        for archive in ArchiveService.list_archives():
+            year = archive['year']
+            in_live = any(
+                db.session.execute(db.text(f'SELECT 1 FROM "{table}" WHERE year = :year LIMIT 1'), {'year': year}).first()
+                for table, where in ArchiveService.YEAR_FILTERS.items() if where == 'year = :year'
+            )
+            if not in_live:
+                continue
+            stale_dir = os.path.join(ArchiveService.get_archive_dir(), ArchiveService.STALE_DIR)
+            if not os.path.exists(stale_dir):
+                os.makedirs(stale_dir)
+            name = f"{archive['filename'][:-len('.sqlite')]}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.sqlite"
+            os.replace(os.path.join(ArchiveService.get_archive_dir(), archive['filename']), os.path.join(stale_dir, name))
+            current_app.logger.warning(f"Arsip {year} dipindahkan ke {ArchiveService.STALE_DIR}/{name}: data tahun ini ada lagi di database")
+            stale.append(year)
+        return stale
+
+    @staticmethod
+    def read_info(path):
+        """archive_info rows of an archive file as a dict"""
+        conn = sqlite3.connect(path)
+        try:
+            return dict(conn.execute("SELECT key, value FROM archive_info").fetchall())
+        finally:
+            conn.close()
+
+    @staticmethod
+    def write_archive(source_path, dest_path, year):
+        """
+        Creates the archive file of `year` from the live database via ATTACH +
+        INSERT ... SELECT, inside one read transaction on the source.
+        Only the archived tables and their indexes are created (no triggers,
+        no search index). Returns {table: rows copied}.
+        """
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+
+        tables = ArchiveService.MASTER_TABLES + tuple(ArchiveService.YEAR_FILTERS)
+        conn = sqlite3.connect(dest_path, isolation_level=None)
+        try:
+            conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+            conn.execute("BEGIN")
+            objects = conn.execute(
+                "SELECT type, tbl_name, sql FROM src.sqlite_master "
+                "WHERE type IN ('table', 'index') AND sql IS NOT NULL"
+            ).fetchall()
+
+            counts = {}
+            for type_, name, sql in objects:
+                if type_ == 'table' and name in tables:
+                    conn.execute(sql)
+            for name in tables:
+                where = ArchiveService.YEAR_FILTERS.get(name, '1=1')
+                counts[name] = conn.execute(
+                    f'INSERT INTO main."{name}" SELECT * FROM src."{name}" WHERE {where}', {'year': year}
+                ).rowcount
+            # Indexes after the rows (one sort per index instead of row-by-row upkeep)
+            for type_, name, sql in objects:
+                if type_ == 'index' and name in tables:
+                    conn.execute(sql)
+
+            user_version = conn.execute("PRAGMA src.user_version").fetchone()[0]
+            info = {'year': year, 'created_at': datetime.now().isoformat(timespec='seconds')}
+            info.update({f'count_{t}': counts[t] for t in ArchiveService.COUNTED_TABLES})
+            conn.execute("CREATE TABLE archive_info (key VARCHAR(50) PRIMARY KEY, value TEXT)")
+            conn.executemany("INSERT INTO archive_info (key, value) VALUES (?, ?)",
+                             [(k, str(v)) for k, v in info.items()])
+            conn.execute("COMMIT")
+            conn.execute(f"PRAGMA main.user_version = {int(user_version)}")
+            conn.execute("DETACH DATABASE src")
+            return counts
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def finalize(temp_path, year):
+        """Moves a written archive into place and makes it read-only. Returns the path."""
+        path = ArchiveService.get_path(year)
+        os.replace(temp_path, path)
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        return path
+
+    @staticmethod
+    @contextmanager
+    def session_for(year):
+        """session(year) if the year is archived, else yields None (read the live database)"""
+        if not ArchiveService.is_archived(year):
+            yield None
+            return
+        with ArchiveService.session(year) as session:
+            yield session
+
+    @staticmethod
+    @contextmanager
+    def session(year):
+        """
+        ORM session reading the archive of `year` (read-only).
+        Model queries in it go to the attached archive instead of the live
+        tables; the connection is detached and returned to the pool on exit.
+        """
+        path = ArchiveService.get_path(year)
+        if not os.path.exists(path):
+            raise Exception(f"Arsip tahun ajaran {year} tidak ditemukan.")
+        conn = db.engine.connect()
+        try:
+            conn.exec_driver_sql(f"ATTACH DATABASE ? AS {ArchiveService.SCHEMA}", (path,))
+            conn.exec_driver_sql("PRAGMA query_only = ON")
+            session = Session(bind=conn.execution_options(schema_translate_map={None: ArchiveService.SCHEMA}))
+            try:
+                yield session
+            finally:
+                session.close()
+                conn.rollback()
+                conn.exec_driver_sql("PRAGMA query_only = OFF")
+                conn.exec_driver_sql(f"DETACH DATABASE {ArchiveService.SCHEMA}")
+        finally:
+            conn.close()
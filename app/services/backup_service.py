@@ -1,12 +1,35 @@
 import os
-import shutil
+import json
+import time
 import sqlite3
 from datetime import datetime
 from flask import current_app, send_file
 from werkzeug.utils import secure_filename
 from app.core.extensions import db
+from app.core.migrations import migrate
+from app.models.setting import Setting
+from app.services.backup_store import BackupStore
+from app.services.dashboard_service import DashboardService
 
 class BackupService:
+    # Online backup: pages copied per step and pause between steps (seconds).
+    # Writers only wait for one step, never for the whole copy.
+    BACKUP_PAGES_PER_STEP = 256
+    BACKUP_STEP_SLEEP = 0.005
+    # Used for estimates until a backup has been measured
+    DEFAULT_THROUGHPUT = 10 * 1024 * 1024
+    STATUS_FILE = 'backup_status.json'
+    # Tables holding per-academic-year rows; everything else is master data
+    YEAR_SCOPED_TABLES = ('grades', 'report_records', 'student_semester_summaries', 'classrooms', 'class_memberships')
+    # A file without these is not an e-Raport database
+    REQUIRED_TABLES = ('users', 'students', 'grades', 'settings')
+    # ioctl request of a reflink clone (linux/fs.h)
+    FICLONE = 0x40049409
+
+    @staticmethod
+    def get_backup_dir():
+        return os.path.join(current_app.root_path, '..', 'storage', 'backups')
+
     @staticmethod
     def get_db_path():
         """Helper to get the current SQLite database path from config"""
@@ -36,75 +59,139 @@ class BackupService:
         except Exception as e:
             return False, f"Integrity check error: {str(e)}"
 
+    @staticmethod
+    def checkpoint(db_path, mode='PASSIVE'):
+        """
+        Copies WAL frames into the main database file.
+        Returns (busy, wal_frames, checkpointed_frames); no-op without WAL.
+        """
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            return conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _swap_database(source_path, db_path, move=False):
+        """
+        Replaces the contents of the live database with source_path (consumed if move).
+        Written through the SQLite backup API in a single step: one write
+        transaction on the live file, so the WAL index, the page count and
+        the caches of other connections (other workers too) follow the new
+        contents. Overwriting the file in place left readers on the page
+        count of the old file, which breaks once a VACUUM has shrunk it.
+        A rename is no alternative: the -wal/-shm files are named after the
+        path, so connections still open on the old inode would share them
+        with the new file.
+        """
+        db.session.remove()
+        db.engine.dispose()
+        try:
+            src = sqlite3.connect(source_path)
+            dst = sqlite3.connect(db_path, timeout=30)
+            try:
+                src.backup(dst)
+                # Fold the copied pages into the main file
+                dst.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                dst.close()
+                src.close()
+        finally:
+            if move:
+                os.remove(source_path)
+        db.engine.dispose()
+
     @staticmethod
     def get_backups():
         """Returns list of available backups"""
-        backup_dir = os.path.join(current_app.root_path, '..', 'storage', 'backups')
+        backup_dir = BackupService.get_backup_dir()
         if not os.path.exists(backup_dir):
             return []
             
         backups = []
         for f in os.listdir(backup_dir):
+            path = os.path.join(backup_dir, f)
             if f.endswith('.sqlite'):
-                path = os.path.join(backup_dir, f)
+                # Plain copy (year-filtered or legacy backup)
                 stat = os.stat(path)
                 backups.append({
                     'filename': f,
                     'size': stat.st_size,
+                    'stored_size': stat.st_size,
                     'created_at': datetime.fromtimestamp(stat.st_ctime),
                     'path': path
                 })
+            elif BackupStore.is_snapshot(f):
+                # Deduplicated snapshot: logical size vs. bytes it added to the store
+                info = BackupStore.read_info(path)
+                backups.append({
+                    'filename': f,
+                    'size': info['size'],
+                    'stored_size': info['stored_bytes'],
+                    'created_at': datetime.fromisoformat(info['created_at']),
+                    'path': path
+                })
         
         # Sort by creation time desc
         return sorted(backups, key=lambda x: x['created_at'], reverse=True)
 
     @staticmethod
-    def restore_from_local(filename, user_id=None):
-        """Restores from a local backup file"""
-        from app.models import AuditLog
-        backup_dir = os.path.join(current_app.root_path, '..', 'storage', 'backups')
+    def restore_from_local(filename, user_id=None, progress_callback=None):
+        """Restores from a local backup file (see restore_file)"""
+        backup_dir = BackupService.get_backup_dir()
         source_path = os.path.join(backup_dir, secure_filename(filename))
         
         if not os.path.exists(source_path):
             raise Exception("Backup file not found")
             
-        # Verify integrity
-        valid, msg = BackupService.verify_integrity(source_path)
-        if not valid:
-            raise Exception(f"Backup file is corrupt: {msg}")
+        if BackupStore.is_snapshot(source_path):
+            # Rebuild the database file from its chunks first
+            BackupService._report(progress_callback, 0, "Menyusun file backup...")
+            snapshot_path = source_path
+            source_path = snapshot_path + ".restore_temp"
+            BackupStore.materialize(backup_dir, snapshot_path, source_path)
 
-        db_path = BackupService.get_db_path()
-        
-        # Create safety backup
         try:
-            BackupService.create_backup(description="SafetyBackup_BeforeRestoreLocal")
-        except: pass
-        
-        # Restore
-        try:
-            shutil.copy2(source_path, db_path)
-            
-            # Log
-            if user_id: # Need context to write log after restore? 
-                # After restore, the DB is replaced. So we write log to NEW DB.
-                # But connection might need refresh.
-                # However, AuditLog table should exist in backup if backup is recent.
-                # If backup is old (before AuditLog), this might fail.
-                # Let's assume schema is migrated or we catch error.
-                pass 
-                
-            return True
-        except Exception as e:
-            raise e
+            return BackupService.restore_file(source_path, "SafetyBackup_BeforeRestoreLocal", progress_callback)
+        finally:
+            BackupService._remove_restore_temp(source_path)
+
+    @staticmethod
+    def _remove_restore_temp(path):
+        # Only files materialized from a snapshot, never a real backup
+        if path.endswith(".restore_temp") and os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def open_backup(filename):
+        """
+        Returns (file path or file object, download name) for a backup.
+        Snapshots are rebuilt into an anonymous temp file.
+        """
+        import tempfile
+        backup_dir = BackupService.get_backup_dir()
+        path = os.path.join(backup_dir, secure_filename(filename))
+        if not os.path.exists(path):
+            return None, None
+        if BackupStore.is_snapshot(path):
+            fileobj = tempfile.TemporaryFile()
+            BackupStore.materialize(backup_dir, path, fileobj)
+            fileobj.seek(0)
+            return fileobj, filename[:-len(BackupStore.MANIFEST_SUFFIX)] + '.sqlite'
+        return path, filename
 
     @staticmethod
     def delete_backup(filename):
         """Deletes a local backup file"""
-        backup_dir = os.path.join(current_app.root_path, '..', 'storage', 'backups')
+        backup_dir = BackupService.get_backup_dir()
         file_path = os.path.join(backup_dir, secure_filename(filename))
         
         if os.path.exists(file_path):
-            os.remove(file_path)
+            if BackupStore.is_snapshot(file_path):
+                # Also drops chunks no other snapshot uses
+                BackupStore.delete_snapshot(backup_dir, file_path)
+            else:
+                os.remove(file_path)
             return True
         return False
     
@@ -116,9 +203,15 @@ class BackupService:
             return {}
 
         total_size = os.path.getsize(db_path)
-        # Estimate duration: assume 10MB/s copy speed
+        # Un-checkpointed WAL frames are part of the data too
+        wal_path = db_path + "-wal"
+        if os.path.exists(wal_path):
+            total_size += os.path.getsize(wal_path)
+        # Estimate duration from the last measured backup speed
         # Min 1 second
-        total_duration_sec = total_size / (10 * 1024 * 1024) 
+        status = BackupService.get_backup_status()
+        throughput = status.get('throughput_bps') or BackupService.DEFAULT_THROUGHPUT
+        total_duration_sec = total_size / throughput
         if total_duration_sec < 1: total_duration_sec = 1
 
         estimates = {
@@ -127,6 +220,8 @@ class BackupService:
                 'size_fmt': f"{total_size / 1024 / 1024:.2f} MB",
                 'duration_sec': round(total_duration_sec, 2)
             },
+            'throughput_fmt': f"{throughput / 1024 / 1024:.1f} MB/s",
+            'measured': bool(status.get('throughput_bps')),
             'years': {}
         }
         
@@ -148,7 +243,7 @@ class BackupService:
                     ratio = count / total_grades
                     # Base overhead + proportional data
                     est_size = (total_size * 0.1) + (total_size * 0.9 * ratio)
-                    est_dur = est_size / (10 * 1024 * 1024)
+                    est_dur = est_size / throughput
                     if est_dur < 1: est_dur = 1
                     
                     estimates['years'][year] = {
@@ -164,7 +259,154 @@ class BackupService:
         return estimates
 
     @staticmethod
-    def create_backup(description=None, year_filter=None):
+    def get_backup_status():
+        """Returns progress of the running backup, or stats of the last finished one"""
+        path = os.path.join(BackupService.get_backup_dir(), BackupService.STATUS_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _write_backup_status(status):
+        backup_dir = BackupService.get_backup_dir()
+        if not os.path.exists(backup_dir):
+            os.makedirs(backup_dir)
+        path = os.path.join(backup_dir, BackupService.STATUS_FILE)
+        temp_path = path + ".temp"
+        with open(temp_path, 'w') as f:
+            json.dump(status, f)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def copy_database(source_path, dest_path, progress_callback=None):
+        """
+        Online copy using the SQLite backup API.
+        Copies BACKUP_PAGES_PER_STEP pages at a time and sleeps in between,
+        so gunicorn workers can keep writing during the backup.
+        Progress and measured throughput go to the status file;
+        progress_callback(percent) is also called on every step if given.
+        """
+        previous = BackupService.get_backup_status()
+        status = {
+            'state': 'running',
+            'percent': 0,
+            'started_at': datetime.now().isoformat(),
+            # Keep last measurement available for estimates while running
+            'throughput_bps': previous.get('throughput_bps')
+        }
+        BackupService._write_backup_status(status)
+
+        last_write = [time.monotonic()]
+        def progress(rc, remaining, total):
+            if progress_callback and total:
+                progress_callback(100 * (total - remaining) / total)
+            now = time.monotonic()
+            if total and now - last_write[0] >= 0.5:
+                status['percent'] = round(100 * (total - remaining) / total, 1)
+                BackupService._write_backup_status(status)
+                last_write[0] = now
+
+        started = time.monotonic()
+        # Fold the WAL in first so most pages come from the main file
+        BackupService.checkpoint(source_path)
+        src = sqlite3.connect(source_path)
+        dst = sqlite3.connect(dest_path)
+        try:
+            src.backup(dst, pages=BackupService.BACKUP_PAGES_PER_STEP, progress=progress,
+                       sleep=BackupService.BACKUP_STEP_SLEEP)
+            # The copy inherits WAL mode; make it a self-contained single file
+            dst.execute("PRAGMA journal_mode=DELETE")
+        except Exception:
+            status['state'] = 'failed'
+            BackupService._write_backup_status(status)
+            raise
+        finally:
+            dst.close()
+            src.close()
+
+        duration = time.monotonic() - started
+        size = os.path.getsize(dest_path)
+        status.update({
+            'state': 'done',
+            'percent': 100,
+            'bytes': size,
+            'duration_sec': round(duration, 3),
+            # Sleeps between steps are part of the real cost, keep them in
+            'throughput_bps': int(size / duration) if duration > 0 else None,
+            'finished_at': datetime.now().isoformat()
+        })
+        BackupService._write_backup_status(status)
+        return status
+
+    @staticmethod
+    def copy_year_subset(source_path, dest_path, year):
+        """
+        Creates a new SQLite file with the full schema, all master tables and
+        only the YEAR_SCOPED_TABLES rows for `year`, via ATTACH + INSERT ... SELECT.
+        Cost scales with that year's data instead of the whole history.
+        """
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+
+        conn = sqlite3.connect(dest_path, isolation_level=None)
+        try:
+            conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+            # One read transaction over src = consistent snapshot of all tables
+            conn.execute("BEGIN")
+
+            objects = conn.execute(
+                "SELECT type, name, sql FROM src.sqlite_master "
+                "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'"
+            ).fetchall()
+            # Virtual tables (the students_fts search index) create their own
+            # shadow tables; they are rebuilt from the copied rows instead
+            virtual = [(name, sql) for type_, name, sql in objects
+                       if type_ == 'table' and sql.upper().startswith('CREATE VIRTUAL TABLE')]
+            shadow = tuple(f'{name}_' for name, _ in virtual)
+            tables = [(name, sql) for type_, name, sql in objects
+                      if type_ == 'table' and (name, sql) not in virtual and not name.startswith(shadow)]
+
+            # Tables first, load rows, then indexes/triggers/views (faster than
+            # maintaining indexes row by row)
+            for name, sql in tables:
+                conn.execute(sql)
+            for name, sql in tables:
+                if name in BackupService.YEAR_SCOPED_TABLES:
+                    conn.execute(f'INSERT INTO main."{name}" SELECT * FROM src."{name}" WHERE year = ?', (year,))
+                else:
+                    conn.execute(f'INSERT INTO main."{name}" SELECT * FROM src."{name}"')
+            for name, sql in virtual:
+                conn.execute(sql)
+                if 'FTS5' in sql.upper():
+                    conn.execute(f'INSERT INTO main."{name}" ("{name}") VALUES (\'rebuild\')')
+            for type_, name, sql in objects:
+                if type_ != 'table':
+                    conn.execute(sql)
+
+            # AUTOINCREMENT counters, if any table uses them
+            has_seq = conn.execute(
+                "SELECT 1 FROM src.sqlite_master WHERE name = 'sqlite_sequence'"
+            ).fetchone()
+            if has_seq:
+                conn.execute("INSERT INTO main.sqlite_sequence SELECT * FROM src.sqlite_sequence")
+
+            user_version = conn.execute("PRAGMA src.user_version").fetchone()[0]
+            conn.execute("COMMIT")
+            conn.execute(f"PRAGMA main.user_version = {int(user_version)}")
+            conn.execute("DETACH DATABASE src")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def create_backup(description=None, year_filter=None, progress_callback=None):
         """
         Creates a copy of the SQLite database file.
         If year_filter is provided, creates a partial backup containing only data for that year.
@@ -177,47 +419,40 @@ class BackupService:
         desc_part = f"_{secure_filename(description)}" if description else ""
         year_part = f"_Year-{secure_filename(year_filter.replace('/', '-'))}" if year_filter else ""
         
-        backup_filename = f"backup_eraport_{timestamp}{year_part}{desc_part}.sqlite"
-        backup_dir = os.path.join(current_app.root_path, '..', 'storage', 'backups')
+        backup_name = f"backup_eraport_{timestamp}{year_part}{desc_part}"
+        backup_filename = f"{backup_name}.sqlite"
+        backup_dir = BackupService.get_backup_dir()
         
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
             
         backup_path = os.path.join(backup_dir, backup_filename)
         
-        # 1. Copy full DB first (as temp if filtering, or final if not)
+        # 1. Build the backup as a temp file
         temp_path = backup_path + ".temp"
-        shutil.copy2(db_path, temp_path)
         
         try:
             if year_filter:
-                # 2. Open temp DB and prune other years
-                conn = sqlite3.connect(temp_path)
-                cur = conn.cursor()
-                
-                # Delete Grades not in year
-                cur.execute("DELETE FROM grades WHERE year != ?", (year_filter,))
-                # Delete ReportRecords not in year
-                cur.execute("DELETE FROM report_records WHERE year != ?", (year_filter,))
-                
-                # We do NOT delete Students/Subjects as they are master data needed for the records
-                
-                conn.commit()
-                cur.execute("VACUUM") # Reclaim space
-                conn.close()
+                # 2. Partial: fresh file with only that year's academic rows
+                BackupService.copy_year_subset(db_path, temp_path, year_filter)
+            else:
+                BackupService.copy_database(db_path, temp_path, progress_callback)
+            
+            # Verify integrity
+            valid, msg = BackupService.verify_integrity(temp_path)
+            if not valid:
+                raise Exception(f"Backup created but failed integrity check: {msg}")
             
             # 3. Finalize
+            if not year_filter:
+                # Full backups go into the deduplicated store
+                manifest_path = BackupStore.write_snapshot(backup_dir, temp_path, backup_name, description)
+                os.remove(temp_path)
+                return manifest_path
+            
             if os.path.exists(backup_path):
                 os.remove(backup_path)
             os.rename(temp_path, backup_path)
-            
-            # Verify integrity
-            valid, msg = BackupService.verify_integrity(backup_path)
-            if not valid:
-                if os.path.exists(backup_path):
-                    os.remove(backup_path)
-                raise Exception(f"Backup created but failed integrity check: {msg}")
-                
             return backup_path
             
         except Exception as e:
@@ -228,50 +463,186 @@ class BackupService:
             raise e
 
     @staticmethod
-    def restore_backup(file_storage):
-        """Restores database from an uploaded file"""
+    def restore_backup(file_storage, progress_callback=None):
+        """Restores database from an uploaded file (see restore_file)"""
         db_path = BackupService.get_db_path()
         if not db_path:
             raise Exception("Database configuration error")
 
-        # Create a safety backup before overwriting
-        try:
-            BackupService.create_backup(description="SafetyBackup_BeforeRestore")
-        except:
-            pass # Proceed even if auto-backup fails, but ideally log it
-
-        # Save uploaded file temporarily
         temp_path = db_path + ".restore_temp"
         file_storage.save(temp_path)
+        try:
+            return BackupService.restore_file(temp_path, "SafetyBackup_BeforeRestore", progress_callback)
+        finally:
+            BackupService._remove_restore_temp(temp_path)
 
-        # Verify integrity
-        valid, msg = BackupService.verify_integrity(temp_path)
-        if not valid:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise Exception(f"Invalid backup file: {msg}")
+    @staticmethod
+    def validate_backup(path):
+        """
+        Checks a file before it may replace the live database, cheapest
+        checks first: SQLite header, core tables, schema version (not newer
+        than this app's migrations), then the full integrity_check.
+        Raises with the reason; returns {'schema_version', 'page_size'}.
+        """
+        from app.core.migrations import MIGRATIONS
+        with open(path, 'rb') as f:
+            if f.read(16) != b'SQLite format 3\x00':
+                raise Exception("File bukan database SQLite.")
 
-        # Verify it's a valid SQLite file and has tables
+        conn = sqlite3.connect(path)
         try:
-            conn = sqlite3.connect(temp_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = cursor.fetchall()
+            tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            missing = [t for t in BackupService.REQUIRED_TABLES if t not in tables]
+            if missing:
+                raise Exception(f"Bukan database e-Raport (tabel tidak ada: {', '.join(missing)}).")
+
+            schema_version = 0
+            if 'schema_version' in tables:
+                schema_version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+            latest = max(version for version, _, _ in MIGRATIONS)
+            if schema_version > latest:
+                raise Exception(f"Backup berasal dari versi aplikasi yang lebih baru "
+                                f"(skema v{schema_version}, aplikasi v{latest}).")
+
+            result = conn.execute("PRAGMA integrity_check").fetchone()
+            if not result or result[0] != 'ok':
+                raise Exception(f"File backup rusak: {result[0] if result else 'Unknown error'}")
+            return {'schema_version': schema_version, 'page_size': conn.execute("PRAGMA page_size").fetchone()[0]}
+        except sqlite3.DatabaseError as e:
+            raise Exception(f"File backup tidak dapat dibaca: {e}")
+        finally:
             conn.close()
-            
-            if not tables:
-                os.remove(temp_path)
-                raise Exception("Invalid or empty database file (no tables found)")
-                
-            # Replace current DB
-            # Windows might lock the file if app is running, but Flask dev server usually allows it.
-            # Production with Gunicorn might need a restart.
-            shutil.move(temp_path, db_path)
-            return True
+
+    @staticmethod
+    def restore_file(source_path, description="SafetyBackup_BeforeRestore", progress_callback=None):
+        """
+        Restore pipeline for uploads and server backups. source_path is only read.
+        1. validate_backup: a bad file is rejected before anything is touched
+        2. safety snapshot of the live database (reflink clone where possible)
+        3. _swap_database: one write transaction on the live file
+        4. migrate() for older backups, then the settings/stats version rows
+           move past their old values so every worker drops its cached values
+        5. archives of years the backup still holds in full are set aside
+           (ArchiveService.release_stale)
+        progress_callback(done, total, message) follows the steps.
+        Returns the years whose archive was set aside.
+        """
+        db_path = BackupService.get_db_path()
+        if not db_path:
+            raise Exception("Database configuration error")
+
+        BackupService._report(progress_callback, 5, "Memvalidasi file backup...")
+        info = BackupService.validate_backup(source_path)
+
+        BackupService._report(progress_callback, 50, "Membuat snapshot pengaman...")
+        BackupService._safety_snapshot(description)
+
+        BackupService._report(progress_callback, 60, "Memulihkan database...")
+        staged = None
+        version_keys = (Setting.VERSION_KEY, DashboardService.STATS_VERSION_KEY)
+        live = sqlite3.connect(db_path)
+        try:
+            page_size = live.execute("PRAGMA page_size").fetchone()[0]
+            versions = dict(live.execute(
+                "SELECT key, value FROM settings WHERE key IN (?, ?)", version_keys
+            ).fetchall())
+        finally:
+            live.close()
+        if info['page_size'] != page_size:
+            # The backup API cannot change the page size of a WAL database
+            staged = db_path + ".restore_stage"
+            if os.path.exists(staged):
+                os.remove(staged)
+            conn = sqlite3.connect(source_path)
+            try:
+                conn.execute(f"PRAGMA page_size = {int(page_size)}")
+                conn.execute("VACUUM INTO ?", (staged,))
+            finally:
+                conn.close()
+        try:
+            BackupService._swap_database(staged or source_path, db_path)
+        finally:
+            if staged and os.path.exists(staged):
+                os.remove(staged)
+
+        BackupService._report(progress_callback, 90, "Memperbarui skema...")
+        # Older backups may predate newer migrations
+        migrate()
+        # Workers compare the version rows with what they cached from the old
+        # database; continue past its counters so none of them can match
+        for key in version_keys:
+            row = db.session.get(Setting, key) or Setting(key=key, value='0')
+            row.value = str(max(int(versions.get(key) or 0), int(row.value or 0)) + 1)
+            db.session.add(row)
+        db.session.commit()
+        Setting.invalidate_cache()
+        from app.services.student_service import StudentService
+        StudentService.invalidate_counts()
+        # A backup from before an archive brings that year's rows back
+        from app.services.archive_service import ArchiveService
+        return ArchiveService.release_stale()
+
+    @staticmethod
+    def _report(progress_callback, percent, message):
+        if progress_callback:
+            progress_callback(percent, 100, message)
+
+    @staticmethod
+    def _safety_snapshot(description):
+        """
+        Copy of the live database taken right before a restore, as a plain
+        backup file. Where the filesystem supports it (btrfs, XFS, ...) the
+        file is cloned with a reflink under the write lock: instant, blocks
+        are only duplicated as the live file changes afterwards. Otherwise a
+        regular (deduplicated) backup is made. Returns the path, or None.
+        """
+        db_path = BackupService.get_db_path()
+        backup_dir = BackupService.get_backup_dir()
+        os.makedirs(backup_dir, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        path = os.path.join(backup_dir, f"backup_eraport_{timestamp}_{secure_filename(description)}.sqlite")
+
+        cloned = False
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        try:
+            busy, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            # No commit may land in the WAL while the main file is cloned
+            conn.execute("BEGIN IMMEDIATE")
+            wal_path = db_path + "-wal"
+            if not busy and not (os.path.exists(wal_path) and os.path.getsize(wal_path) > 0):
+                cloned = BackupService._reflink(db_path, path)
+        finally:
+            conn.close()
+
+        if cloned:
+            # Self-contained single file, like the other backups
+            clone = sqlite3.connect(path)
+            try:
+                clone.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                clone.close()
+            return path
+        try:
+            return BackupService.create_backup(description=description)
         except Exception as e:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
+            current_app.logger.warning(f"Snapshot pengaman sebelum restore gagal: {e}")
+            return None
+
+    @staticmethod
+    def _reflink(source_path, dest_path):
+        """Copy-on-write clone of a file (Linux FICLONE). False where unsupported."""
+        try:
+            import fcntl
+        except ImportError: # Windows
+            return False
+        try:
+            with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), BackupService.FICLONE, src.fileno())
+            return True
+        except OSError:
+            if os.path.exists(dest_path):
+                os.remove(dest_path)
+            return False
 
     @staticmethod
     def analyze_prune_impact(year):
@@ -310,12 +681,72 @@ class BackupService:
             
         return impact
 
+    # Table -> label shown in the progress of prune/reset
+    DELETE_LABELS = {
+        'grades': 'nilai',
+        'report_records': 'laporan',
+        'student_semester_summaries': 'ringkasan nilai',
+        'class_memberships': 'anggota kelas',
+        'classrooms': 'kelas',
+        'students': 'santri',
+    }
+
     @staticmethod
-    def prune_year(year, user_id=None):
+    def _delete_batched(steps, progress_callback=None):
+        """
+        Runs chunked deletes for [(table, where, params, count)] in order,
+        reporting progress_callback(done, total, message) across all of them.
+        Returns {table: rows deleted}.
+        """
+        from app.core.sqlite import chunked_delete
+        total = sum(count for *_, count in steps) or 1
+        deleted, offset = {}, 0
+        for table, where, params, count in steps:
+            label = BackupService.DELETE_LABELS.get(table, table)
+            report = (lambda n, label=label, offset=offset: progress_callback(
+                min(offset + n, total), total, f"Menghapus {label}... ({offset + n}/{total} baris)"
+            )) if progress_callback else None
+            deleted[table] = chunked_delete(db.session, table, where, params, progress=report)
+            offset += count
+        return deleted
+
+    @staticmethod
+    def _reclaim_space(progress_callback=None):
+        """Incremental VACUUM after a prune/reset. Returns the MB given back (best effort)."""
+        from app.core.sqlite import reclaim_space
+        try:
+            page_size = db.session.execute(db.text("PRAGMA page_size")).scalar()
+            db.session.commit()
+            report = (lambda done, total: progress_callback(
+                done, total, f"Merapikan file database... ({done}/{total} halaman)"
+            )) if progress_callback else None
+            db_path = BackupService.get_db_path()
+            if not db_path:
+                return 0
+            return round(reclaim_space(db_path, progress=report) * page_size / (1024 * 1024), 1)
+        except Exception as e:
+            # Space stays in the freelist and is reused by later writes
+            current_app.logger.warning(f"VACUUM setelah penghapusan gagal: {e}")
+            return 0
+
+    @staticmethod
+    def _year_steps(year):
+        """_delete_batched steps removing every YEAR_SCOPED_TABLES row of year (members before their classes)"""
+        from app.models import Grade, ReportRecord, StudentSemesterSummary, Classroom, ClassMembership
+        return [
+            (model.__tablename__, 'year = :year', {'year': year}, model.query.filter_by(year=year).count())
+            for model in (Grade, ReportRecord, StudentSemesterSummary, ClassMembership, Classroom)
+        ]
+
+    @staticmethod
+    def prune_year(year, user_id=None, progress_callback=None):
         """
         Deletes data for a specific academic year.
         WARNING: This is destructive.
-        Targets: Grade, ReportRecord
+        Targets: Grade, ReportRecord, StudentSemesterSummary, Classroom (with members)
+        Rows go in rowid batches of short transactions (other workers keep
+        writing in between), then the freed pages are vacuumed incrementally.
+        progress_callback(done, total, message) follows both phases.
         """
         from app.models import Grade, ReportRecord, AuditLog
         
@@ -332,8 +763,10 @@ class BackupService:
                 return False, f"Tidak ada data ditemukan untuk tahun ajaran '{year}'. Pastikan format tahun sesuai."
 
             # 2. Delete
-            Grade.query.filter_by(year=year).delete()
-            ReportRecord.query.filter_by(year=year).delete()
+            steps = BackupService._year_steps(year)
+            db.session.commit()
+            BackupService._delete_batched(steps, progress_callback)
+            DashboardService.invalidate()
             
             # 3. Audit Log
             log_details = f"Deleted {grades_count} grades and {reports_count} reports for year {year}"
@@ -347,8 +780,9 @@ class BackupService:
             db.session.add(audit)
             
             db.session.commit()
-            
-            return True, f"Berhasil menghapus {grades_count} nilai dan {reports_count} laporan untuk tahun {year}."
+
+            freed = BackupService._reclaim_space(progress_callback)
+            return True, f"Berhasil menghapus {grades_count} nilai dan {reports_count} laporan untuk tahun {year} ({freed} MB dikembalikan)."
         except Exception as e:
             db.session.rollback()
             # Log Failure if possible
@@ -366,12 +800,90 @@ class BackupService:
             raise e
 
     @staticmethod
-    def reset_academic_data(user_id=None):
+    def archive_year(year, user_id=None, progress_callback=None):
+        """
+        Moves a closed academic year out of the live database into its own
+        read-only archive file (see ArchiveService), where its reports stay
+        printable. The archive is written and integrity-checked before
+        anything is deleted; the delete and VACUUM are those of prune_year.
+        The active year (setting academic_year) cannot be archived.
+        """
+        from app.models import AuditLog
+        from app.services.archive_service import ArchiveService
+
+        year = str(year or '').strip()
+        if not year:
+            return False, "Tahun ajaran tidak valid (kosong)."
+        if year == Setting.get_value('academic_year', '2024/2025'):
+            return False, f"Tahun ajaran {year} masih aktif dan tidak dapat diarsipkan."
+        if ArchiveService.is_archived(year):
+            return False, f"Tahun ajaran {year} sudah diarsipkan."
+
+        try:
+            steps = BackupService._year_steps(year)
+            db.session.commit()
+            expected = {table: count for table, _, _, count in steps}
+            if not any(expected.values()):
+                return False, f"Tidak ada data ditemukan untuk tahun ajaran '{year}'. Pastikan format tahun sesuai."
+
+            # 1. Archive file, complete and verified before the live rows go
+            os.makedirs(ArchiveService.get_archive_dir(), exist_ok=True)
+            temp_path = ArchiveService.get_path(year) + ".temp"
+            try:
+                counts = ArchiveService.write_archive(BackupService.get_db_path(), temp_path, year)
+                valid, msg = BackupService.verify_integrity(temp_path)
+                if not valid:
+                    raise Exception(f"File arsip gagal diverifikasi: {msg}")
+                if any(counts[table] != count for table, count in expected.items()):
+                    raise Exception("Data tahun ajaran berubah selama pengarsipan. Silakan coba lagi.")
+                path = ArchiveService.finalize(temp_path, year)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+            # 2. Delete from the live database
+            BackupService._delete_batched(steps, progress_callback)
+            DashboardService.invalidate()
+
+            # 3. Audit Log
+            audit = AuditLog(
+                user_id=user_id,
+                action='ARCHIVE_YEAR',
+                target=f"Year {year}",
+                details=f"Archived {counts['grades']} grades and {counts['report_records']} reports "
+                        f"of {counts['students']} students to {os.path.basename(path)}",
+                status='SUCCESS'
+            )
+            db.session.add(audit)
+            db.session.commit()
+
+            freed = BackupService._reclaim_space(progress_callback)
+            return True, (f"Tahun ajaran {year} diarsipkan: {counts['grades']} nilai dan {counts['report_records']} "
+                          f"laporan dipindahkan ke {os.path.basename(path)} ({freed} MB dikembalikan).")
+        except Exception as e:
+            db.session.rollback()
+            try:
+                audit = AuditLog(
+                    user_id=user_id,
+                    action='ARCHIVE_YEAR',
+                    target=f"Year {year}",
+                    details=f"Error: {str(e)}",
+                    status='FAILED'
+                )
+                db.session.add(audit)
+                db.session.commit()
+            except: pass
+            raise e
+
+    @staticmethod
+    def reset_academic_data(user_id=None, progress_callback=None):
         """
         Deletes ALL academic data: Students, Grades, ReportRecords.
-        Keeps: Users, Settings, Subjects.
+        Keeps: Users, Settings, Subjects, Classrooms (emptied).
+        Same batched delete + incremental VACUUM as prune_year.
         """
-        from app.models import Student, Grade, ReportRecord, AuditLog
+        from app.models import Student, Grade, ReportRecord, StudentSemesterSummary, ClassMembership, AuditLog
+        from app.services.student_service import StudentService
         
         try:
             # 1. Count
@@ -383,10 +895,17 @@ class BackupService:
                 return False, "Data sudah kosong."
 
             # 2. Delete
-            # Cascade should handle Grades/Reports if Student is deleted, but explicit is safer/clearer
-            Grade.query.delete()
-            ReportRecord.query.delete()
-            Student.query.delete()
+            # Children first, so no student row is left with dangling grades mid-way
+            steps = [
+                (Grade.__tablename__, '1 = 1', None, g_count),
+                (ReportRecord.__tablename__, '1 = 1', None, r_count),
+                (StudentSemesterSummary.__tablename__, '1 = 1', None, StudentSemesterSummary.query.count()),
+                (ClassMembership.__tablename__, '1 = 1', None, ClassMembership.query.count()),
+                (Student.__tablename__, '1 = 1', None, s_count),
+            ]
+            db.session.commit()
+            BackupService._delete_batched(steps, progress_callback)
+            DashboardService.invalidate()
             
             # 3. Log
             audit = AuditLog(
@@ -398,7 +917,10 @@ class BackupService:
             )
             db.session.add(audit)
             db.session.commit()
-            return True, f"Reset berhasil. {s_count} siswa, {g_count} nilai, {r_count} laporan dihapus."
+            StudentService.invalidate_counts()
+
+            freed = BackupService._reclaim_space(progress_callback)
+            return True, f"Reset berhasil. {s_count} siswa, {g_count} nilai, {r_count} laporan dihapus ({freed} MB dikembalikan)."
         except Exception as e:
             db.session.rollback()
             try:
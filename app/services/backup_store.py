@@ -0,0 +1,212 @@
+import os
+import gzip
+import json
+import hashlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError: # Optional, gzip is used when missing
+    zstandard = None
+
+class BackupStore:
+    """
+    Content-addressed, compressed chunk store for database snapshots.
+    A snapshot is a manifest (<name>.snapshot.json) listing chunk hashes;
+    chunks live once under chunks/<hh>/<sha256>.<zst|gz>, so consecutive
+    snapshots only add the chunks whose pages changed.
+    """
+    MANIFEST_SUFFIX = '.snapshot.json'
+    # Manifest fields without the chunk list, read by the backup listing
+    INFO_SUFFIX = '.snapshot.info'
+    # 16 SQLite pages of 4 KiB: small enough that one changed row only
+    # re-stores a small chunk
+    CHUNK_SIZE = 64 * 1024
+    FORMAT_VERSION = 1
+    # Unreferenced chunks younger than this are kept: a snapshot being
+    # written may already rely on them before its manifest exists
+    GC_GRACE_SECONDS = 600
+
+    @staticmethod
+    def is_snapshot(filename):
+        return filename.endswith(BackupStore.MANIFEST_SUFFIX)
+
+    @staticmethod
+    def _chunk_dir(store_dir):
+        return os.path.join(store_dir, 'chunks')
+
+    @staticmethod
+    def _chunk_path(store_dir, digest, ext):
+        return os.path.join(BackupStore._chunk_dir(store_dir), digest[:2], f"{digest}.{ext}")
+
+    @staticmethod
+    def _find_chunk(store_dir, digest):
+        for ext in ('zst', 'gz'):
+            path = BackupStore._chunk_path(store_dir, digest, ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _compress(data):
+        if zstandard:
+            return zstandard.ZstdCompressor(level=3).compress(data), 'zst'
+        return gzip.compress(data, compresslevel=6), 'gz'
+
+    @staticmethod
+    def _decompress(path, data):
+        if path.endswith('.zst'):
+            if not zstandard:
+                raise Exception("Chunk terkompresi zstd, tetapi modul 'zstandard' tidak terpasang.")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    @staticmethod
+    def write_snapshot(store_dir, source_path, name, description=None):
+        """
+        Chunks source_path (a finished, consistent database copy) into the store.
+        Returns the manifest path.
+        """
+        chunks = []
+        new_bytes = 0
+        file_hash = hashlib.sha256()
+        size = 0
+
+        with open(source_path, 'rb') as f:
+            for data in iter(lambda: f.read(BackupStore.CHUNK_SIZE), b''):
+                size += len(data)
+                file_hash.update(data)
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append(digest)
+
+                existing = BackupStore._find_chunk(store_dir, digest)
+                if existing:
+                    os.utime(existing) # Protect from a concurrent collect_garbage
+                    continue # Already stored by an earlier snapshot
+                compressed, ext = BackupStore._compress(data)
+                path = BackupStore._chunk_path(store_dir, digest, ext)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = path + ".temp"
+                with open(temp_path, 'wb') as out:
+                    out.write(compressed)
+                os.replace(temp_path, path)
+                new_bytes += len(compressed)
+
+        manifest = {
+            'format': BackupStore.FORMAT_VERSION,
+            'chunk_size': BackupStore.CHUNK_SIZE,
+            'size': size,
+            'sha256': file_hash.hexdigest(),
+            'stored_bytes': new_bytes, # Compressed bytes this snapshot added
+            'description': description,
+            'created_at': datetime.now().isoformat(),
+            'chunks': chunks
+        }
+        manifest_path = os.path.join(store_dir, name + BackupStore.MANIFEST_SUFFIX)
+        # Info first: a listed manifest always has its info file
+        BackupStore._write_info(manifest_path, manifest)
+        temp_path = manifest_path + ".temp"
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, manifest_path)
+        return manifest_path
+
+    @staticmethod
+    def read_manifest(manifest_path):
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _info_path(manifest_path):
+        return manifest_path[:-len(BackupStore.MANIFEST_SUFFIX)] + BackupStore.INFO_SUFFIX
+
+    @staticmethod
+    def _write_info(manifest_path, manifest):
+        info = {k: v for k, v in manifest.items() if k != 'chunks'}
+        path = BackupStore._info_path(manifest_path)
+        with open(path + ".temp", 'w') as f:
+            json.dump(info, f)
+        os.replace(path + ".temp", path)
+        return info
+
+    @staticmethod
+    def read_info(manifest_path):
+        """
+        Manifest fields without the chunk list (size, stored_bytes,
+        created_at, ...), from the small info file next to the manifest.
+        Snapshots written before info files existed get theirs on first read.
+        """
+        try:
+            with open(BackupStore._info_path(manifest_path)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return BackupStore._write_info(manifest_path, BackupStore.read_manifest(manifest_path))
+
+    @staticmethod
+    def materialize(store_dir, manifest_path, dest):
+        """
+        Rebuilds the byte-identical database into dest (a path or a binary
+        file object) and verifies it against the manifest checksum.
+        """
+        manifest = BackupStore.read_manifest(manifest_path)
+        file_hash = hashlib.sha256()
+        out = open(dest, 'wb') if isinstance(dest, str) else dest
+        try:
+            for digest in manifest['chunks']:
+                path = BackupStore._find_chunk(store_dir, digest)
+                if not path:
+                    raise Exception(f"Chunk backup hilang: {digest[:12]}")
+                with open(path, 'rb') as f:
+                    data = BackupStore._decompress(path, f.read())
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise Exception(f"Chunk backup rusak: {digest[:12]}")
+                file_hash.update(data)
+                out.write(data)
+        finally:
+            if isinstance(dest, str):
+                out.close()
+
+        if file_hash.hexdigest() != manifest['sha256']:
+            raise Exception("Checksum snapshot tidak cocok.")
+        return manifest
+
+    @staticmethod
+    def delete_snapshot(store_dir, manifest_path):
+        os.remove(manifest_path)
+        info_path = BackupStore._info_path(manifest_path)
+        if os.path.exists(info_path):
+            os.remove(info_path)
+        BackupStore.collect_garbage(store_dir)
+
+    @staticmethod
+    def collect_garbage(store_dir):
+        """Removes chunks no remaining manifest references. Returns bytes freed."""
+        referenced = set()
+        for f in os.listdir(store_dir):
+            if BackupStore.is_snapshot(f):
+                referenced.update(BackupStore.read_manifest(os.path.join(store_dir, f))['chunks'])
+
+        freed = 0
+        cutoff = datetime.now().timestamp() - BackupStore.GC_GRACE_SECONDS
+        chunk_dir = BackupStore._chunk_dir(store_dir)
+        if not os.path.exists(chunk_dir):
+            return freed
+        for sub in os.listdir(chunk_dir):
+            sub_dir = os.path.join(chunk_dir, sub)
+            for f in os.listdir(sub_dir):
+                path = os.path.join(sub_dir, f)
+                if f.split('.')[0] not in referenced and os.path.getmtime(path) < cutoff:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+        return freed
+
+    @staticmethod
+    def store_size(store_dir):
+        """Total bytes on disk used by chunks"""
+        total = 0
+        chunk_dir = BackupStore._chunk_dir(store_dir)
+        if not os.path.exists(chunk_dir):
+            return total
+        for root, _, files in os.walk(chunk_dir):
+            total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return total
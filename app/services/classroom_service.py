@@ -0,0 +1,155 @@
+from app.models import Student, Classroom, ClassMembership, StudentSemesterSummary
+from app.core.extensions import db
+
+class ClassroomService:
+    """
+    Classes (rombel) per academic year and their members.
+    Per-class screens filter students through class_memberships.classroom_id
+    (indexed), so their work scales with the class, not the whole school.
+    """
+    # Students per IN (...) lookup
+    LOOKUP_CHUNK = 500
+
+    @staticmethod
+    def list_classes(year):
+        """Classes of a year ordered by name, each with member_count set"""
+        counts = dict(db.session.query(
+            ClassMembership.classroom_id, db.func.count(ClassMembership.id)
+        ).filter(ClassMembership.year == year).group_by(ClassMembership.classroom_id).all())
+        classes = Classroom.query.filter_by(year=year).order_by(Classroom.name).all()
+        for c in classes:
+            c.member_count = counts.get(c.id, 0)
+        return classes
+
+    @staticmethod
+    def scope(query, classroom_id):
+        """Limits a Student query to the members of one class (no-op without classroom_id)"""
+        if not classroom_id:
+            return query
+        return query.join(ClassMembership, ClassMembership.student_id == Student.id).filter(
+            ClassMembership.classroom_id == classroom_id
+        )
+
+    @staticmethod
+    def unassigned(year):
+        """Query of the active students without a class in year"""
+        return Student.query.filter_by(active=True).outerjoin(ClassMembership, db.and_(
+            ClassMembership.student_id == Student.id, ClassMembership.year == year
+        )).filter(ClassMembership.id.is_(None))
+
+    @staticmethod
+    def class_names(student_ids, year):
+        """Returns {student_id: class name} for the students with a class in year"""
+        result = {}
+        student_ids = list(student_ids)
+        for i in range(0, len(student_ids), ClassroomService.LOOKUP_CHUNK):
+            chunk = student_ids[i:i + ClassroomService.LOOKUP_CHUNK]
+            result.update(db.session.query(ClassMembership.student_id, Classroom.name).join(Classroom).filter(
+                ClassMembership.year == year, ClassMembership.student_id.in_(chunk)
+            ).all())
+        return result
+
+    @staticmethod
+    def create(name, year, homeroom_teacher=None):
+        """Adds a class to a year. Does not commit."""
+        name = (name or '').strip()
+        if not name:
+            raise Exception("Nama kelas wajib diisi.")
+        if Classroom.query.filter_by(name=name, year=year).first():
+            raise Exception(f"Kelas {name} sudah ada di tahun ajaran {year}.")
+        classroom = Classroom(name=name, year=year, homeroom_teacher=(homeroom_teacher or '').strip() or None)
+        db.session.add(classroom)
+        db.session.flush()
+        return classroom
+
+    @staticmethod
+    def get_or_create(name, year):
+        """Classroom id for a class name of year, created if missing"""
+        name = name.strip()
+        classroom = Classroom.query.filter_by(name=name, year=year).first() or ClassroomService.create(name, year)
+        return classroom.id
+
+    @staticmethod
+    def update(classroom, name, homeroom_teacher=None):
+        """Renames a class; the class name copied into summaries follows. Does not commit."""
+        name = (name or '').strip()
+        if not name:
+            raise Exception("Nama kelas wajib diisi.")
+        if name != classroom.name:
+            if Classroom.query.filter_by(name=name, year=classroom.year).first():
+                raise Exception(f"Kelas {name} sudah ada di tahun ajaran {classroom.year}.")
+            StudentSemesterSummary.query.filter_by(year=classroom.year, class_name=classroom.name).update(
+                {'class_name': name}, synchronize_session=False
+            )
+            classroom.name = name
+        classroom.homeroom_teacher = (homeroom_teacher or '').strip() or None
+
+    @staticmethod
+    def delete(classroom):
+        """Deletes a class; its students become unassigned. Does not commit."""
+        student_ids = [m.student_id for m in classroom.memberships]
+        year = classroom.year
+        db.session.delete(classroom)
+        db.session.flush()
+        ClassroomService._refresh_ranks(student_ids, year)
+
+    @staticmethod
+    def assign(student_ids, classroom_id, year):
+        """
+        Puts students in a class for year (classroom_id None = no class).
+        Only memberships that actually change are written; summaries and
+        class ranks of the students involved are refreshed. Does not commit.
+        Returns the number of students moved.
+        """
+        student_ids = list(dict.fromkeys(student_ids))
+        existing = {}
+        for i in range(0, len(student_ids), ClassroomService.LOOKUP_CHUNK):
+            chunk = student_ids[i:i + ClassroomService.LOOKUP_CHUNK]
+            for m in ClassMembership.query.filter(
+                ClassMembership.year == year, ClassMembership.student_id.in_(chunk)
+            ).all():
+                existing[m.student_id] = m
+
+        inserts, updates, deletes, changed = [], [], [], []
+        for student_id in student_ids:
+            m = existing.get(student_id)
+            if classroom_id is None:
+                if m is None:
+                    continue
+                deletes.append(m.id)
+            elif m is None:
+                inserts.append({'classroom_id': classroom_id, 'student_id': student_id, 'year': year})
+            elif m.classroom_id != classroom_id:
+                updates.append({'id': m.id, 'classroom_id': classroom_id})
+            else:
+                continue
+            changed.append(student_id)
+
+        if inserts:
+            db.session.bulk_insert_mappings(ClassMembership, inserts)
+        if updates:
+            db.session.bulk_update_mappings(ClassMembership, updates)
+        for i in range(0, len(deletes), ClassroomService.LOOKUP_CHUNK):
+            ClassMembership.query.filter(
+                ClassMembership.id.in_(deletes[i:i + ClassroomService.LOOKUP_CHUNK])
+            ).delete(synchronize_session=False)
+        ClassroomService._refresh_ranks(changed, year)
+        if changed:
+            # Per-class totals of the listings and dashboard
+            from app.services.student_service import StudentService
+            from app.services.dashboard_service import DashboardService
+            StudentService.invalidate_counts()
+            DashboardService.invalidate()
+        return len(changed)
+
+    @staticmethod
+    def _refresh_ranks(student_ids, year):
+        """Summaries carry the class name and rank, refresh them for moved students"""
+        if not student_ids:
+            return
+        from app.services.summary_service import SummaryService
+        semesters = [s for (s,) in db.session.query(StudentSemesterSummary.semester).filter(
+            StudentSemesterSummary.year == year
+        ).distinct()]
+        for semester in semesters:
+            SummaryService.refresh(semester, year, student_ids)
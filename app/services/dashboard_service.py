@@ -0,0 +1,105 @@
+import time
+from datetime import datetime
+from sqlalchemy import cast, Integer
+from app.models import Student, Subject, Grade, ReportRecord, ClassMembership
+from app.models.setting import Setting
+from app.core.extensions import db
+
+class DashboardService:
+    """
+    Dashboard aggregates (per-subject averages, below-KKM counts, grade
+    entry completion, attendance totals), each one grouped query.
+    Results are cached per process for CACHE_TTL seconds and dropped early
+    when the STATS_VERSION_KEY counter moves: saving grades or extras bumps
+    it in the same transaction, so every worker recomputes on its next visit.
+    """
+    CACHE_TTL = 300
+    STATS_VERSION_KEY = '_stats_version'
+
+    # (year, semester, classroom_id) -> (expires, version, stats)
+    _cache = {}
+
+    @staticmethod
+    def invalidate():
+        """Marks cached stats stale for all workers. Part of the caller's transaction."""
+        bumped = Setting.query.filter_by(key=DashboardService.STATS_VERSION_KEY).update(
+            {Setting.value: cast(cast(Setting.value, Integer) + 1, db.Text)},
+            synchronize_session=False
+        )
+        if not bumped:
+            db.session.add(Setting(key=DashboardService.STATS_VERSION_KEY, value='1'))
+
+    @staticmethod
+    def _version():
+        row = db.session.get(Setting, DashboardService.STATS_VERSION_KEY)
+        return row.value if row else '0'
+
+    @staticmethod
+    def get_stats(semester, year, classroom_id=None):
+        """Cached stats of a semester, optionally for one class"""
+        key = (year, semester, classroom_id)
+        version = DashboardService._version()
+        cached = DashboardService._cache.get(key)
+        if cached and cached[0] > time.monotonic() and cached[1] == version:
+            return cached[2]
+        stats = DashboardService.compute(semester, year, classroom_id)
+        DashboardService._cache[key] = (time.monotonic() + DashboardService.CACHE_TTL, version, stats)
+        return stats
+
+    @staticmethod
+    def compute(semester, year, classroom_id=None):
+        """
+        Returns {'student_count', 'subject_count', 'subjects': [...], 'attendance': {...}}.
+        Completion is the share of the students in scope with an NR for the subject.
+        Students in scope: the class members, else the members of the year's
+        classes, else (no classes set up for the year) the active students.
+        Grades and attendance are counted for the same students.
+        """
+        if classroom_id:
+            members = db.session.query(ClassMembership.student_id).filter(ClassMembership.classroom_id == classroom_id)
+        else:
+            members = db.session.query(ClassMembership.student_id).filter(ClassMembership.year == year)
+            if not db.session.query(members.exists()).scalar():
+                members = db.session.query(Student.id).filter_by(active=True)
+        student_count = members.count()
+
+        grade_rows = db.session.query(
+            Grade.subject_id,
+            db.func.avg(Grade.nr),
+            db.func.count(Grade.nr),
+            db.func.sum(db.case((Grade.nr < db.func.coalesce(Subject.kkm, 70.0), 1), else_=0)),
+        ).join(Subject, Subject.id == Grade.subject_id).filter(
+            Grade.semester == semester, Grade.year == year
+        )
+        grade_rows = grade_rows.filter(Grade.student_id.in_(members))
+        by_subject = {sid: (avg, graded, below) for sid, avg, graded, below in grade_rows.group_by(Grade.subject_id)}
+
+        subjects = []
+        for s in Subject.query.order_by(Subject.order, Subject.id):
+            avg, graded, below = by_subject.get(s.id, (None, 0, 0))
+            subjects.append({
+                'id': s.id, 'code': s.code, 'name': s.name, 'kkm': s.kkm,
+                'average': round(avg, 1) if avg is not None else None,
+                'graded': graded,
+                'below_kkm': below or 0,
+                'completion': round(100.0 * graded / student_count, 1) if student_count else 0.0,
+            })
+
+        attendance = db.session.query(
+            db.func.coalesce(db.func.sum(ReportRecord.attendance_sakit), 0),
+            db.func.coalesce(db.func.sum(ReportRecord.attendance_izin), 0),
+            db.func.coalesce(db.func.sum(ReportRecord.attendance_alpa), 0),
+            db.func.count(ReportRecord.id),
+        ).filter(ReportRecord.semester == semester, ReportRecord.year == year)
+        attendance = attendance.filter(ReportRecord.student_id.in_(members))
+        sakit, izin, alpa, records = attendance.one()
+
+        return {
+            'semester': semester,
+            'year': year,
+            'student_count': student_count,
+            'subject_count': len(subjects),
+            'subjects': subjects,
+            'attendance': {'sakit': sakit, 'izin': izin, 'alpa': alpa, 'records': records},
+            'computed_at': datetime.now().isoformat(timespec='seconds'),
+        }
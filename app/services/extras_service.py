@@ -0,0 +1,108 @@
+from app.models import ReportRecord
+from app.core.extensions import db
+
+class ExtrasService:
+    """Attendance & homeroom notes (ReportRecord) saved from the extras grid"""
+    # Grid field -> ReportRecord column
+    FIELDS = {
+        'sakit': 'attendance_sakit',
+        'izin': 'attendance_izin',
+        'alpa': 'attendance_alpa',
+        'notes': 'notes',
+    }
+    # Templates for records created from the grid, edited later per student
+    DEFAULT_EXTRAS = [
+        {"name": "Muhadloroh", "grade": "B", "desc": "Baik"},
+        {"name": "Sholat Berjamaah", "grade": "A", "desc": "Sangat Baik"},
+    ]
+    DEFAULT_PERSONALITY = [
+        {"aspect": "Kedisiplinan", "grade": "Baik", "desc": "Tertib"},
+        {"aspect": "Kebersihan", "grade": "Baik", "desc": "Rapi"},
+    ]
+    # Students per IN (...) lookup
+    LOOKUP_CHUNK = 500
+
+    @staticmethod
+    def parse_row(values):
+        """Raw grid values -> {column: value} for the fields present (blank count = 0, blank note = None)"""
+        parsed = {}
+        for field, column in ExtrasService.FIELDS.items():
+            if field not in values:
+                continue
+            raw = (values[field] or '').strip()
+            if field == 'notes':
+                parsed[column] = raw or None
+                continue
+            try:
+                count = int(raw or 0)
+            except ValueError:
+                raise Exception(f"Jumlah {field} tidak valid: '{raw}'")
+            if count < 0:
+                raise Exception(f"Jumlah {field} tidak boleh negatif.")
+            parsed[column] = count
+        return parsed
+
+    @staticmethod
+    def records_query(semester, year, student_ids):
+        """ReportRecords of some students for one (semester, year); also checked by `flask check-indexes`"""
+        return ReportRecord.query.filter(
+            ReportRecord.semester == semester, ReportRecord.year == year, ReportRecord.student_id.in_(student_ids)
+        )
+
+    @staticmethod
+    def load_records(semester, year, student_ids):
+        """{student_id: ReportRecord}, one query per LOOKUP_CHUNK students"""
+        records = {}
+        for i in range(0, len(student_ids), ExtrasService.LOOKUP_CHUNK):
+            chunk = student_ids[i:i + ExtrasService.LOOKUP_CHUNK]
+            for rr in ExtrasService.records_query(semester, year, chunk):
+                records[rr.student_id] = rr
+        return records
+
+    @staticmethod
+    def save_extras(semester, year, rows):
+        """
+        Saves attendance & notes of one (semester, year).
+        rows: {student_id: {'sakit': .., 'izin': .., 'alpa': .., 'notes': ..}} (raw form values)
+        Existing records are loaded in one query per chunk; only the columns
+        that differ are updated, missing records are bulk-inserted with the
+        default extras/personality templates. Does not commit.
+        Returns dict with 'inserted', 'updated', 'unchanged' counts and
+        'changed' (ids of the students whose record was written).
+        """
+        result = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'changed': []}
+        parsed = {student_id: ExtrasService.parse_row(values) for student_id, values in rows.items()}
+        if not parsed:
+            return result
+
+        existing = ExtrasService.load_records(semester, year, list(parsed))
+
+        inserts, updates = [], []
+        for student_id, values in parsed.items():
+            rr = existing.get(student_id)
+            if rr is None:
+                # Nothing entered and nothing stored: no record needed
+                if not any(values.values()):
+                    result['unchanged'] += 1
+                    continue
+                record = {'student_id': student_id, 'semester': semester, 'year': year,
+                          'attendance_sakit': 0, 'attendance_izin': 0, 'attendance_alpa': 0,
+                          'extras': ExtrasService.DEFAULT_EXTRAS, 'personality': ExtrasService.DEFAULT_PERSONALITY}
+                record.update(values)
+                inserts.append(record)
+                result['inserted'] += 1
+            else:
+                changed = {c: v for c, v in values.items() if getattr(rr, c) != v}
+                if not changed:
+                    result['unchanged'] += 1
+                    continue
+                updates.append(dict(changed, id=rr.id))
+                result['updated'] += 1
+            result['changed'].append(student_id)
+
+        # One executemany per distinct set of changed columns
+        if inserts:
+            db.session.bulk_insert_mappings(ReportRecord, inserts)
+        if updates:
+            db.session.bulk_update_mappings(ReportRecord, updates)
+        return result
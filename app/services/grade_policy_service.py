@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+from app.models import Grade, GradePolicy, Subject
+from app.core.extensions import db
+
+_DIGITS = ['', 'Satu', 'Dua', 'Tiga', 'Empat', 'Lima', 'Enam', 'Tujuh', 'Delapan', 'Sembilan', 'Sepuluh', 'Sebelas']
+
+def terbilang(n):
+    """Indonesian wording of a whole number 0-999 (e.g. 87 -> 'Delapan Puluh Tujuh')"""
+    n = int(n)
+    if n == 0:
+        return 'Nol'
+    if n < 12:
+        return _DIGITS[n]
+    if n < 20:
+        return f"{_DIGITS[n - 10]} Belas"
+    if n < 100:
+        return f"{_DIGITS[n // 10]} Puluh {_DIGITS[n % 10]}".strip()
+    if n < 200:
+        return f"Seratus {terbilang(n - 100) if n > 100 else ''}".strip()
+    if n < 1000:
+        return f"{_DIGITS[n // 100]} Ratus {terbilang(n % 100) if n % 100 else ''}".strip()
+    return str(n)
+
+
+class GradePolicyService:
+    """
+    Computes NR, predikat, terbilang and description from NH/NK/NU using
+    the configured GradePolicy rows. Works on whole DataFrames so a policy
+    change recomputes a subject or a year in one pass.
+    """
+    VALUE_COLUMNS = ('nh', 'nk', 'nu')
+    DEFAULT_WEIGHTS = (1.0, 1.0, 1.0)
+    # "kkm" as min means the subject's KKM
+    DEFAULT_THRESHOLDS = [
+        {'min': 90, 'letter': 'A', 'desc': 'Alhamdulillah, ananda mampu menguasai materi dengan sangat baik.'},
+        {'min': 'kkm', 'letter': 'B', 'desc': 'Alhamdulillah, ananda mampu menguasai materi dengan baik.'},
+        {'min': 0, 'letter': 'C', 'desc': 'Ananda perlu meningkatkan semangat belajar dan mengulang materi.'},
+    ]
+    # Scores are 0-100; terbilang is a table lookup
+    TERBILANG = np.array([terbilang(i) for i in range(101)], dtype=object)
+
+    @staticmethod
+    def default_rule():
+        return {'weights': GradePolicyService.DEFAULT_WEIGHTS, 'thresholds': GradePolicyService.DEFAULT_THRESHOLDS}
+
+    @staticmethod
+    def load_rules():
+        """Returns {(subject_id, year): rule} for all policies (one query)"""
+        rules = {}
+        for p in GradePolicy.query.all():
+            rules[(p.subject_id, p.year)] = {
+                'weights': (p.weight_nh or 0.0, p.weight_nk or 0.0, p.weight_nu or 0.0),
+                'thresholds': p.thresholds or GradePolicyService.DEFAULT_THRESHOLDS
+            }
+        return rules
+
+    @staticmethod
+    def resolve_key(rules, subject_id, year):
+        """Most specific policy key: subject+year, subject, year, global (None = built-in)"""
+        for key in ((subject_id, year), (subject_id, None), (None, year), (None, None)):
+            if key in rules:
+                return key
+        return None
+
+    @staticmethod
+    def compute(frame, rules=None):
+        """
+        frame: DataFrame with subject_id, year, kkm, nh, nk, nu.
+        Returns a DataFrame (same index) with nr, grade_letter, nr_text, description.
+        NR is the weighted mean of the filled-in values; rows with none get None.
+        """
+        rules = GradePolicyService.load_rules() if rules is None else rules
+        out = pd.DataFrame(index=frame.index, columns=['nr', 'grade_letter', 'nr_text', 'description'], dtype=object)
+        if frame.empty:
+            return out
+
+        # Policy per row, resolved once per distinct (subject, year)
+        pairs = frame[['subject_id', 'year']].drop_duplicates()
+        key_of = {
+            (sid, yr): GradePolicyService.resolve_key(rules, sid, yr)
+            for sid, yr in pairs.itertuples(index=False)
+        }
+        keys = list(dict.fromkeys(key_of.values()))
+        row_key = pd.Series(
+            [key_of[pair] for pair in zip(frame['subject_id'], frame['year'])], index=frame.index
+        )
+        codes = row_key.map({k: i for i, k in enumerate(keys)}).to_numpy()
+        rule_list = [rules[k] if k is not None else GradePolicyService.default_rule() for k in keys]
+
+        # Weighted mean of the present values
+        values = frame[list(GradePolicyService.VALUE_COLUMNS)].to_numpy(dtype=float)
+        weights = np.array([r['weights'] for r in rule_list], dtype=float)[codes]
+        present = ~np.isnan(values)
+        weight_sum = np.where(present, weights, 0.0).sum(axis=1)
+        weighted = np.where(present, values * weights, 0.0).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            nr = np.where(weight_sum > 0, weighted / weight_sum, np.nan)
+        nr = np.round(nr, 2)
+        has_nr = ~np.isnan(nr)
+        # Same rounding as the printed NR (Jinja round)
+        rounded = np.clip(np.round(np.nan_to_num(nr)), 0, 100).astype(int)
+
+        letters = np.full(len(frame), None, dtype=object)
+        descs = np.full(len(frame), None, dtype=object)
+        kkm = frame['kkm'].to_numpy(dtype=float)
+        for code, rule in enumerate(rule_list):
+            in_rule = (codes == code) & has_nr
+            if not in_rule.any():
+                continue
+            conditions, letter_choices, desc_choices = [], [], []
+            for t in rule['thresholds']:
+                minimum = kkm if t.get('min') == 'kkm' else float(t.get('min') or 0)
+                conditions.append(rounded >= minimum)
+                letter_choices.append(t.get('letter'))
+                desc_choices.append(t.get('desc'))
+            # First matching threshold wins
+            letters[in_rule] = np.select(conditions, letter_choices, default=None)[in_rule]
+            descs[in_rule] = np.select(conditions, desc_choices, default=None)[in_rule]
+
+        out['nr'] = np.where(has_nr, nr, None)
+        out['grade_letter'] = letters
+        out['nr_text'] = np.where(has_nr, GradePolicyService.TERBILANG[rounded], None)
+        out['description'] = descs
+        return out.astype(object).where(out.notna(), None)
+
+    @staticmethod
+    def apply(subject, year, rows):
+        """
+        Fills nr/grade_letter/nr_text/description into submitted rows
+        ({student_id: {'nh': .., 'nk': .., 'nu': ..}}) in place.
+        """
+        if not rows:
+            return rows
+        frame = pd.DataFrame.from_dict(rows, orient='index', columns=list(GradePolicyService.VALUE_COLUMNS))
+        frame['subject_id'] = subject.id
+        frame['year'] = year
+        frame['kkm'] = subject.kkm
+        computed = GradePolicyService.compute(frame)
+        for student_id, values in computed.to_dict('index').items():
+            rows[student_id].update(values)
+        return rows
+
+    @staticmethod
+    def recompute(subject_id=None, year=None):
+        """
+        Recomputes stored grades of a subject and/or year after a policy or
+        KKM change. Only rows whose result differs are written; summaries of
+        the affected students are refreshed. Does not commit.
+        Returns the number of grades updated.
+        """
+        from app.services.summary_service import SummaryService
+        result_cols = ['nr', 'grade_letter', 'nr_text', 'description']
+        query = db.session.query(
+            Grade.id, Grade.student_id, Grade.subject_id, Grade.semester, Grade.year,
+            Grade.nh, Grade.nk, Grade.nu, Subject.kkm,
+            Grade.nr, Grade.grade_letter, Grade.nr_text, Grade.description
+        ).join(Subject, Subject.id == Grade.subject_id)
+        if subject_id is not None:
+            query = query.filter(Grade.subject_id == subject_id)
+        if year is not None:
+            query = query.filter(Grade.year == year)
+
+        frame = pd.DataFrame(query.all(), columns=[
+            'id', 'student_id', 'subject_id', 'semester', 'year', 'nh', 'nk', 'nu', 'kkm', *result_cols
+        ])
+        if frame.empty:
+            return 0
+        new = GradePolicyService.compute(frame)
+
+        old_nr = frame['nr'].to_numpy(dtype=float)
+        new_nr = new['nr'].to_numpy(dtype=float)
+        changed = ~np.isclose(old_nr, new_nr, equal_nan=True)
+        for col in result_cols[1:]:
+            changed |= frame[col].fillna('').to_numpy() != new[col].fillna('').to_numpy()
+        if not changed.any():
+            return 0
+
+        updates = new.loc[changed, result_cols].astype(object)
+        updates = updates.where(updates.notna(), None)
+        updates['id'] = frame.loc[changed, 'id'].to_numpy()
+        db.session.bulk_update_mappings(Grade, updates.to_dict('records'))
+
+        touched = frame.loc[changed].groupby(['semester', 'year'])['student_id'].unique()
+        for (semester, yr), student_ids in touched.items():
+            SummaryService.refresh(int(semester), yr, [int(i) for i in student_ids])
+        return int(changed.sum())
+
+    @staticmethod
+    def save_policy(subject_id, year, weights, thresholds):
+        """Creates or updates the policy for (subject_id, year), then recomputes its scope"""
+        policy = GradePolicy.query.filter_by(subject_id=subject_id, year=year).first()
+        if not policy:
+            policy = GradePolicy(subject_id=subject_id, year=year)
+            db.session.add(policy)
+        policy.weight_nh, policy.weight_nk, policy.weight_nu = weights
+        policy.thresholds = thresholds
+        db.session.flush()
+        return GradePolicyService.recompute(subject_id=subject_id, year=year)
+
+    @staticmethod
+    def delete_policy(policy):
+        subject_id, year = policy.subject_id, policy.year
+        db.session.delete(policy)
+        db.session.flush()
+        return GradePolicyService.recompute(subject_id=subject_id, year=year)
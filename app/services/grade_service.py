@@ -0,0 +1,126 @@
+from sqlalchemy.dialects import sqlite, postgresql
+from app.models import Grade
+from app.core.extensions import db
+
+class GradeService:
+    # Columns written by the grade entry form (results from GradePolicyService included)
+    VALUE_FIELDS = ('nh', 'nk', 'nu', 'nr', 'grade_letter', 'nr_text', 'description')
+    # Bound params per statement: SQLite < 3.32 allows at most 999
+    MAX_VARIABLES = 999
+    # Students per IN (...) lookup
+    LOOKUP_CHUNK = 500
+
+    @staticmethod
+    def existing_query(subject_id, semester, year, student_ids):
+        """Grades of some students for one (subject, semester, year); also checked by `flask check-indexes`"""
+        return Grade.query.filter(
+            Grade.subject_id == subject_id, Grade.semester == semester, Grade.year == year,
+            Grade.student_id.in_(student_ids)
+        )
+
+    @staticmethod
+    def load_existing(subject_id, semester, year, student_ids):
+        """{student_id: Grade}, one query per LOOKUP_CHUNK students"""
+        existing = {}
+        for i in range(0, len(student_ids), GradeService.LOOKUP_CHUNK):
+            chunk = student_ids[i:i + GradeService.LOOKUP_CHUNK]
+            for g in GradeService.existing_query(subject_id, semester, year, chunk):
+                existing[g.student_id] = g
+        return existing
+
+    @staticmethod
+    def upsert_grades(subject_id, semester, year, rows):
+        """
+        Bulk upsert grades for one (subject, semester, year).
+        rows: {student_id: {'nh': .., 'nk': .., 'nu': .., 'nr': .., ...}}
+        Existing grades of the posted students are loaded in one query per
+        chunk (a save costs what the page posts, not the school size),
+        unchanged rows are skipped and the remaining rows are written in a
+        single INSERT ... ON CONFLICT.
+        Returns dict with 'inserted', 'updated', 'unchanged' counts and
+        'changed' (ids of the students whose grades were written).
+        """
+        result = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'changed': []}
+        if not rows:
+            return result
+
+        # 1. Load existing grades of the posted students
+        existing = GradeService.load_existing(subject_id, semester, year, list(rows))
+
+        # 2. Diff against submitted values
+        payload = []
+        for student_id, values in rows.items():
+            g = existing.get(student_id)
+            if g:
+                if all(getattr(g, f) == values.get(f) for f in GradeService.VALUE_FIELDS):
+                    result['unchanged'] += 1
+                    continue
+                result['updated'] += 1
+            else:
+                # Nothing entered and nothing stored: no row needed
+                if all(values.get(f) is None for f in GradeService.VALUE_FIELDS):
+                    result['unchanged'] += 1
+                    continue
+                result['inserted'] += 1
+
+            record = {
+                'student_id': student_id,
+                'subject_id': subject_id,
+                'semester': semester,
+                'year': year,
+            }
+            for f in GradeService.VALUE_FIELDS:
+                record[f] = values.get(f)
+            payload.append(record)
+            result['changed'].append(student_id)
+
+        if not payload:
+            return result
+
+        # 3. Single multi-row write
+        GradeService._bulk_upsert(payload)
+        return result
+
+    @staticmethod
+    def _bulk_upsert(payload):
+        """Writes rows with INSERT ... ON CONFLICT on unique_student_grade"""
+        dialect = db.session.get_bind().dialect.name
+        table = Grade.__table__
+
+        if dialect == 'sqlite':
+            insert = sqlite.insert
+            # SQLite can't target a named constraint, only its columns
+            conflict = dict(index_elements=['student_id', 'subject_id', 'semester', 'year'])
+        elif dialect == 'postgresql':
+            insert = postgresql.insert
+            conflict = dict(constraint='unique_student_grade')
+        else:
+            # Fallback for other engines: per-row ORM upsert
+            GradeService._orm_upsert(payload)
+            return
+
+        # Every row binds one param per column
+        batch_size = max(1, GradeService.MAX_VARIABLES // len(payload[0]))
+        for i in range(0, len(payload), batch_size):
+            stmt = insert(table).values(payload[i:i + batch_size])
+            stmt = stmt.on_conflict_do_update(
+                set_={f: stmt.excluded[f] for f in GradeService.VALUE_FIELDS},
+                **conflict
+            )
+            db.session.execute(stmt)
+
+    @staticmethod
+    def _orm_upsert(payload):
+        for record in payload:
+            g = Grade.query.filter_by(
+                student_id=record['student_id'],
+                subject_id=record['subject_id'],
+                semester=record['semester'],
+                year=record['year']
+            ).first()
+            if not g:
+                g = Grade(**record)
+                db.session.add(g)
+            else:
+                for f in GradeService.VALUE_FIELDS:
+                    setattr(g, f, record[f])
@@ -1,91 +1,63 @@
+import os
+import json
+import hashlib
 import pandas as pd
+from flask import current_app
 from app.models import Student
+from app.services.student_service import StudentService
+from app.services.dashboard_service import DashboardService
 from app.core.extensions import db
 
 class ImportService:
+    # Header aliases -> internal field
+    COLUMN_ALIASES = {
+        'name': ['nama', 'name', 'nama lengkap'],
+        'nis': ['nis', 'nomor induk'],
+        'gender': ['l/p', 'gender', 'jenis kelamin', 'jk'],
+        'nism': ['nism'],
+        'class_name': ['kelas', 'rombel'],
+    }
+    GENDER_MAP = {
+        'P': 'P', 'PEREMPUAN': 'P', 'WANITA': 'P',
+        'L': 'L', 'LAKI-LAKI': 'L', 'PRIA': 'L',
+    }
+    # Max bound parameters per IN (...) lookup
+    LOOKUP_CHUNK = 500
+    # Streaming mode: rows per transaction, and upload size that switches it on
+    CHUNK_SIZE = 1000
+    STREAM_THRESHOLD = 1 * 1024 * 1024
+    # Error messages kept for the summary (the count is always exact)
+    MAX_ERROR_SAMPLES = 20
+
     @staticmethod
     def import_students(file_storage):
         """
         Imports students from CSV or Excel file.
         Expected columns: 'nama', 'nis', 'jenis_kelamin' (or 'gender')
-        Optional: 'nism', 'status'
+        Optional: 'nism', 'status', 'kelas' (class of the current academic year)
         """
         filename = file_storage.filename.lower()
+        if filename.endswith(('.csv', '.xlsx')) and ImportService._file_size(file_storage) > ImportService.STREAM_THRESHOLD:
+            return ImportService.import_students_streaming(file_storage)
+
         try:
+            # Read everything as text so NIS keeps leading zeros
             if filename.endswith('.csv'):
-                df = pd.read_csv(file_storage)
+                df = pd.read_csv(file_storage, dtype=str)
             elif filename.endswith(('.xls', '.xlsx')):
-                df = pd.read_excel(file_storage)
+                df = pd.read_excel(file_storage, dtype=str)
             else:
                 return False, "Format file tidak didukung. Gunakan CSV atau Excel."
-            
+
             # Normalize headers to lowercase
-            df.columns = [c.lower().strip() for c in df.columns]
-            
-            # Map columns
-            # Required: name, nis, gender
-            # Mappings allowed:
-            # name: 'nama', 'name', 'nama lengkap'
-            # nis: 'nis', 'nomor induk'
-            # gender: 'l/p', 'gender', 'jenis kelamin', 'jk'
-            
-            col_map = {}
-            for col in df.columns:
-                if col in ['nama', 'name', 'nama lengkap']:
-                    col_map['name'] = col
-                elif col in ['nis', 'nomor induk']:
-                    col_map['nis'] = col
-                elif col in ['l/p', 'gender', 'jenis kelamin', 'jk']:
-                    col_map['gender'] = col
-                elif col in ['nism']:
-                    col_map['nism'] = col
-            
+            df.columns = df.columns.astype(str).str.lower().str.strip()
+
+            col_map = ImportService.map_columns(df.columns)
             if 'name' not in col_map or 'nis' not in col_map:
                 return False, f"Kolom wajib tidak ditemukan. Pastikan ada kolom 'Nama' dan 'NIS'. Kolom terdeteksi: {list(df.columns)}"
-            
-            success_count = 0
-            errors = []
-            
-            for index, row in df.iterrows():
-                try:
-                    nis = str(row[col_map['nis']]).strip()
-                    name = str(row[col_map['name']]).strip()
-                    
-                    if not nis or not name or nis.lower() == 'nan':
-                        continue
-                        
-                    # Check duplicate
-                    existing = Student.query.filter_by(nis=nis).first()
-                    if existing:
-                        errors.append(f"Baris {index+2}: NIS {nis} sudah ada (Dilewati).")
-                        continue
-                    
-                    gender = 'L' # Default
-                    if 'gender' in col_map:
-                        g_val = str(row[col_map['gender']]).upper().strip()
-                        if g_val in ['P', 'PEREMPUAN', 'WANITA']:
-                            gender = 'P'
-                        elif g_val in ['L', 'LAKI-LAKI', 'PRIA']:
-                            gender = 'L'
-                    
-                    nism = None
-                    if 'nism' in col_map:
-                        nism = str(row[col_map['nism']]).strip()
-                        if nism.lower() == 'nan': nism = None
-                        
-                    student = Student(
-                        name=name,
-                        nis=nis,
-                        nism=nism,
-                        gender=gender,
-                        active=True
-                    )
-                    db.session.add(student)
-                    success_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Baris {index+2}: Error - {str(e)}")
-            
+
+            success_count, errors = ImportService.import_frame(df, col_map)
+
             if success_count > 0:
                 db.session.commit()
                 msg = f"Berhasil mengimpor {success_count} siswa."
@@ -94,6 +66,264 @@ class ImportService:
                 return True, msg
             else:
                 return False, "Tidak ada data yang berhasil diimpor. " + "; ".join(errors[:5])
-                
+
         except Exception as e:
+            db.session.rollback()
             return False, f"Gagal memproses file: {str(e)}"
+
+    @staticmethod
+    def map_columns(columns):
+        """Maps normalized headers to internal fields: {'name': 'nama', ...}"""
+        col_map = {}
+        for col in columns:
+            for field, aliases in ImportService.COLUMN_ALIASES.items():
+                if col in aliases:
+                    col_map[field] = col
+        return col_map
+
+    @staticmethod
+    def normalize_frame(df, col_map, row_offset=0):
+        """
+        Vectorized cleaning. Returns DataFrame with columns
+        row, nis, name, nism, gender, class_name (blank rows dropped).
+        row is the spreadsheet line number (header = line 1).
+        """
+        def text(col):
+            s = df[col].astype('string').str.strip()
+            return s.mask(s.str.lower().isin(['', 'nan']))
+
+        out = pd.DataFrame({
+            'row': df.index.to_numpy() + row_offset + 2,
+            'nis': text(col_map['nis']).to_numpy(),
+            'name': text(col_map['name']).to_numpy(),
+        })
+        if 'nism' in col_map:
+            out['nism'] = text(col_map['nism']).to_numpy()
+        else:
+            out['nism'] = None
+        if 'class_name' in col_map:
+            out['class_name'] = text(col_map['class_name']).to_numpy()
+        else:
+            out['class_name'] = None
+        if 'gender' in col_map:
+            g_val = df[col_map['gender']].astype('string').str.upper().str.strip()
+            out['gender'] = g_val.map(ImportService.GENDER_MAP).fillna('L').to_numpy()
+        else:
+            out['gender'] = 'L' # Default
+
+        return out.dropna(subset=['nis', 'name'])
+
+    @staticmethod
+    def existing_nis(nis_values):
+        """Returns the subset of nis_values already in the database (chunked IN lookups)"""
+        found = set()
+        nis_values = list(nis_values)
+        for i in range(0, len(nis_values), ImportService.LOOKUP_CHUNK):
+            chunk = nis_values[i:i + ImportService.LOOKUP_CHUNK]
+            rows = db.session.query(Student.nis).filter(Student.nis.in_(chunk)).all()
+            found.update(r[0] for r in rows)
+        return found
+
+    @staticmethod
+    def import_frame(df, col_map, row_offset=0, seen_nis=None):
+        """
+        Imports one DataFrame (whole file or a chunk) without committing.
+        seen_nis: NIS values accepted by earlier chunks of the same file.
+        Returns (success_count, errors).
+        """
+        errors = []
+        frame = ImportService.normalize_frame(df, col_map, row_offset)
+        if frame.empty:
+            return 0, errors
+
+        # Length limits of the students table
+        too_long = (frame['nis'].str.len() > 20) | (frame['name'].str.len() > 100)
+        for row, nis in frame.loc[too_long, ['row', 'nis']].itertuples(index=False):
+            errors.append(f"Baris {row}: NIS/Nama terlalu panjang (Dilewati).")
+        frame = frame[~too_long]
+
+        # Duplicates inside the file
+        dup = frame['nis'].duplicated(keep='first')
+        if seen_nis:
+            dup |= frame['nis'].isin(seen_nis)
+        for row, nis in frame.loc[dup, ['row', 'nis']].itertuples(index=False):
+            errors.append(f"Baris {row}: NIS {nis} duplikat di dalam file (Dilewati).")
+        frame = frame[~dup]
+
+        # Duplicates against the database (one IN query per chunk)
+        exists = frame['nis'].isin(ImportService.existing_nis(frame['nis']))
+        for row, nis in frame.loc[exists, ['row', 'nis']].itertuples(index=False):
+            errors.append(f"Baris {row}: NIS {nis} sudah ada (Dilewati).")
+        frame = frame[~exists]
+
+        if seen_nis is not None:
+            seen_nis.update(frame['nis'])
+
+        records = frame[['nis', 'name', 'nism', 'gender']].astype(object)
+        records = records.where(records.notna(), None).to_dict('records')
+        for r in records:
+            r['active'] = True
+        if records:
+            db.session.bulk_insert_mappings(Student, records)
+            ImportService.assign_classes(frame)
+            StudentService.invalidate_counts()
+            DashboardService.invalidate()
+
+        return len(records), errors
+
+    @staticmethod
+    def assign_classes(frame):
+        """Puts imported students in the class of their 'kelas' column (created if missing)"""
+        from app.models.setting import Setting
+        from app.services.classroom_service import ClassroomService
+        frame = frame.dropna(subset=['class_name'])
+        if frame.empty:
+            return
+        current_year = Setting.get_value('academic_year', '2024/2025')
+        ids = {}
+        nis_values = list(frame['nis'])
+        for i in range(0, len(nis_values), ImportService.LOOKUP_CHUNK):
+            chunk = nis_values[i:i + ImportService.LOOKUP_CHUNK]
+            ids.update(db.session.query(Student.nis, Student.id).filter(Student.nis.in_(chunk)).all())
+        for class_name, group in frame.groupby('class_name'):
+            classroom_id = ClassroomService.get_or_create(class_name[:20], current_year)
+            ClassroomService.assign([ids[nis] for nis in group['nis'] if nis in ids], classroom_id, current_year)
+
+    # --- STREAMING MODE ---
+
+    @staticmethod
+    def import_students_streaming(file_storage, chunk_size=None):
+        """
+        Imports a large CSV/XLSX file chunk by chunk, one transaction per chunk.
+        Progress is checkpointed by file content hash, so uploading the same
+        file again after a failure resumes after the last committed chunk.
+        """
+        chunk_size = chunk_size or ImportService.CHUNK_SIZE
+        filename = file_storage.filename.lower()
+        if filename.endswith('.csv'):
+            reader = ImportService._iter_csv
+        elif filename.endswith('.xlsx'):
+            reader = ImportService._iter_xlsx
+        else:
+            return False, "Mode streaming hanya mendukung CSV atau XLSX."
+
+        checkpoint_path = ImportService._checkpoint_path(file_storage)
+        state = ImportService._load_checkpoint(checkpoint_path)
+        resumed = state['rows_done'] > 0
+        seen_nis = set()
+        col_map = None
+
+        try:
+            for df in reader(file_storage, chunk_size, state['rows_done']):
+                if col_map is None:
+                    col_map = ImportService.map_columns(df.columns)
+                    if 'name' not in col_map or 'nis' not in col_map:
+                        return False, f"Kolom wajib tidak ditemukan. Pastikan ada kolom 'Nama' dan 'NIS'. Kolom terdeteksi: {list(df.columns)}"
+
+                imported, errors = ImportService.import_frame(df, col_map, state['rows_done'], seen_nis)
+                db.session.commit()
+
+                state['rows_done'] += len(df)
+                state['imported'] += imported
+                state['error_count'] += len(errors)
+                room = ImportService.MAX_ERROR_SAMPLES - len(state['errors'])
+                state['errors'].extend(errors[:max(room, 0)])
+                ImportService._save_checkpoint(checkpoint_path, state)
+        except Exception as e:
+            db.session.rollback()
+            return False, (f"Gagal memproses file pada baris ke-{state['rows_done'] + 2}: {str(e)}. "
+                           f"{state['imported']} siswa sudah tersimpan; upload ulang file yang sama untuk melanjutkan.")
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        if state['imported'] > 0:
+            msg = f"Berhasil mengimpor {state['imported']} siswa."
+            if resumed:
+                msg += " (Dilanjutkan dari checkpoint)"
+            if state['error_count']:
+                msg += f" {state['error_count']} data dilewati/gagal."
+            return True, msg
+        return False, "Tidak ada data yang berhasil diimpor. " + "; ".join(state['errors'][:5])
+
+    @staticmethod
+    def _iter_csv(file_storage, chunk_size, skip_rows):
+        file_storage.stream.seek(0)
+        reader = pd.read_csv(
+            file_storage.stream, dtype=str, chunksize=chunk_size,
+            skiprows=range(1, skip_rows + 1) # keep header line
+        )
+        for df in reader:
+            df.columns = df.columns.astype(str).str.lower().str.strip()
+            yield df.reset_index(drop=True)
+
+    @staticmethod
+    def _iter_xlsx(file_storage, chunk_size, skip_rows):
+        from openpyxl import load_workbook
+        file_storage.stream.seek(0)
+        wb = load_workbook(file_storage.stream, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [str(c).lower().strip() if c is not None else '' for c in header]
+
+            batch = []
+            for index, row in enumerate(rows):
+                if index < skip_rows:
+                    continue
+                batch.append([ImportService._cell_text(v) for v in row])
+                if len(batch) >= chunk_size:
+                    yield pd.DataFrame(batch, columns=columns, dtype='string')
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=columns, dtype='string')
+        finally:
+            wb.close()
+
+    @staticmethod
+    def _cell_text(value):
+        """Excel cells come typed; NIS stored as a number must not become '123.0'"""
+        if value is None:
+            return None
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    @staticmethod
+    def _file_size(file_storage):
+        stream = file_storage.stream
+        pos = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(pos)
+        return size
+
+    @staticmethod
+    def _checkpoint_path(file_storage):
+        digest = hashlib.sha256()
+        stream = file_storage.stream
+        stream.seek(0)
+        for block in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(block)
+        stream.seek(0)
+
+        checkpoint_dir = os.path.join(current_app.root_path, '..', 'storage', 'imports')
+        if not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+        return os.path.join(checkpoint_dir, f"{digest.hexdigest()}.json")
+
+    @staticmethod
+    def _load_checkpoint(path):
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {'rows_done': 0, 'imported': 0, 'error_count': 0, 'errors': []}
+
+    @staticmethod
+    def _save_checkpoint(path, state):
+        temp_path = path + ".temp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, path)
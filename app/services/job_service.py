@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.utils import secure_filename
+from app.core.extensions import db
+
+class JobContext:
+    """Handed to job handlers to report progress"""
+    def __init__(self, job_id, store_path):
+        self.id = job_id
+        self.store_path = store_path
+        self._last_write = 0
+
+    def progress(self, done, total=None, message=None, force=False):
+        # Throttled: handlers may call this for every item
+        now = time.monotonic()
+        if not force and now - self._last_write < 0.5:
+            return
+        self._last_write = now
+        percent = round(100 * done / total, 1) if total else done
+        JobService._update(self.store_path, self.id, progress=percent, message=message)
+
+
+class JobService:
+    """
+    Background jobs for heavy maintenance actions.
+    Jobs run on a small per-process thread pool. State lives in a separate
+    SQLite file (storage/jobs.sqlite) so every gunicorn worker can report
+    status, and restore/reset of the main database can't lose it.
+    """
+    MAX_WORKERS = 2
+
+    _executor = None
+    _executor_lock = threading.Lock()
+    # Destructive jobs (prune/archive/reset/restore) never overlap: the claim is
+    # the job's own row in jobs.sqlite (checked in enqueue, so it holds across
+    # gunicorn workers); the lock only serializes them inside one process
+    _exclusive = threading.Lock()
+    _schema_ready = set()
+
+    @staticmethod
+    def get_storage_dir():
+        path = os.path.join(current_app.root_path, '..', 'storage', 'jobs')
+        if not os.path.exists(path):
+            os.makedirs(path)
+        return path
+
+    @staticmethod
+    def get_store_path():
+        return os.path.join(JobService.get_storage_dir(), 'jobs.sqlite')
+
+    @staticmethod
+    def _connect(store_path):
+        conn = sqlite3.connect(store_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if store_path not in JobService._schema_ready:
+            # Status polls from every worker read while the job writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress REAL DEFAULT 0,
+                    message TEXT,
+                    params TEXT,
+                    result TEXT,
+                    error TEXT,
+                    user_id INTEGER,
+                    pid INTEGER,
+                    exclusive INTEGER DEFAULT 0,
+                    created_at TEXT,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'exclusive' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN exclusive INTEGER DEFAULT 0")
+            conn.commit()
+            JobService._schema_ready.add(store_path)
+        return conn
+
+    @staticmethod
+    def _update(store_path, job_id, **fields):
+        cols = ', '.join(f"{k} = ?" for k in fields)
+        conn = JobService._connect(store_path)
+        try:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _get_executor():
+        with JobService._executor_lock:
+            if JobService._executor is None:
+                JobService._executor = ThreadPoolExecutor(
+                    max_workers=JobService.MAX_WORKERS, thread_name_prefix='eraport-job'
+                )
+            return JobService._executor
+
+    @staticmethod
+    def save_upload(file_storage):
+        """Uploaded files must outlive the request: keep them on disk for the job"""
+        upload_dir = os.path.join(JobService.get_storage_dir(), 'uploads')
+        if not os.path.exists(upload_dir):
+            os.makedirs(upload_dir)
+        path = os.path.join(upload_dir, f"{uuid.uuid4().hex}_{secure_filename(file_storage.filename)}")
+        file_storage.save(path)
+        return path
+
+    @staticmethod
+    def enqueue(kind, user_id=None, **params):
+        """
+        Records a queued job, schedules it and returns its id.
+        An exclusive job is refused while another one is queued or running in
+        any live worker process.
+        """
+        if kind not in JOB_HANDLERS:
+            raise Exception(f"Jenis job tidak dikenal: {kind}")
+        exclusive = JOB_HANDLERS[kind][1]
+
+        job_id = uuid.uuid4().hex
+        store_path = JobService.get_store_path()
+        conn = JobService._connect(store_path)
+        try:
+            # Write lock first: two workers can't both see "no exclusive job" and insert
+            conn.execute("BEGIN IMMEDIATE")
+            if exclusive:
+                for row in conn.execute(
+                    "SELECT kind, pid FROM jobs WHERE exclusive = 1 AND status IN ('queued', 'running')"
+                ).fetchall():
+                    if JobService._pid_alive(row['pid']):
+                        conn.rollback()
+                        raise Exception(f"Job {row['kind']} lain masih berjalan. Tunggu hingga selesai.")
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, user_id, pid, exclusive, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(params), user_id, os.getpid(), int(exclusive), datetime.now().isoformat())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        app = current_app._get_current_object()
+        JobService._get_executor().submit(JobService._run, app, store_path, job_id, kind, user_id, params)
+        return job_id
+
+    @staticmethod
+    def get_job(job_id):
+        """Returns the job as a dict (with duration_sec), or None"""
+        conn = JobService._connect(JobService.get_store_path())
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+
+        job = dict(row)
+        job['params'] = json.loads(job['params']) if job['params'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+
+        # The process that owned the job is gone (worker restart/timeout)
+        if job['status'] in ('queued', 'running') and not JobService._pid_alive(job['pid']):
+            job['status'] = 'failed'
+            job['error'] = 'Proses worker berhenti sebelum job selesai.'
+
+        if job['started_at']:
+            end = datetime.fromisoformat(job['finished_at']) if job['finished_at'] else datetime.now()
+            job['duration_sec'] = round((end - datetime.fromisoformat(job['started_at'])).total_seconds(), 2)
+        else:
+            job['duration_sec'] = None
+        return job
+
+    @staticmethod
+    def _pid_alive(pid):
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+
+    @staticmethod
+    def _run(app, store_path, job_id, kind, user_id, params):
+        handler, exclusive = JOB_HANDLERS[kind]
+        job = JobContext(job_id, store_path)
+        with app.app_context():
+            started = datetime.now()
+            JobService._update(store_path, job_id, status='running', started_at=started.isoformat())
+            try:
+                if exclusive:
+                    with JobService._exclusive:
+                        result = handler(job, user_id=user_id, **params)
+                else:
+                    result = handler(job, user_id=user_id, **params)
+                result = result or {}
+                finished = datetime.now()
+                JobService._update(
+                    store_path, job_id, status='done', progress=100,
+                    message=result.get('message'), result=json.dumps(result),
+                    finished_at=finished.isoformat()
+                )
+                JobService._audit(kind, job_id, user_id, 'SUCCESS', started, finished, result.get('message'))
+            except Exception as e:
+                db.session.rollback()
+                finished = datetime.now()
+                JobService._update(store_path, job_id, status='failed', error=str(e), finished_at=finished.isoformat())
+                JobService._audit(kind, job_id, user_id, 'FAILED', started, finished, f"Error: {str(e)}")
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _audit(kind, job_id, user_id, status, started, finished, details):
+        from app.models import AuditLog
+        try:
+            duration = (finished - started).total_seconds()
+            db.session.add(AuditLog(
+                user_id=user_id,
+                action=f"JOB_{kind.upper()}",
+                target=f"Job {job_id[:8]}",
+                details=f"{details or '-'} (durasi {duration:.1f} dtk)",
+                status=status
+            ))
+            db.session.commit()
+        except Exception:
+            # e.g. a restored backup from before AuditLog existed
+            db.session.rollback()
+
+
+# --- HANDLERS ---
+# Each returns a JSON-serializable dict; 'message' is shown to the user.
+
+def _backup_job(job, user_id=None, description=None, year_filter=None):
+    from app.services.backup_service import BackupService
+    path = BackupService.create_backup(
+        description=description, year_filter=year_filter,
+        progress_callback=lambda pct: job.progress(pct, 100, message='Menyalin database...')
+    )
+    return {'message': 'Backup berhasil dibuat dan disimpan di server.', 'filename': os.path.basename(path)}
+
+def _delete_progress(job):
+    # Batched deletes + VACUUM fill the second half of the bar (the auto backup is the first)
+    return lambda done, total, message: job.progress(50 + 50 * done // max(total, 1), 100, message=message)
+
+def _prune_job(job, user_id=None, year=None):
+    from app.services.backup_service import BackupService
+    job.progress(0, message='Membuat backup otomatis...', force=True)
+    BackupService.create_backup(description=f"AutoBackup_BeforePrune_{year.replace('/', '-')}")
+    job.progress(50, message='Menghapus data...', force=True)
+    success, msg = BackupService.prune_year(year, user_id=user_id, progress_callback=_delete_progress(job))
+    if not success:
+        raise Exception(msg)
+    return {'message': msg}
+
+def _archive_job(job, user_id=None, year=None):
+    from app.services.backup_service import BackupService
+    # The archive file is the copy, no auto backup needed
+    job.progress(0, message='Menulis file arsip...', force=True)
+    success, msg = BackupService.archive_year(year, user_id=user_id, progress_callback=_delete_progress(job))
+    if not success:
+        raise Exception(msg)
+    return {'message': msg}
+
+def _reset_job(job, user_id=None):
+    from app.services.backup_service import BackupService
+    job.progress(0, message='Membuat backup otomatis...', force=True)
+    BackupService.create_backup(description="AutoBackup_BeforeReset")
+    job.progress(50, message='Menghapus data...', force=True)
+    success, msg = BackupService.reset_academic_data(user_id=user_id, progress_callback=_delete_progress(job))
+    if not success:
+        raise Exception(msg)
+    return {'message': msg}
+
+def _restore_progress(job):
+    return lambda done, total, message: job.progress(done, total, message=message, force=True)
+
+def _restore_upload_job(job, user_id=None, path=None, filename=None):
+    from app.services.backup_service import BackupService
+    try:
+        # Validated and restored straight from the saved upload, no extra copy
+        stale = BackupService.restore_file(path, "SafetyBackup_BeforeRestore", progress_callback=_restore_progress(job))
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return {'message': _restore_message('Database berhasil dipulihkan. Silakan refresh halaman.', stale)}
+
+def _restore_local_job(job, user_id=None, filename=None):
+    from app.services.backup_service import BackupService
+    stale = BackupService.restore_from_local(filename, user_id=user_id, progress_callback=_restore_progress(job))
+    return {'message': _restore_message('Database berhasil dipulihkan dari backup server. Silakan refresh.', stale)}
+
+def _restore_message(message, stale_years):
+    if stale_years:
+        message += f" Arsip {', '.join(stale_years)} dinonaktifkan karena datanya kembali ada di database."
+    return message
+
+def _import_students_job(job, user_id=None, path=None, filename=None):
+    from werkzeug.datastructures import FileStorage
+    from app.services.import_service import ImportService
+    try:
+        with open(path, 'rb') as f:
+            success, msg = ImportService.import_students(FileStorage(stream=f, filename=filename))
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    if not success:
+        raise Exception(msg)
+    return {'message': msg}
+
+def _report_pdf_job(job, user_id=None, **params):
+    from app.services.report_pdf_service import ReportPdfService
+    return ReportPdfService.run_batch(job, **params)
+
+# kind -> (handler, exclusive)
+JOB_HANDLERS = {
+    'backup': (_backup_job, False),
+    'prune': (_prune_job, True),
+    'archive': (_archive_job, True),
+    'reset': (_reset_job, True),
+    'restore_upload': (_restore_upload_job, True),
+    'restore_local': (_restore_local_job, True),
+    'import_students': (_import_students_job, False),
+    'report_pdf': (_report_pdf_job, False),
+}
@@ -0,0 +1,191 @@
+import os
+import io
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED, ALL_COMPLETED
+from flask import current_app, render_template
+from werkzeug.utils import secure_filename
+from app.models import Student, Classroom
+from app.core.extensions import db
+from app.services.report_service import ReportService
+
+# Relative URLs in the template (e.g. /static/img/logo.png) resolve against this
+PDF_BASE_URL = 'http://eraport.local/'
+
+# --- Worker process state (set once per process by _init_worker) ---
+_worker_css = None
+_worker_assets = {}
+
+def _init_worker(css_text, assets):
+    """Parses the shared stylesheet once per worker and keeps static assets in memory"""
+    global _worker_css, _worker_assets
+    from weasyprint import CSS
+    _worker_css = CSS(string=css_text)
+    _worker_assets = assets
+
+def _url_fetcher(url):
+    from weasyprint import default_url_fetcher
+    for path, (data, mime_type) in _worker_assets.items():
+        if url.endswith(path):
+            return {'string': data, 'mime_type': mime_type}
+    return default_url_fetcher(url)
+
+def _render_pdf(index, html):
+    from weasyprint import HTML
+    pdf = HTML(string=html, base_url=PDF_BASE_URL, url_fetcher=_url_fetcher).write_pdf(stylesheets=[_worker_css])
+    return index, pdf
+
+
+class ReportPdfService:
+    MAX_WORKERS = min(4, os.cpu_count() or 1)
+    # PDFs submitted but not yet written: keeps the pool busy without queueing the whole school
+    IN_FLIGHT = 2 * MAX_WORKERS
+    OUTPUT_FORMATS = ('zip', 'merged')
+
+    @staticmethod
+    def get_output_dir():
+        output_dir = os.path.join(current_app.root_path, '..', 'storage', 'reports')
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        return output_dir
+
+    @staticmethod
+    def get_output_path(output_file):
+        return os.path.join(ReportPdfService.get_output_dir(), secure_filename(output_file))
+
+    @staticmethod
+    def select_students(classroom_id=None, session=None):
+        """
+        Students to print, optionally limited to one class: the active ones,
+        or everyone in it when session reads an archived year.
+        """
+        from app.services.classroom_service import ClassroomService
+        query = session.query(Student) if session else Student.query.filter_by(active=True)
+        query = ClassroomService.scope(query, classroom_id)
+        return [s.id for s in query.order_by(Student.name).all()]
+
+    @staticmethod
+    def start_batch(semester, classroom_id=None, output='zip', user_id=None, year=None):
+        """Queues a batch PDF job on the job runner and returns its id (year None = active year)"""
+        from app.services.job_service import JobService
+        from app.services.archive_service import ArchiveService
+        if output not in ReportPdfService.OUTPUT_FORMATS:
+            raise Exception(f"Format output tidak dikenal: {output}")
+        with ArchiveService.session_for(year) as session:
+            class_name = None
+            if classroom_id:
+                classroom = (session or db.session).get(Classroom, classroom_id)
+                if not classroom:
+                    raise Exception("Kelas tidak ditemukan.")
+                class_name = classroom.name
+            if not ReportPdfService.select_students(classroom_id, session):
+                raise Exception("Tidak ada santri untuk dicetak.")
+        return JobService.enqueue('report_pdf', user_id=user_id, semester=semester, classroom_id=classroom_id,
+                                  class_name=class_name, output=output, year=year)
+
+    @staticmethod
+    def run_batch(job, semester, classroom_id=None, class_name=None, output='zip', year=None):
+        """
+        Job handler: HTML is rendered in this process, PDFs in a process pool.
+        An archived year is read from its archive, attached for the whole run.
+        Returns the job result with the output file name.
+        """
+        from app.services.archive_service import ArchiveService
+        ext = 'zip' if output == 'zip' else 'pdf'
+        year_part = f"_{secure_filename(year.replace('/', '-'))}" if year else ""
+        class_part = f"_{secure_filename(class_name)}" if class_name else ""
+        output_file = f"raport{year_part}_sem{semester}{class_part}_{job.id[:8]}.{ext}"
+        output_path = ReportPdfService.get_output_path(output_file)
+
+        app = current_app._get_current_object()
+        try:
+            with ArchiveService.session_for(year) as session, app.test_request_context(base_url=PDF_BASE_URL):
+                student_ids = ReportPdfService.select_students(classroom_id, session)
+                total = len(student_ids)
+                css_text = render_template('pages/reports/_print_styles.css')
+                logo_path = os.path.join(app.static_folder, 'img', 'logo.png')
+                assets = {}
+                if os.path.exists(logo_path):
+                    with open(logo_path, 'rb') as f:
+                        assets['/static/img/logo.png'] = (f.read(), 'image/png')
+
+                # spawn: never fork a (possibly multi-threaded) gunicorn worker
+                with ProcessPoolExecutor(
+                    max_workers=ReportPdfService.MAX_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(css_text, assets)
+                ) as pool:
+                    names = []
+
+                    def pages():
+                        # Report data is loaded per batch of students, not per student
+                        contexts = ReportService.iter_class_reports(student_ids, semester, year, session=session)
+                        for index, (student_id, context) in enumerate(contexts):
+                            student = context['student']
+                            names.append(f"{student.nis}_{secure_filename(student.name)}.pdf")
+                            yield index, render_template('pages/reports/print_template.html', pdf_mode=True, **context)
+
+                    if output == 'zip':
+                        ReportPdfService._write_zip(pool, pages(), names, output_path, job, total)
+                    else:
+                        ReportPdfService._write_merged(pool, pages(), output_path, job, total)
+        except Exception:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+
+        return {'message': f"{total} raport selesai dibuat.", 'output_file': output_file, 'total': total}
+
+    @staticmethod
+    def _render_all(pool, pages, consume, job, total):
+        """
+        Submits (index, html) pages to the pool with at most IN_FLIGHT pending
+        and hands each finished (index, pdf) to consume right away, so HTML is
+        only rendered as fast as the pool converts it and progress starts
+        with the first PDF.
+        """
+        pending = set()
+        done = 0
+
+        def drain(return_when):
+            nonlocal pending, done
+            finished, pending = wait(pending, return_when=return_when)
+            for future in finished:
+                consume(*future.result())
+                done += 1
+                job.progress(done, total, message=f"{done}/{total} raport")
+
+        for index, html in pages:
+            pending.add(pool.submit(_render_pdf, index, html))
+            if len(pending) >= ReportPdfService.IN_FLIGHT:
+                drain(FIRST_COMPLETED)
+        if pending:
+            drain(ALL_COMPLETED)
+
+    @staticmethod
+    def _write_zip(pool, pages, names, output_path, job, total):
+        # Entries are streamed into the archive as soon as each PDF is ready
+        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            ReportPdfService._render_all(
+                pool, pages, lambda index, pdf: zf.writestr(names[index], pdf), job, total
+            )
+
+    @staticmethod
+    def _write_merged(pool, pages, output_path, job, total):
+        from pypdf import PdfWriter
+        writer = PdfWriter()
+        # Keep print order: append in index order, buffer only out-of-order results
+        buffered = {}
+        next_index = 0
+
+        def append(index, pdf):
+            nonlocal next_index
+            buffered[index] = pdf
+            while next_index in buffered:
+                writer.append(io.BytesIO(buffered.pop(next_index)))
+                next_index += 1
+
+        ReportPdfService._render_all(pool, pages, append, job, total)
+        with open(output_path, 'wb') as f:
+            writer.write(f)
@@ -0,0 +1,90 @@
+from collections import defaultdict
+from sqlalchemy.orm import joinedload
+from app.models import Student, Subject, Grade, ReportRecord, ClassMembership
+from app.core.extensions import db
+
+class ReportService:
+    # Students per IN (...) lookup
+    LOOKUP_CHUNK = 500
+
+    @staticmethod
+    def empty_record():
+        """Default empty structure for students without a ReportRecord"""
+        return ReportRecord(
+            attendance_sakit=0, attendance_izin=0, attendance_alpa=0,
+            notes="-", extras=[], personality=[]
+        )
+
+    @staticmethod
+    def load_class_reports(students, semester, year=None, session=None):
+        """
+        Builds report contexts for many students in a constant number of queries:
+        subjects once, grades in one pass (pivoted by student and subject),
+        report records, classes and precomputed summaries in one pass each, settings
+        from the settings cache.
+        students: list of Student objects (already loaded by the caller).
+        session: where to read from (default db.session; an ArchiveService session
+        for an archived year).
+        Returns {student_id: context} in the same order as students.
+        """
+        from app.models.setting import Setting
+        from app.services.summary_service import SummaryService
+        session = session or db.session
+        current_year = year or Setting.get_value('academic_year', '2024/2025')
+
+        subjects = session.query(Subject).order_by(Subject.order, Subject.id).all()
+
+        grades = defaultdict(dict) # student_id -> {subject_id: Grade}
+        records = {}
+        classrooms = {}
+        ids = [s.id for s in students]
+        for i in range(0, len(ids), ReportService.LOOKUP_CHUNK):
+            chunk = ids[i:i + ReportService.LOOKUP_CHUNK]
+            for g in session.query(Grade).filter(
+                Grade.student_id.in_(chunk), Grade.semester == semester, Grade.year == current_year
+            ).all():
+                grades[g.student_id][g.subject_id] = g
+            for rr in session.query(ReportRecord).filter(
+                ReportRecord.student_id.in_(chunk), ReportRecord.semester == semester, ReportRecord.year == current_year
+            ).all():
+                records[rr.student_id] = rr
+            for m in session.query(ClassMembership).options(joinedload(ClassMembership.classroom)).filter(
+                ClassMembership.student_id.in_(chunk), ClassMembership.year == current_year
+            ).all():
+                classrooms[m.student_id] = m.classroom
+        summaries = SummaryService.load_summaries(ids, semester, current_year, session=session)
+
+        return {
+            s.id: dict(
+                student=s,
+                subjects=subjects,
+                grades=grades.get(s.id, {}),
+                semester=semester,
+                year=current_year,
+                record=records.get(s.id) or ReportService.empty_record(),
+                classroom=classrooms.get(s.id),
+                summary=summaries.get(s.id)
+            )
+            for s in students
+        }
+
+    @staticmethod
+    def iter_class_reports(student_ids, semester, year=None, batch_size=None, session=None):
+        """
+        Yields (student_id, context) for a long list of ids, loading students
+        and their report data batch by batch so memory stays bounded.
+        """
+        session = session or db.session
+        batch_size = batch_size or ReportService.LOOKUP_CHUNK
+        for i in range(0, len(student_ids), batch_size):
+            chunk = student_ids[i:i + batch_size]
+            by_id = {s.id: s for s in session.query(Student).filter(Student.id.in_(chunk)).all()}
+            students = [by_id[sid] for sid in chunk if sid in by_id]
+            contexts = ReportService.load_class_reports(students, semester, year, session=session)
+            for s in students:
+                yield s.id, contexts[s.id]
+
+    @staticmethod
+    def get_report_context(student, semester, year=None, session=None):
+        """Builds the template context for one student's report card"""
+        return ReportService.load_class_reports([student], semester, year, session=session)[student.id]
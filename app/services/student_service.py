@@ -0,0 +1,263 @@
+import time
+from difflib import SequenceMatcher
+from sqlalchemy import tuple_, text, or_
+from app.models import Student
+from app.core.extensions import db
+
+class StudentPage:
+    """One page of a keyset listing; cursors are the ids of the edge rows"""
+    def __init__(self, items, has_prev, has_next, start, per_page, total):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.start = start # Row number of the first item (1-based)
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def prev_cursor(self):
+        return self.items[0].id if self.has_prev and self.items else None
+
+    @property
+    def next_cursor(self):
+        return self.items[-1].id if self.has_next and self.items else None
+
+    @property
+    def prev_start(self):
+        return max(1, self.start - self.per_page)
+
+    @property
+    def next_start(self):
+        return self.start + len(self.items)
+
+class StudentService:
+    """
+    Student listings paged by keyset (seek) instead of OFFSET.
+    The order is active first, then name, id - the ix_students_active_name_id
+    index - so any page is one index range scan from the cursor row, however
+    deep it is. The total shown next to the list comes from a short-lived
+    per-process cache instead of a COUNT(*) on every page load.
+
+    Search (type-ahead) runs on the students_fts trigram index, which the
+    triggers of migration 8 keep in sync with every write to students.
+    """
+    # Listing order of Student.active (NULL sorts last, like active DESC)
+    ACTIVE_ORDER = (True, False, None)
+    # Seconds a cached total stays valid (other workers' changes show up after this)
+    COUNT_TTL = 60
+
+    # Results per search (type-ahead list)
+    SEARCH_LIMIT = 10
+    # Index hits loaded per search pass
+    SEARCH_CANDIDATES = 100
+    # Similarity (difflib ratio, averaged over the query's words) a near match must reach
+    FUZZY_MIN_SIMILARITY = 0.75
+
+    _counts = {}
+
+    @staticmethod
+    def page(query, per_page, after=None, before=None, start=1, count_key=None):
+        """
+        Page of query after (or before) the student with the given id.
+        start is the row number of the page's first item as carried in the
+        links (display only). A cursor pointing at a deleted student falls
+        back to the first page. With count_key the page gets a cached total.
+        """
+        cursor_id = after or before
+        cursor = db.session.get(Student, cursor_id) if cursor_id else None
+        forward = before is None or cursor is None
+        if cursor is None:
+            groups, start = StudentService.ACTIVE_ORDER, 1
+        else:
+            groups = StudentService._groups_from(cursor, forward)
+
+        rows = StudentService._seek(query, groups, cursor, per_page + 1, forward)
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if forward:
+            has_prev, has_next = cursor is not None, more
+        else:
+            rows.reverse()
+            has_prev = more
+            # The cursor row may have left the query (moved class, deactivated)
+            has_next = bool(rows) and bool(StudentService._seek(
+                query, StudentService._groups_from(rows[-1]), rows[-1], 1, True
+            ))
+            start = start if more else 1
+        total = StudentService.count(query, count_key) if count_key else None
+        return StudentPage(rows, has_prev, has_next, max(1, start), per_page, total)
+
+    @staticmethod
+    def _groups_from(student, forward=True):
+        """Active groups to walk from student's group on, in paging direction"""
+        i = StudentService.ACTIVE_ORDER.index(student.active)
+        return StudentService.ACTIVE_ORDER[i:] if forward else StudentService.ACTIVE_ORDER[i::-1]
+
+    @staticmethod
+    def _seek(query, groups, cursor, limit, forward):
+        """Walks the active groups from the cursor row, one index range scan per group"""
+        key = tuple_(Student.name, Student.id)
+        order = (Student.name, Student.id) if forward else (Student.name.desc(), Student.id.desc())
+        rows = []
+        for n, active in enumerate(groups):
+            q = query.filter(Student.active.is_(None) if active is None else Student.active == active)
+            if n == 0 and cursor is not None:
+                edge = tuple_(db.literal(cursor.name), db.literal(cursor.id))
+                q = q.filter(key > edge if forward else key < edge)
+            rows += q.order_by(*order).limit(limit - len(rows)).all()
+            if len(rows) >= limit:
+                break
+        return rows
+
+    @staticmethod
+    def count(query, key):
+        """COUNT of query, cached per process for COUNT_TTL seconds under key"""
+        now = time.monotonic()
+        cached = StudentService._counts.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        total = query.order_by(None).count()
+        StudentService._counts[key] = (now + StudentService.COUNT_TTL, total)
+        return total
+
+    @staticmethod
+    def invalidate_counts():
+        """Drops the cached totals of this process (after adding/removing students)"""
+        StudentService._counts.clear()
+
+    # --- SEARCH ---
+
+    @staticmethod
+    def fts_supported(conn):
+        """FTS5 with the trigram tokenizer (SQLite >= 3.34) is available"""
+        if conn.dialect.name != 'sqlite':
+            return False
+        version = tuple(int(x) for x in conn.execute(text("SELECT sqlite_version()")).scalar().split('.'))
+        options = {row[0] for row in conn.execute(text("PRAGMA compile_options"))}
+        return version >= (3, 34) and 'ENABLE_FTS5' in options
+
+    @staticmethod
+    def _has_fts():
+        if db.engine.dialect.name != 'sqlite':
+            return False
+        return db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students_fts'"
+        )).first() is not None
+
+    @staticmethod
+    def search(q, limit=None, classroom_id=None):
+        """
+        Students matching q on name, NIS or NISM, best first.
+        Substring matches come from the trigram index; when they don't fill
+        the list, near matches (a typo or swapped letters in a word) are
+        added: rows sharing any of the query's trigrams, most shared first,
+        scored by how closely their words match the query's. Index hits are taken
+        unranked (bm25 over common trigrams costs tens of ms) and ordered
+        in Python: exact NIS, prefix matches and active students first.
+        Shorter words ("santri 12") must appear in the name, NIS or NISM of
+        every result. Queries without a word of 3+ characters use a prefix LIKE.
+        """
+        q = ' '.join((q or '').lower().split())
+        limit = limit or StudentService.SEARCH_LIMIT
+        if not q:
+            return []
+        words = [w for w in q.split(' ') if len(w) >= 3]
+        short = [w for w in q.split(' ') if len(w) < 3]
+        if not words or not StudentService._has_fts():
+            return StudentService._search_like(q, limit, classroom_id)
+
+        quote = StudentService._quote
+        ids = StudentService._fts_ids(' AND '.join(quote(w) for w in words), short)
+        # Exact NIS may sit beyond the candidate limit of a short number
+        ids += [i for (i,) in db.session.query(Student.id).filter(Student.nis == q) if i not in ids]
+        results = StudentService._load(ids, classroom_id)
+        results.sort(key=lambda s: StudentService._rank_key(s, q))
+        if len(results) >= limit:
+            return results[:limit]
+
+        # Near matches: one swapped letter leaves few trigrams in common, so
+        # any shared trigram makes a candidate; the word similarity decides
+        found = set(ids)
+        near_ids = [i for i in StudentService._fts_overlap_ids(StudentService._trigrams(words)) if i not in found]
+        scored = []
+        for s in StudentService._load(near_ids, classroom_id):
+            target_words = ' '.join(filter(None, (s.name, s.nis, s.nism))).lower().split()
+            if not all(any(w in t for t in target_words) for w in short):
+                continue
+            score = sum(
+                max((SequenceMatcher(None, w, t).ratio() for t in target_words), default=0) for w in words
+            ) / len(words)
+            if score >= StudentService.FUZZY_MIN_SIMILARITY:
+                # Words starting like the query's words ("ahmd" -> Ahmad before Rahman)
+                starts = sum(any(t.startswith(w[:3]) for t in target_words) for w in words)
+                scored.append((-score, -starts, StudentService._rank_key(s, q), s))
+        results += [s for *_, s in sorted(scored, key=lambda x: x[:3])]
+        return results[:limit]
+
+    @staticmethod
+    def _fts_ids(match, short_words=()):
+        """Index hits of match; short_words (too short for the trigram index) filter them by LIKE"""
+        sql = "SELECT rowid FROM students_fts WHERE students_fts MATCH :q"
+        params = {'q': match, 'n': StudentService.SEARCH_CANDIDATES}
+        for i, w in enumerate(short_words):
+            # Applied before LIMIT, so the candidates all contain the word
+            sql += f" AND (name LIKE :s{i} ESCAPE '\\' OR nis LIKE :s{i} ESCAPE '\\' OR nism LIKE :s{i} ESCAPE '\\')"
+            params[f's{i}'] = '%' + w.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return [row[0] for row in db.session.execute(text(sql + " LIMIT :n"), params)]
+
+    @staticmethod
+    def _fts_overlap_ids(grams):
+        """Index rows containing any of the trigrams, most trigrams in common first"""
+        grams = sorted(grams)
+        union = ' UNION ALL '.join(
+            f"SELECT rowid FROM students_fts WHERE students_fts MATCH :g{i}" for i in range(len(grams))
+        )
+        params = {f'g{i}': StudentService._quote(g) for i, g in enumerate(grams)}
+        params['n'] = StudentService.SEARCH_CANDIDATES
+        return [row[0] for row in db.session.execute(
+            text(f"SELECT rowid FROM ({union}) GROUP BY rowid ORDER BY COUNT(*) DESC LIMIT :n"), params
+        )]
+
+    @staticmethod
+    def _load(ids, classroom_id):
+        if not ids:
+            return []
+        from app.services.classroom_service import ClassroomService
+        return ClassroomService.scope(Student.query, classroom_id).filter(Student.id.in_(ids)).all()
+
+    @staticmethod
+    def _search_like(q, limit, classroom_id):
+        from app.services.classroom_service import ClassroomService
+        p = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        if len(q) >= 3:
+            conditions = [col.ilike(f'%{p}%', escape='\\') for col in (Student.name, Student.nis, Student.nism)]
+        else:
+            conditions = [Student.name.ilike(f'{p}%', escape='\\'), Student.name.ilike(f'% {p}%', escape='\\'),
+                          Student.nis.ilike(f'{p}%', escape='\\'), Student.nism.ilike(f'{p}%', escape='\\')]
+        # Unordered: stops scanning at the first hits instead of sorting the table
+        results = ClassroomService.scope(Student.query, classroom_id).filter(or_(*conditions)).limit(limit * 5).all()
+        results.sort(key=lambda s: StudentService._rank_key(s, q))
+        return results[:limit]
+
+    @staticmethod
+    def _rank_key(student, q):
+        """Exact/prefix hits on NIS or name first, then word prefixes, active students, name"""
+        name = (student.name or '').lower()
+        if q in ((student.nis or '').lower(), (student.nism or '').lower()) or name == q:
+            tier = 0
+        elif name.startswith(q) or (student.nis or '').lower().startswith(q):
+            tier = 1
+        elif f' {q}' in f' {name}':
+            tier = 2
+        else:
+            tier = 3
+        return (tier, student.active is not True, name, student.id)
+
+    @staticmethod
+    def _trigrams(words):
+        return {w[i:i + 3] for w in words for i in range(len(w) - 2)}
+
+    @staticmethod
+    def _quote(term):
+        """FTS5 string literal (the trigram tokenizer matches it as a substring)"""
+        return '"' + term.replace('"', '""') + '"'
@@ -0,0 +1,158 @@
+from collections import defaultdict
+from sqlalchemy import func, case, or_
+from app.models import Grade, Subject, Classroom, ClassMembership, StudentSemesterSummary
+from app.core.extensions import db
+
+class SummaryService:
+    """
+    Maintains student_semester_summaries: per student and semester the
+    total/average NR, subjects below KKM and class rank.
+    Refreshed for the students touched by a grade save, so reports and
+    the dashboard read one precomputed row instead of aggregating grades.
+    """
+    # Students per IN (...) lookup
+    LOOKUP_CHUNK = 500
+    # Refreshes touching more students than this run as one full pass
+    FULL_REFRESH_THRESHOLD = 2000
+
+    @staticmethod
+    def refresh(semester, year, student_ids=None):
+        """
+        Recomputes the summaries of student_ids (all students with grades
+        when None) and re-ranks the classes they belong to. Does not commit.
+        """
+        if student_ids is not None:
+            student_ids = list(student_ids)
+            if not student_ids:
+                return
+            # Above the threshold one full pass beats chunked lookups
+            if len(student_ids) > SummaryService.FULL_REFRESH_THRESHOLD:
+                student_ids = None
+
+        chunks = [None]
+        if student_ids is not None:
+            chunks = [student_ids[i:i + SummaryService.LOOKUP_CHUNK]
+                      for i in range(0, len(student_ids), SummaryService.LOOKUP_CHUNK)]
+
+        classes = set()
+        for chunk in chunks:
+            classes.update(SummaryService._refresh_chunk(semester, year, chunk))
+
+        SummaryService.rerank(semester, year, classes if student_ids is not None else None)
+
+    @staticmethod
+    def _refresh_chunk(semester, year, student_ids):
+        """Upserts one chunk of summaries, returns the class names involved"""
+        kkm_miss = case((Grade.nr < Subject.kkm, 1), else_=0)
+        agg = db.session.query(
+            Grade.student_id,
+            func.sum(Grade.nr),
+            func.avg(Grade.nr),
+            func.count(Grade.nr),
+            func.sum(kkm_miss)
+        ).join(Subject, Subject.id == Grade.subject_id).filter(
+            Grade.semester == semester, Grade.year == year, Grade.nr.isnot(None)
+        )
+        # Class of the year, from class membership
+        records = db.session.query(ClassMembership.student_id, Classroom.name).join(Classroom).filter(
+            ClassMembership.year == year
+        )
+        existing = StudentSemesterSummary.query.filter_by(semester=semester, year=year)
+        if student_ids is not None:
+            agg = agg.filter(Grade.student_id.in_(student_ids))
+            records = records.filter(ClassMembership.student_id.in_(student_ids))
+            existing = existing.filter(StudentSemesterSummary.student_id.in_(student_ids))
+
+        class_of = dict(records.all())
+        existing = {s.student_id: s for s in existing.all()}
+        classes = {s.class_name for s in existing.values()}
+
+        inserts, updates = [], []
+        for student_id, total, average, count, below in agg.group_by(Grade.student_id).all():
+            values = {
+                'class_name': class_of.get(student_id),
+                'total': round(total, 2),
+                'average': round(average, 2),
+                'subject_count': count,
+                'below_kkm': below or 0,
+            }
+            classes.add(values['class_name'])
+            current = existing.pop(student_id, None)
+            if current is None:
+                inserts.append(dict(values, student_id=student_id, semester=semester, year=year))
+            elif any(getattr(current, k) != v for k, v in values.items()):
+                updates.append(dict(values, id=current.id))
+
+        if inserts:
+            db.session.bulk_insert_mappings(StudentSemesterSummary, inserts)
+        if updates:
+            db.session.bulk_update_mappings(StudentSemesterSummary, updates)
+        # Students whose grades were all cleared
+        if existing:
+            StudentSemesterSummary.query.filter(
+                StudentSemesterSummary.id.in_([s.id for s in existing.values()])
+            ).delete(synchronize_session=False)
+        return classes
+
+    @staticmethod
+    def rerank(semester, year, class_names=None):
+        """
+        Assigns class_rank by total (ties share a rank: 1, 2, 2, 4).
+        class_names limits the work to those classes; None re-ranks all.
+        """
+        query = db.session.query(
+            StudentSemesterSummary.id,
+            StudentSemesterSummary.class_name,
+            StudentSemesterSummary.total,
+            StudentSemesterSummary.class_rank
+        ).filter(StudentSemesterSummary.semester == semester, StudentSemesterSummary.year == year)
+        if class_names is not None:
+            if not class_names:
+                return
+            named = [c for c in class_names if c is not None]
+            conditions = [StudentSemesterSummary.class_name.in_(named)] if named else []
+            if None in class_names:
+                conditions.append(StudentSemesterSummary.class_name.is_(None))
+            query = query.filter(or_(*conditions))
+
+        groups = defaultdict(list)
+        for row in query.all():
+            groups[row.class_name].append(row)
+
+        updates = []
+        for rows in groups.values():
+            rows.sort(key=lambda r: -(r.total or 0))
+            rank = 0
+            previous = None
+            for position, row in enumerate(rows, 1):
+                if row.total != previous:
+                    rank = position
+                    previous = row.total
+                if row.class_rank != rank:
+                    updates.append({'id': row.id, 'class_rank': rank})
+        if updates:
+            db.session.bulk_update_mappings(StudentSemesterSummary, updates)
+
+    @staticmethod
+    def load_summaries(student_ids, semester, year, session=None):
+        """Returns {student_id: StudentSemesterSummary} (chunked IN lookups)"""
+        session = session or db.session
+        result = {}
+        student_ids = list(student_ids)
+        for i in range(0, len(student_ids), SummaryService.LOOKUP_CHUNK):
+            chunk = student_ids[i:i + SummaryService.LOOKUP_CHUNK]
+            for s in session.query(StudentSemesterSummary).filter(
+                StudentSemesterSummary.student_id.in_(chunk),
+                StudentSemesterSummary.semester == semester,
+                StudentSemesterSummary.year == year
+            ).all():
+                result[s.student_id] = s
+        return result
+
+    @staticmethod
+    def top_students(semester, year, limit=5, class_name=None):
+        """Best summaries of a semester (optionally of one class), read straight from the summary table"""
+        query = StudentSemesterSummary.query.filter_by(semester=semester, year=year)
+        if class_name:
+            query = query.filter_by(class_name=class_name)
+        return query.order_by(StudentSemesterSummary.total.desc()).limit(limit).all()
@@ -15,6 +15,19 @@ class Config:
     WTF_CSRF_ENABLED = True
     WTF_CSRF_SECRET_KEY = SECRET_KEY 
     
+    # SQLite profile, applied to every new connection (app/core/sqlite.py).
+    # WAL lets readers and one writer work at the same time; busy_timeout
+    # makes concurrent writers wait instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'busy_timeout': 10000,     # ms; first, so the pragmas below wait for locks too
+        'auto_vacuum': 'INCREMENTAL', # Takes effect on new files; existing ones switch on their first prune/reset
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',   # Safe with WAL, one fsync per checkpoint instead of per commit
+        'cache_size': -32000,      # KiB (negative) = ~32 MB page cache per connection
+        'mmap_size': 134217728,    # 128 MB memory-mapped reads
+        'temp_store': 'MEMORY',
+    }
+    
     # Uploads
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'storage')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
@@ -38,6 +51,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///:memory:'
+    SQLITE_PRAGMAS = dict(Config.SQLITE_PRAGMAS, synchronous='OFF') # Durability not needed in tests
     WTF_CSRF_ENABLED = False
 
 config = {
@@ -10,4 +10,8 @@ def make_shell_context():
     return dict(db=db, User=User)
 
 if __name__ == '__main__':
+    # Local runs migrate themselves; deployments run `flask db-upgrade`
+    from app.core.migrations import migrate
+    with app.app_context():
+        migrate()
     app.run(debug=True, port=5005)
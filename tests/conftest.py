@@ -0,0 +1,73 @@
+import pytest
+import config
+from app import create_app
+from app.core.extensions import db
+from app.core.migrations import migrate
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on a migrated SQLite file in tmp_path; backups, archives and jobs stored there too"""
+    from app.services.backup_service import BackupService
+    from app.services.archive_service import ArchiveService
+    from app.services.job_service import JobService
+
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'eraport.sqlite'}")
+    for service, name, folder in (
+        (BackupService, 'get_backup_dir', 'backups'),
+        (ArchiveService, 'get_archive_dir', 'archive'),
+        (JobService, 'get_storage_dir', 'jobs'),
+    ):
+        path = tmp_path / 'storage' / folder
+        path.mkdir(parents=True)
+        monkeypatch.setattr(service, name, staticmethod(lambda path=path: str(path)))
+
+    app = create_app('testing')
+    with app.app_context():
+        migrate()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    app.config['LOGIN_DISABLED'] = True
+    return app.test_client()
+
+
+@pytest.fixture
+def subjects(app):
+    from app.models import Subject
+    rows = [Subject(code='MP1', name='Quran', kkm=70, order=1), Subject(code='MP2', name='Fiqih', kkm=70, order=2)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+@pytest.fixture
+def students(app):
+    from app.models import Student
+    rows = [Student(nis=f'N{i:03d}', name=f'Santri {i:03d}', gender='L') for i in range(1, 21)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return rows
+
+
+@pytest.fixture
+def two_years(subjects, students):
+    """Classes, grades and report records for 2023/2024 and 2024/2025 (the active year)"""
+    from app.models import Grade, ReportRecord, Setting
+    from app.services.classroom_service import ClassroomService
+    Setting.set_values({'academic_year': '2024/2025'})
+    ids = [s.id for s in students]
+    for year in ('2023/2024', '2024/2025'):
+        classroom = ClassroomService.create('A1', year)
+        ClassroomService.assign(ids, classroom.id, year)
+        db.session.add_all(
+            Grade(student_id=i, subject_id=s.id, semester=1, year=year, nh=60 + i, nk=60 + i, nu=60 + i, nr=60 + i)
+            for i in ids for s in subjects
+        )
+        db.session.add_all(ReportRecord(student_id=i, semester=1, year=year, extras=[], personality=[]) for i in ids)
+    db.session.commit()
+    return ('2023/2024', '2024/2025')
@@ -0,0 +1,81 @@
+import os
+import stat
+import pytest
+from sqlalchemy.exc import OperationalError
+from app.core.extensions import db
+from app.models import Grade, ReportRecord, Student, Classroom
+from app.services.archive_service import ArchiveService
+from app.services.backup_service import BackupService
+from app.services.report_service import ReportService
+
+
+def test_archive_moves_year_out_of_live_database(two_years):
+    old, active = two_years
+    ok, msg = BackupService.archive_year(old)
+    assert ok, msg
+
+    assert Grade.query.filter_by(year=old).count() == 0
+    assert ReportRecord.query.filter_by(year=old).count() == 0
+    assert Classroom.query.filter_by(year=old).count() == 0
+    assert Grade.query.filter_by(year=active).count() == 40
+    # Students stay in the live database, the archive keeps a copy
+    assert Student.query.count() == 20
+
+    path = ArchiveService.get_path(old)
+    assert ArchiveService.is_archived(old)
+    assert not os.stat(path).st_mode & stat.S_IWUSR
+    [archive] = ArchiveService.list_archives()
+    assert archive['year'] == old
+    assert archive['counts'] == {'students': 20, 'grades': 40, 'report_records': 20}
+
+
+def test_archived_reports_read_from_archive(two_years):
+    old, _ = two_years
+    BackupService.archive_year(old)
+    with ArchiveService.session(old) as session:
+        students = session.query(Student).order_by(Student.id).all()
+        contexts = ReportService.load_class_reports(students, 1, old, session=session)
+    context = contexts[students[0].id]
+    assert context['year'] == old
+    assert len(context['grades']) == 2
+    assert context['classroom'].name == 'A1'
+
+
+def test_archive_session_is_read_only(two_years):
+    old, _ = two_years
+    BackupService.archive_year(old)
+    with ArchiveService.session(old) as session:
+        with pytest.raises(OperationalError):
+            session.query(Grade).delete()
+    with ArchiveService.session(old) as session:
+        assert session.query(Grade).count() == 40
+
+
+def test_refuses_active_empty_and_archived_years(two_years):
+    old, active = two_years
+    assert BackupService.archive_year(active) == (False, f"Tahun ajaran {active} masih aktif dan tidak dapat diarsipkan.")
+    ok, _ = BackupService.archive_year('2010/2011')
+    assert not ok
+    assert not os.path.exists(ArchiveService.get_path('2010/2011'))
+
+    assert BackupService.archive_year(old)[0]
+    assert BackupService.archive_year(old) == (False, f"Tahun ajaran {old} sudah diarsipkan.")
+
+
+def test_restoring_older_backup_sets_stale_archive_aside(two_years):
+    old, _ = two_years
+    backup = BackupService.create_backup(description='before_archive')
+    assert BackupService.archive_year(old)[0]
+
+    source, _ = BackupService.open_backup(os.path.basename(backup))
+    restored = os.path.join(BackupService.get_backup_dir(), 'restore.sqlite')
+    with open(restored, 'wb') as f:
+        f.write(source.read())
+    assert BackupService.restore_file(restored) == [old]
+    db.session.remove()
+
+    # The live rows count again and the year can be archived anew
+    assert not ArchiveService.is_archived(old)
+    assert Grade.query.filter_by(year=old).count() == 40
+    assert os.listdir(os.path.join(ArchiveService.get_archive_dir(), ArchiveService.STALE_DIR))
+    assert BackupService.archive_year(old)[0]
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import pytest
+from app.core.extensions import db
+from app.core.migrations import LATEST_VERSION
+from app.models import Grade, Setting
+from app.services.backup_service import BackupService
+from app.services.dashboard_service import DashboardService
+
+
+@pytest.fixture
+def backup_file(two_years, tmp_path):
+    """A full backup of the two_years data as a plain SQLite file, plus its name in the backup list"""
+    name = os.path.basename(BackupService.create_backup(description='base'))
+    source, _ = BackupService.open_backup(name)
+    path = tmp_path / 'upload.sqlite'
+    path.write_bytes(source.read())
+    return str(path), name
+
+
+def backup_names():
+    return {b['filename'] for b in BackupService.get_backups()}
+
+
+def version(key):
+    db.session.remove()
+    return int(db.session.get(Setting, key).value)
+
+
+# --- validate_backup ---
+
+def test_validate_accepts_backup(backup_file):
+    info = BackupService.validate_backup(backup_file[0])
+    assert info['schema_version'] == LATEST_VERSION
+    assert info['page_size'] > 0
+
+
+def test_validate_rejects_non_sqlite(tmp_path):
+    path = tmp_path / 'notes.sqlite'
+    path.write_bytes(b'not a database' * 100)
+    with pytest.raises(Exception, match="bukan database SQLite"):
+        BackupService.validate_backup(str(path))
+
+
+def test_validate_rejects_other_sqlite_database(tmp_path):
+    path = str(tmp_path / 'other.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER)")
+    conn.close()
+    with pytest.raises(Exception, match="tabel tidak ada: students, grades, settings"):
+        BackupService.validate_backup(path)
+
+
+def test_validate_rejects_newer_schema(backup_file):
+    path = backup_file[0]
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO schema_version (version, name) VALUES (?, 'future')", (LATEST_VERSION + 1,))
+    conn.commit()
+    conn.close()
+    with pytest.raises(Exception, match="versi aplikasi yang lebih baru"):
+        BackupService.validate_backup(path)
+
+
+def test_validate_rejects_corrupt_file(backup_file):
+    path = backup_file[0]
+    data = bytearray(open(path, 'rb').read())
+    page_size = int.from_bytes(data[16:18], 'big')
+    data[page_size * 2:page_size * 3] = b'\xff' * page_size
+    open(path, 'wb').write(bytes(data))
+    with pytest.raises(Exception, match="rusak|tidak dapat dibaca"):
+        BackupService.validate_backup(path)
+
+
+# --- restore_file ---
+
+def test_rejected_file_touches_nothing(backup_file, tmp_path):
+    path = tmp_path / 'bad.sqlite'
+    path.write_bytes(b'garbage' * 100)
+    before = backup_names()
+    with pytest.raises(Exception):
+        BackupService.restore_file(str(path))
+    assert backup_names() == before
+    assert Grade.query.count() == 80
+
+
+def test_restore_replaces_live_data(backup_file):
+    path, _ = backup_file
+    Grade.query.filter_by(year='2023/2024').delete()
+    Setting.set_values({'school_name': 'after backup'})
+    db.session.commit()
+    settings_version = version(Setting.VERSION_KEY)
+    stats_version = version(DashboardService.STATS_VERSION_KEY)
+    before = backup_names()
+
+    steps = []
+    BackupService.restore_file(path, progress_callback=lambda done, total, message: steps.append(done))
+    db.session.remove()
+
+    assert Grade.query.count() == 80
+    assert Setting.get_value('school_name') != 'after backup'
+    assert steps == sorted(steps)
+    # Safety snapshot of the replaced database, source left in place
+    assert len(backup_names() - before) == 1
+    assert os.path.exists(path)
+    # Cached settings/stats of every worker are stale
+    assert version(Setting.VERSION_KEY) > settings_version
+    assert version(DashboardService.STATS_VERSION_KEY) > stats_version
+    assert db.session.execute(db.text("PRAGMA integrity_check")).scalar() == 'ok'
+
+
+def test_restore_keeps_live_page_size(backup_file, tmp_path):
+    path = str(tmp_path / 'small_pages.sqlite')
+    conn = sqlite3.connect(backup_file[0])
+    conn.execute("PRAGMA page_size = 1024")
+    conn.execute("VACUUM INTO ?", (path,))
+    conn.close()
+    page_size = db.session.execute(db.text("PRAGMA page_size")).scalar()
+    assert page_size != 1024
+
+    BackupService.restore_file(path)
+    db.session.remove()
+    assert db.session.execute(db.text("PRAGMA page_size")).scalar() == page_size
+    assert Grade.query.count() == 80
+
+
+def test_restore_from_local_snapshot(backup_file):
+    _, name = backup_file
+    Grade.query.delete()
+    db.session.commit()
+    BackupService.restore_from_local(name)
+    db.session.remove()
+    assert Grade.query.count() == 80
+    # The file rebuilt from the snapshot is removed afterwards
+    assert not [f for f in os.listdir(BackupService.get_backup_dir()) if f.endswith('.restore_temp')]
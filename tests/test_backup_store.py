@@ -0,0 +1,34 @@
+import os
+import pytest
+from app.services.backup_service import BackupService
+from app.services.backup_store import BackupStore
+
+
+@pytest.fixture
+def snapshot(two_years):
+    return BackupService.create_backup(description='base')
+
+
+def test_listing_reads_info_not_manifest(snapshot, monkeypatch):
+    def no_manifest(path):
+        raise AssertionError("listing parsed the manifest")
+    monkeypatch.setattr(BackupStore, 'read_manifest', staticmethod(no_manifest))
+
+    [backup] = BackupService.get_backups()
+    assert backup['filename'] == os.path.basename(snapshot)
+    assert backup['size'] == os.path.getsize(BackupService.get_db_path())
+    assert 0 < backup['stored_size'] <= backup['size']
+
+
+def test_info_created_for_older_snapshots(snapshot):
+    info_path = BackupStore._info_path(snapshot)
+    os.remove(info_path)
+    [backup] = BackupService.get_backups()
+    assert os.path.exists(info_path)
+    assert BackupStore.read_info(snapshot)['size'] == backup['size']
+
+
+def test_delete_removes_info(snapshot):
+    assert BackupService.delete_backup(os.path.basename(snapshot))
+    assert not os.path.exists(BackupStore._info_path(snapshot))
+    assert BackupService.get_backups() == []
@@ -0,0 +1,24 @@
+from app.core.extensions import db
+from app.models import Grade, GradePolicy
+from app.services.grade_policy_service import GradePolicyService
+
+YEAR = '2024/2025'
+THRESHOLDS = [
+    {'min': 85, 'letter': 'A', 'desc': 'Istimewa'},
+    {'min': 'kkm', 'letter': 'B', 'desc': 'Baik'},
+    {'min': 0, 'letter': 'C', 'desc': 'Kurang'},
+]
+
+
+def test_saved_thresholds_apply_to_grades(subjects, students):
+    subject_id, student_id = subjects[0].id, students[0].id
+    db.session.add(Grade(student_id=student_id, subject_id=subject_id, semester=1, year=YEAR, nh=90, nk=90, nu=90))
+    db.session.commit()
+
+    GradePolicyService.save_policy(subject_id, YEAR, (1.0, 1.0, 1.0), THRESHOLDS)
+    db.session.commit()
+    db.session.remove()
+
+    assert GradePolicy.query.one().thresholds == THRESHOLDS
+    grade = Grade.query.one()
+    assert (grade.nr, grade.grade_letter) == (90, 'A')
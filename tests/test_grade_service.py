@@ -0,0 +1,75 @@
+from sqlalchemy import event
+from app.core.extensions import db
+from app.models import Grade
+from app.services.grade_service import GradeService
+
+YEAR = '2024/2025'
+
+
+def values(nr, **extra):
+    row = {f: None for f in GradeService.VALUE_FIELDS}
+    row.update(nh=nr, nk=nr, nu=nr, nr=nr, **extra)
+    return row
+
+
+def test_insert_then_unchanged(subjects, students):
+    rows = {s.id: values(80) for s in students[:5]}
+    result = GradeService.upsert_grades(subjects[0].id, 1, YEAR, rows)
+    db.session.commit()
+    assert (result['inserted'], result['updated'], result['unchanged']) == (5, 0, 0)
+    assert Grade.query.count() == 5
+
+    result = GradeService.upsert_grades(subjects[0].id, 1, YEAR, rows)
+    assert (result['inserted'], result['updated'], result['unchanged']) == (0, 0, 5)
+    assert result['changed'] == []
+
+
+def test_updates_only_changed_rows(subjects, students):
+    ids = [s.id for s in students[:3]]
+    GradeService.upsert_grades(subjects[0].id, 1, YEAR, {i: values(80) for i in ids})
+    db.session.commit()
+
+    result = GradeService.upsert_grades(subjects[0].id, 1, YEAR, {ids[0]: values(90), ids[1]: values(80)})
+    db.session.commit()
+    assert (result['inserted'], result['updated'], result['unchanged']) == (0, 1, 1)
+    assert result['changed'] == [ids[0]]
+    assert Grade.query.filter_by(student_id=ids[0]).one().nr == 90
+    assert Grade.query.count() == 3
+
+
+def test_blank_row_without_grade_is_skipped(subjects, students):
+    result = GradeService.upsert_grades(subjects[0].id, 1, YEAR, {students[0].id: values(None)})
+    assert result['unchanged'] == 1
+    assert Grade.query.count() == 0
+
+
+def test_rows_are_scoped_to_subject_semester_and_year(subjects, students):
+    sid = students[0].id
+    GradeService.upsert_grades(subjects[0].id, 1, YEAR, {sid: values(80)})
+    GradeService.upsert_grades(subjects[0].id, 2, YEAR, {sid: values(70)})
+    GradeService.upsert_grades(subjects[1].id, 1, YEAR, {sid: values(60)})
+    GradeService.upsert_grades(subjects[0].id, 1, '2023/2024', {sid: values(50)})
+    db.session.commit()
+    assert sorted(g.nr for g in Grade.query.all()) == [50, 60, 70, 80]
+
+
+def test_batches_stay_under_sqlite_variable_limit(subjects):
+    from app.models import Student
+    db.session.add_all(Student(nis=f'B{i:04d}', name=f'Batch {i}', gender='L') for i in range(300))
+    db.session.commit()
+    ids = [s.id for s in Student.query.all()]
+
+    bound = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO grades'):
+            bound.append(len(parameters))
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        GradeService.upsert_grades(subjects[0].id, 1, YEAR, {i: values(75) for i in ids})
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+
+    assert len(bound) > 1
+    assert max(bound) <= GradeService.MAX_VARIABLES
+    assert Grade.query.count() == 300
@@ -0,0 +1,37 @@
+import re
+from app.core.extensions import db
+from app.models import Grade, Setting, Subject, Student
+
+
+def field_value(html, name):
+    return re.search(rf'name="{name}"\s+value="([^"]*)"', html).group(1)
+
+
+def test_stored_zero_survives_editing_another_field(client, subjects, students):
+    subject_id, student_id = Subject.query.first().id, Student.query.first().id
+    year = Setting.get_value('academic_year', '2024/2025')
+    db.session.add(Grade(student_id=student_id, subject_id=subject_id, semester=1, year=year, nh=0, nk=80, nu=80))
+    db.session.commit()
+
+    url = f'/grades/edit?subject_id={subject_id}&semester=1'
+    html = client.get(url).get_data(as_text=True)
+    row = {f: field_value(html, f's_{student_id}_{f}') for f in ('nh', 'nk', 'nu')}
+    assert row == {'nh': '0.0', 'nk': '80.0', 'nu': '80.0'}
+
+    # The grid posts the whole edited row
+    row['nk'] = '90'
+    client.post(url, data={f's_{student_id}_{f}': v for f, v in row.items()})
+    db.session.remove()
+    grade = Grade.query.one()
+    assert (grade.nh, grade.nk, grade.nu) == (0, 90, 80)
+
+
+def test_empty_note_renders_blank(client, students):
+    from app.models import ReportRecord
+    student_id = Student.query.first().id
+    year = Setting.get_value('academic_year', '2024/2025')
+    db.session.add(ReportRecord(student_id=student_id, semester=1, year=year, notes=None, extras=[], personality=[]))
+    db.session.commit()
+
+    html = client.get('/grades/extras?semester=1').get_data(as_text=True)
+    assert field_value(html, f's_{student_id}_notes') == ''
@@ -0,0 +1,48 @@
+import os
+import time
+import pytest
+from app.services.job_service import JobService
+
+
+def claim(status, pid):
+    """Exclusive job row as another worker would leave it"""
+    conn = JobService._connect(JobService.get_store_path())
+    conn.execute(
+        "INSERT INTO jobs (id, kind, status, pid, exclusive) VALUES (?, 'prune', ?, ?, 1)",
+        (f"other-{status}-{pid}", status, pid)
+    )
+    conn.commit()
+    conn.close()
+
+
+def wait_for(job_id):
+    for _ in range(100):
+        job = JobService.get_job(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+@pytest.mark.parametrize('status', ['queued', 'running'])
+def test_exclusive_job_refused_while_another_is_live(app, status):
+    claim(status, os.getpid())
+    with pytest.raises(Exception, match="masih berjalan"):
+        JobService.enqueue('reset')
+
+
+def test_non_exclusive_job_not_blocked(two_years):
+    claim('running', os.getpid())
+    assert wait_for(JobService.enqueue('backup'))['status'] == 'done'
+
+
+def test_claim_of_dead_worker_ignored(two_years):
+    claim('running', 2 ** 22 + 1)  # above the default pid_max, never alive
+    job = wait_for(JobService.enqueue('reset'))
+    assert job['status'] == 'done', job['error']
+
+
+def test_claim_released_when_job_finishes(two_years):
+    assert wait_for(JobService.enqueue('prune', year='2023/2024'))['status'] == 'done'
+    job = wait_for(JobService.enqueue('reset'))
+    assert job['status'] == 'done', job['error']
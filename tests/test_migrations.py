@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import inspect, text
+import config
+import app.core.migrations as migrations
+from app import create_app
+from app.core.extensions import db
+
+
+@pytest.fixture
+def empty_app(tmp_path, monkeypatch):
+    """App on a new, unmigrated database file"""
+    monkeypatch.setattr(config.TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'empty.sqlite'}")
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def applied_versions():
+    with db.engine.connect() as conn:
+        return [v for (v,) in conn.execute(text("SELECT version FROM schema_version ORDER BY version"))]
+
+
+def test_fresh_database_gets_every_migration(empty_app):
+    assert migrations.current_version() == 0
+    applied = migrations.migrate()
+    assert [v for v, _ in applied] == [v for v, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version() == migrations.LATEST_VERSION
+    assert applied_versions() == [v for v, _, _ in migrations.MIGRATIONS]
+
+    tables = set(inspect(db.engine).get_table_names())
+    assert {'users', 'students', 'grades', 'classrooms', 'class_memberships', 'settings'} <= tables
+
+
+def test_second_run_applies_nothing(empty_app):
+    migrations.migrate()
+    assert migrations.migrate() == []
+    assert applied_versions() == [v for v, _, _ in migrations.MIGRATIONS]
+
+
+def test_only_pending_versions_run(empty_app, monkeypatch):
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:5])
+    migrations.migrate()
+    assert migrations.current_version() == 5
+    assert not inspect(db.engine).has_table('classrooms')
+
+    monkeypatch.undo()
+    applied = migrations.migrate()
+    assert [v for v, _ in applied] == [v for v, _, _ in migrations.MIGRATIONS[5:]]
+    assert inspect(db.engine).has_table('classrooms')
+
+
+def test_default_admin_created_once(empty_app):
+    migrations.migrate()
+    with db.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM users WHERE username = 'admin'")).scalar() == 1
+
+
+def test_failed_step_is_rolled_back_and_retried(empty_app, monkeypatch):
+    def broken(conn):
+        conn.execute(text("CREATE TABLE half_done (id INTEGER)"))
+        raise RuntimeError("boom")
+
+    steps = migrations.MIGRATIONS + [(migrations.LATEST_VERSION + 1, 'broken', broken)]
+    monkeypatch.setattr(migrations, 'MIGRATIONS', steps)
+    with pytest.raises(RuntimeError):
+        migrations.migrate()
+    # Earlier steps stay applied, the failed one leaves nothing behind
+    assert migrations.current_version() == migrations.LATEST_VERSION
+    assert not inspect(db.engine).has_table('half_done')
+
+    steps[-1] = (migrations.LATEST_VERSION + 1, 'fixed', lambda conn: conn.execute(text("CREATE TABLE half_done (id INTEGER)")))
+    assert migrations.migrate() == [(migrations.LATEST_VERSION + 1, 'fixed')]
+    assert inspect(db.engine).has_table('half_done')
+
+
+def test_broken_policy_thresholds_reset(empty_app, monkeypatch, capsys):
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:10])
+    migrations.migrate()
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO grade_policies (id, year, thresholds_json) VALUES "
+            "(1, '2024/2025', '[{\"min\": 90, \"letter\": \"A\"}]'), (2, '2023/2024', '[{broken'), (3, NULL, '')"
+        ))
+
+    monkeypatch.undo()
+    migrations.migrate()
+    from app.models import GradePolicy
+    thresholds = {p.id: p.thresholds for p in GradePolicy.query.all()}
+    assert thresholds == {1: [{'min': 90, 'letter': 'A'}], 2: [], 3: []}
+    assert '[2, 3]' in capsys.readouterr().out
@@ -0,0 +1,7 @@
+from app.core.schema import check_query_plans
+
+
+def test_hot_queries_use_their_index(app):
+    results = check_query_plans()
+    assert results
+    assert [r for r in results if not r['ok']] == []
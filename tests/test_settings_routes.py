@@ -0,0 +1,24 @@
+from app.core.extensions import db
+from app.models import Subject, StudentSemesterSummary
+from app.services.summary_service import SummaryService
+
+
+def below_kkm(year):
+    db.session.remove()
+    return sum(s.below_kkm for s in StudentSemesterSummary.query.filter_by(semester=1, year=year))
+
+
+def test_kkm_change_refreshes_summaries_of_every_year(client, two_years):
+    subject = Subject.query.filter_by(code='MP1').one()
+    subject_id = subject.id
+    form = {'code': subject.code, 'name': subject.name, 'kkm': '75', 'order': subject.order}
+    for year in two_years:
+        SummaryService.refresh(1, year)
+    db.session.commit()
+    # nr 61..80 against KKM 70: 9 students below, in both subjects
+    assert [below_kkm(year) for year in two_years] == [18, 18]
+
+    response = client.post(f"/settings/subjects/edit/{subject_id}", data=form)
+    assert response.status_code == 302
+    # 14 below in the edited subject, 9 in the other
+    assert [below_kkm(year) for year in two_years] == [23, 23]
@@ -0,0 +1,41 @@
+from app.core.extensions import db
+from app.models import Student
+from app.services.student_service import StudentService
+
+
+def names(page):
+    return [s.name for s in page.items]
+
+
+def test_forward_and_back(students):
+    first = StudentService.page(Student.query, 5)
+    assert names(first) == [f'Santri {i:03d}' for i in range(1, 6)]
+    assert (first.has_prev, first.has_next) == (False, True)
+
+    second = StudentService.page(Student.query, 5, after=first.next_cursor, start=first.next_start)
+    assert names(second) == [f'Santri {i:03d}' for i in range(6, 11)]
+
+    back = StudentService.page(Student.query, 5, before=second.prev_cursor, start=second.prev_start)
+    assert names(back) == names(first)
+    assert (back.has_prev, back.has_next, back.start) == (False, True, 1)
+
+
+def test_back_from_cursor_past_the_end_has_no_next(students):
+    # The cursor student is no longer in the (filtered) listing
+    query = Student.query.filter(Student.id <= 10)
+    page = StudentService.page(query, 5, before=students[14].id, start=11)
+    assert names(page) == [f'Santri {i:03d}' for i in range(6, 11)]
+    assert (page.has_prev, page.has_next) == (True, False)
+    assert page.next_cursor is None
+
+
+def test_search_applies_short_words(app):
+    db.session.add_all(Student(nis=f'P{i:04d}', name=f'Santri Putra {i:03d}', gender='L') for i in range(200))
+    db.session.add(Student(nis='P9999', name='Santri Zi', gender='L'))
+    db.session.commit()
+    assert StudentService._has_fts()
+
+    # More "santri" rows than one candidate pass loads; the short word decides
+    assert [s.name for s in StudentService.search('santri zi')] == ['Santri Zi']
+    results = StudentService.search('santri 7')
+    assert results and all('7' in s.name or '7' in s.nis for s in results)